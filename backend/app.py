@@ -3,24 +3,31 @@ import io
 import re
 import json
 import uuid
+import copy
+import threading
+import time
+from contextlib import ExitStack
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import TimeoutError as FuturesTimeout
 from datetime import datetime, timedelta
-from typing import List, Optional, Tuple
+from typing import Iterable, Iterator, List, Optional, Tuple
 
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify
 from werkzeug.middleware.proxy_fix import ProxyFix
 from pydantic import BaseModel, Field, ValidationError, field_validator
-import bcrypt
 import jwt
 
-# --- Supabase integration ---
+# --- data access (Supabase or local SQLite, see storage.py) ---
 from supabase_client import (
-    supabase,
     upload_pdf_to_storage,
     save_pdf_metadata,
     save_research_data,
+    save_research_batch,
     mark_pdf_processed,
     get_research_by_year,
     get_all_research,
+    get_research_page,
+    update_research_data,
     get_all_pdfs,
     save_email_template,
     register_user,
@@ -34,22 +41,42 @@ try:
 except Exception:
     pass
 
-# --- Gemini ---
-import google.generativeai as genai
+# --- LLM (provider picked by LLM_PROVIDER, created on first use; see llm_providers.py) ---
+from llm_providers import get_provider
 
 # Prefer 1.5 Pro (or 1.5 Flash if you want cheaper/faster)
 GEMINI_MODEL_NAME = os.getenv("GEMINI_MODEL_NAME", "gemini-2.5-flash")
-genai.configure(api_key=os.getenv("GEMINI_API_KEY", "DUMMY_FOR_TESTS"))
-model = genai.GenerativeModel(
-    model_name=GEMINI_MODEL_NAME,
-    generation_config={
-        "temperature": 0.2,
-        "response_mime_type": "application/json",  # JSON mode
-    },
-)
+LLM_TEMPERATURE = 0.2
+
+# Bump whenever build_user_prompt / SYSTEM_INSTRUCTION / SCHEMA_JSON change so cached extractions are not reused
+PROMPT_VERSION = "2025-11-09"
+
+# --- extraction cache (set EXTRACTION_CACHE_PATH="" to disable) ---
+from extraction_cache import ExtractionCache, make_cache_key
+from json_repair import parse_json_object
+from project_merge import merge_projects
+import metrics
+import profiling
 
-# --- PDF extraction (PyMuPDF) ---
-import fitz  # PyMuPDF
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+EXTRACTION_CACHE_PATH = os.getenv("EXTRACTION_CACHE_PATH", os.path.join(BASE_DIR, "extraction_cache.sqlite3"))
+extraction_cache = ExtractionCache(
+    EXTRACTION_CACHE_PATH,
+    max_entries=int(os.getenv("EXTRACTION_CACHE_MAX_ENTRIES", "5000")),
+    ttl_seconds=float(os.getenv("EXTRACTION_CACHE_TTL_SECONDS", str(30 * 24 * 3600))),
+) if EXTRACTION_CACHE_PATH else None
+
+# --- PDF extraction (PyMuPDF, streamed page by page) ---
+from pdf_stream import PdfExtractionError, iter_pdf_pages, spooled_pdf
+from text_processing import (
+    TRIAL_ID_RE,
+    HintIndex,
+    choose_grant_amount,
+    extract_trial_id,
+    make_hints_for_any_text,
+    normalize_text,
+)
+from chunking import CHUNK_CHARS, CHUNK_OVERLAP, ChunkStream, SemanticChunker, chunk_text, estimate_tokens
 
 # ----------------- Flask setup -----------------
 app = Flask(__name__)
@@ -67,6 +94,41 @@ def apply_cors(resp):
         resp.headers["Access-Control-Allow-Credentials"] = "true"
         resp.headers["Access-Control-Allow-Headers"] = "Content-Type, Authorization"
         resp.headers["Access-Control-Allow-Methods"] = "POST, GET, OPTIONS"
+        resp.headers["Access-Control-Expose-Headers"] = "ETag, Location, Server-Timing, X-Ingest-Report, X-Request-ID"
+    return resp
+
+# --- request metrics + Server-Timing (see metrics.py) ---
+@app.before_request
+def start_request_metrics():
+    g.request_start = time.perf_counter()
+    metrics.start_request()
+
+@app.after_request
+def record_request_metrics(resp):
+    elapsed = time.perf_counter() - g.get("request_start", time.perf_counter())
+    endpoint = request.url_rule.rule if request.url_rule is not None else "unmatched"
+    metrics.HTTP_REQUEST_SECONDS.observe(elapsed, method=request.method, endpoint=endpoint,
+                                         status=resp.status_code)
+    # streamed responses: only the work done before the first byte
+    resp.headers["Server-Timing"] = metrics.server_timing(metrics.finish_request(), elapsed)
+    return resp
+
+# --- opt-in request profiling (see profiling.py) ---
+@app.before_request
+def maybe_start_profile():
+    forced = profiling.wanted(request.headers.get("X-Profile"))
+    if forced is not None:
+        g.profile = profiling.RequestProfile(forced)
+
+@app.after_request
+def finish_profile(resp):
+    prof = g.pop("profile", None)
+    if prof is not None:
+        request_id = profiling.safe_name(request.headers.get("X-Request-ID") or uuid.uuid4().hex)
+        endpoint = request.endpoint or "unmatched"
+        resp.headers["X-Request-ID"] = request_id
+        # stop once the body has been sent, so streamed responses are covered too
+        resp.call_on_close(lambda: prof.finish(request_id, endpoint))
     return resp
 
 @app.route("/ingest-and-summarize", methods=["OPTIONS"])
@@ -133,177 +195,244 @@ SYSTEM_PROMPT = (
 )
 
 # ----------------- Helpers -----------------
-CHUNK_CHARS = 6500
-CHUNK_OVERLAP = 500
-
-def chunk_text(s: str, max_chars=CHUNK_CHARS, overlap=CHUNK_OVERLAP):
-    s = s.strip()
-    if len(s) <= max_chars:
-        return [s]
-    parts, i = [], 0
-    while i < len(s):
-        parts.append(s[i:min(i+max_chars, len(s))])
-        i += (max_chars - overlap)
-    return parts
+# "semantic" packs paragraphs/trial sections against a token budget;
+# "fixed" keeps the old CHUNK_CHARS/CHUNK_OVERLAP windows
+CHUNKER = os.getenv("CHUNKER", "semantic")
 
 def pdf_to_text(file_bytes: bytes) -> str:
     """Layout-aware text with page markers so the model can reference pages."""
-    parts = []
-    with fitz.open(stream=file_bytes, filetype="pdf") as doc:
-        for i, page in enumerate(doc, start=1):
-            t = page.get_text("text") or ""
-            parts.append(f"[PDF p{i}]\n{t}")
-    return normalize_text("\n\n".join(parts))
-
-def normalize_text(s: str) -> str:
-    # unwrap hyphenation across newlines: "medullo-\nblastoma" -> "medulloblastoma"
-    s = re.sub(r"-\s*\n\s*", "", s)
-    # join single line breaks inside paragraphs (keep blank lines)
-    s = re.sub(r"([^\n])\n(?!\n)", r"\1 ", s)
-    # fix spaced thousands: "90, 000" -> "90,000"; "100 000" -> "100,000"
-    s = re.sub(r"(?<=\d),(?:\s+)(?=\d{3})", ",", s)
-    s = re.sub(r"(?<=\d)\s(?=\d{3}\b)", ",", s)
-    # collapse multi-spaces
-    s = re.sub(r"[ \t]{2,}", " ", s)
-    return s.strip()
-
-# --- general extractors for trial_id + plausible grant amount ---
-TRIAL_ID_RE = re.compile(r"\b(PNOC|NCT|PBTC|COG)\s*[-]?\s*\d+\b", re.I)
-MONEY_TOKEN_RE = re.compile(
-    r"(?i)(\$?\s?\d{1,3}(?:[,\s]\d{3})+(?:\.\d{2})?|\$\s?\d+|\d{4,})(?:\s*(?:USD|dollars|over\s+\d+\s+years?)?)"
+    with spooled_pdf(io.BytesIO(file_bytes)) as path:
+        return "\n\n".join(iter_pdf_pages(path))
+
+# --- prompt building + LLM call ---
+# Static instructions: sent once per call as the model's system instruction (a stable
+# prefix Gemini can cache), not repeated in every chunk's user prompt.
+_INSTRUCTION_RULES = [
+    SYSTEM_PROMPT,
+    "Return STRICT JSON matching the schema exactly. If info is missing, keep string fields as empty strings \"\" and numeric fields as null.",
+    "CRITICAL RULES:",
+    "1) Include `trial_id` if present in CONTENT or HINTS (e.g., PNOC044, NCT######).",
+    "2) If multiple passages describe the SAME trial_id, MERGE into a single project entry.",
+    "3) Do NOT invent amounts. If HINTS.grant_amount is provided and not contradicted by CONTENT, use it.",
+    "4) Fund usage: set both amount_numeric and amount_display when a grant amount is present; otherwise leave blank/null.",
+    "5) If HINTS.trials is present, each amount there belongs only to its own trial_id.",
+]
+_INSTRUCTION_STYLE = (
+    "STYLE:\n- Layman summaries: 2–6 sentences, no jargon.\n"
+    "- Fund usage: extract numeric amount, display string, period, org, purpose if present; otherwise leave blank.\n"
+    "- Future goals: concrete, short phrases.\n"
+    "- timeline_snippet: 1–3 sentences for a donor timeline card."
 )
-TOTAL_BUDGET_CUES = re.compile(r"(?i)\b(total (project )?budget|subtotal|indirects|overhead|total:)\b")
-GRANT_CUES = re.compile(r"(?i)\b(grant amount|grant:|awarded|provided by|funded by|our (?:foundation|nonprofit)|we (?:will|plan to) fund|committed)\b")
-
-def extract_trial_id(text: str) -> str:
-    m = TRIAL_ID_RE.search(text)
-    if not m:
-        return ""
-    return re.sub(r"[\s-]+", "", m.group(0).upper())  # PNOC044, NCT0123456
-
-def _normalize_money_token(tok: str) -> str:
-    tok = tok.strip()
-    if not tok.startswith("$"):
-        # add $ to naked numbers >= 4 digits (e.g., 781000)
-        if re.fullmatch(r"\d{4,}(?:\.\d{2})?", tok):
-            tok = "$" + tok
-    tok = tok.replace(" ", "")
-    if re.fullmatch(r"\$\d{4,}(?:\.\d{2})?", tok) and "," not in tok:
-        num = tok[1:]
-        try:
-            if "." in num:
-                left, right = num.split(".")
-                left = f"{int(left):,}"
-                tok = f"${left}.{right}"
-            else:
-                tok = f"${int(num):,}"
-        except Exception:
-            pass
-    return tok
 
-def _money_to_numeric(tok: str) -> Optional[float]:
-    digits = re.sub(r"[^\d.]", "", tok or "")
-    if not digits:
-        return None
-    try:
-        return float(digits)
-    except Exception:
-        return None
+def build_system_instruction(compact_schema: bool = True) -> str:
+    schema = json.dumps(json.loads(SCHEMA_JSON), separators=(",", ":")) if compact_schema else SCHEMA_JSON
+    return "\n\n".join(_INSTRUCTION_RULES + [f"SCHEMA:\n{schema}", _INSTRUCTION_STYLE])
+
+SYSTEM_INSTRUCTION = build_system_instruction()
+
+def _compact_hints(hints: dict) -> str:
+    """Hints as minified JSON without empty fields."""
+    def prune(v):
+        if isinstance(v, dict):
+            v = {k: prune(x) for k, x in v.items()}
+            return {k: x for k, x in v.items() if x not in ("", None, {}, [])}
+        if isinstance(v, list):
+            return [prune(x) for x in v]
+        return v
+    return json.dumps(prune(hints or {}), separators=(",", ":"), ensure_ascii=False)
 
-def choose_grant_amount(text: str) -> Tuple[str, Optional[float]]:
+def build_user_prompt(content: str, hints: dict) -> str:
+    """Per-chunk prompt: just the hints and the content (instructions are in SYSTEM_INSTRUCTION)."""
+    return f"HINTS:{_compact_hints(hints)}\n\nCONTENT:\n{content}"
+
+def prompt_token_report(parts: List[str], hints) -> dict:
     """
-    Heuristic: scan lines. Prefer amounts on lines with 'grant/awarded/provided/funded/committed'.
-    Downrank lines that look like total project budget/indirects.
-    Return (amount_display, amount_numeric) or ("", None) if nothing plausible.
+    Estimated input tokens for one ingest: content vs. prompt overhead, and what the
+    old layout (instructions + pretty-printed hints repeated in every user prompt) cost.
     """
-    best = None  # (display, numeric, score)
-    for raw_line in text.splitlines():
-        line = raw_line.strip()
-        if not line:
-            continue
-        toks = [t.group(0) for t in MONEY_TOKEN_RE.finditer(line)]
-        if not toks:
-            continue
-        score = 0
-        if GRANT_CUES.search(line):
-            score += 3
-        if TOTAL_BUDGET_CUES.search(line):
-            score -= 2
-        if re.search(r"(?i)\bgrant\b", line):
-            score += 1
-        for tok in toks:
-            disp = _normalize_money_token(tok)
-            val = _money_to_numeric(disp)
-            if val and val < 1_000:
-                continue
-            cand = (disp, val, score)
-            if best is None:
-                best = cand
-            else:
-                if cand[2] > best[2] or (cand[2] == best[2] and (cand[1] or 0) > (best[1] or 0)):
-                    best = cand
-    if best:
-        return best[0], best[1]
-    return "", None
-
-def make_hints_for_any_text(text: str, label: str = "", sdate: str = "") -> dict:
-    trial_id = extract_trial_id(text)
-    amount_display, amount_numeric = choose_grant_amount(text)
-    return {
-        "trial_id": trial_id,                    # e.g., "PNOC044" or ""
-        "grant_amount": {
-            "amount_display": amount_display,    # "$340,000 over two years" or ""
-            "amount_numeric": amount_numeric     # 340000.0 or null
-        },
-        "source": {"label": label or "", "date": sdate or ""}
+    per_chunk = hints if isinstance(hints, list) else [hints] * len(parts)
+    instruction = estimate_tokens(SYSTEM_INSTRUCTION)
+    legacy_instruction = estimate_tokens(build_system_instruction(compact_schema=False))
+    content = sum(estimate_tokens(p) for p in parts)
+    prompt = sum(estimate_tokens(build_user_prompt(p, h)) for p, h in zip(parts, per_chunk)) - content
+    legacy_hints = sum(estimate_tokens(json.dumps(h or {}, indent=2)) for h in per_chunk)
+    report = {
+        "calls": len(parts),
+        "content_tokens": content,
+        "instruction_tokens_per_call": instruction,
+        "prompt_tokens": instruction * len(parts) + prompt,
+        "legacy_prompt_tokens": legacy_instruction * len(parts) + legacy_hints,
     }
+    total = report["content_tokens"] + report["prompt_tokens"]
+    report["prompt_share"] = round(report["prompt_tokens"] / total, 3) if total else 0.0
+    return report
+
+class LLMCallStats:
+    """Per-request counters for call_llm_json (shared by the chunk threads of one ingest)."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = 0          # chunks sent through call_llm_json
+        self.model_calls = 0    # generate_content round trips
+        self.retries = 0        # extra round trips after unusable output
+        self.repaired = 0       # outputs salvaged by local JSON repair
+        self.cache_hits = 0
+        self.failed = 0         # no usable JSON even after the retry
+
+    def add(self, **counts) -> None:
+        with self._lock:
+            for name, n in counts.items():
+                setattr(self, name, getattr(self, name) + n)
+        for name, n in counts.items():
+            metrics.LLM_EVENTS.inc(n, event=name)
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {"calls": self.calls, "model_calls": self.model_calls, "retries": self.retries,
+                    "repaired": self.repaired, "cache_hits": self.cache_hits, "failed": self.failed}
+
+def _drop_empty_projects(out: dict) -> dict:
+    """A repaired, truncated reply can end in a half-written project; drop ones with nothing in them."""
+    if isinstance(out.get("projects"), list):
+        out["projects"] = [p for p in out["projects"]
+                           if not isinstance(p, dict) or any(v not in ("", None, {}, []) for v in p.values())]
+    return out
+
+def _cache_get(key: str) -> Optional[dict]:
+    """The cache is only an optimization: a failing lookup (locked, unreadable file) is a miss."""
+    try:
+        return extraction_cache.get(key)
+    except Exception as e:
+        print(f"Extraction cache lookup failed: {e}")
+        return None
+
+def _cache_put(key: str, value: dict) -> None:
+    try:
+        extraction_cache.put(key, value)
+    except Exception as e:
+        print(f"Extraction cache write failed: {e}")
+
+def call_llm_json(content: str, hints: dict, stats: Optional[LLMCallStats] = None) -> dict:
+    stats = stats or LLMCallStats()
+    stats.add(calls=1)
+    provider = get_provider()
+    cache_key = None
+    if extraction_cache is not None:
+        cache_key = make_cache_key(content, hints, f"{provider.name}:{GEMINI_MODEL_NAME}", PROMPT_VERSION)
+        cached = _cache_get(cache_key)
+        if cached is not None:
+            stats.add(cache_hits=1)
+            return cached
 
-# --- prompt building + LLM call ---
-def build_user_prompt(content: str, hints: dict) -> str:
-    return "\n\n".join([
-      SYSTEM_PROMPT,
-      "",
-      "Return STRICT JSON matching the schema exactly. If info is missing, keep string fields as empty strings \"\" and numeric fields as null.",
-      "CRITICAL RULES:",
-      "1) Include `trial_id` if present in CONTENT or HINTS (e.g., PNOC044, NCT######).",
-      "2) If multiple passages describe the SAME trial_id, MERGE into a single project entry.",
-      "3) Do NOT invent amounts. If HINTS.grant_amount is provided and not contradicted by CONTENT, use it.",
-      "4) Fund usage: set both amount_numeric and amount_display when a grant amount is present; otherwise leave blank/null.",
-      f"SCHEMA:\n{SCHEMA_JSON}",
-      "STYLE:\n- Layman summaries: 2–6 sentences, no jargon.\n"
-      "- Fund usage: extract numeric amount, display string, period, org, purpose if present; otherwise leave blank.\n"
-      "- Future goals: concrete, short phrases.\n"
-      "- timeline_snippet: 1–3 sentences for a donor timeline card.",
-      f"HINTS:\n{json.dumps(hints or {}, indent=2)}",
-      f"CONTENT:\n{content}"
-    ])
-
-def _extract_json_from_gemini(resp) -> str:
-    raw = getattr(resp, "text", None)
-    if raw:
-        return raw
-    # fallback: walk candidates
-    for cand in getattr(resp, "candidates", []) or []:
-        content = getattr(cand, "content", None)
-        parts = getattr(content, "parts", None) if content else None
-        if parts:
-            for p in parts:
-                t = getattr(p, "text", None)
-                if t:
-                    return t
-    return ""
-
-def call_llm_json(content: str, hints: dict) -> dict:
     prompt = build_user_prompt(content, hints)
-    for _ in range(2):  # one retry if JSON is malformed/empty
-        resp = model.generate_content(prompt)
-        raw = _extract_json_from_gemini(resp)
-        try:
-            return json.loads(raw or "{}")
-        except Exception:
-            prompt += "\n\nRespond with VALID JSON ONLY. No commentary."
+    for attempt in range(2):  # one retry only if nothing usable can be salvaged
+        if attempt:
+            stats.add(retries=1)
+        start = time.perf_counter()
+        raw = provider.generate(prompt, system_instruction=SYSTEM_INSTRUCTION, response_schema=OutputPayload,
+                                temperature=LLM_TEMPERATURE, model=GEMINI_MODEL_NAME)
+        metrics.LLM_CALL_SECONDS.observe(time.perf_counter() - start, provider=provider.name)
+        stats.add(model_calls=1)
+        out, repaired = parse_json_object(raw)
+        if out is not None:
+            if repaired:
+                stats.add(repaired=1)
+                return _drop_empty_projects(out)
+            # only cache complete answers; empty/repaired outputs should be retried next time
+            if cache_key and out:
+                _cache_put(cache_key, out)
+            return out
+        prompt += "\n\nRespond with VALID JSON ONLY. No commentary."
+    stats.add(failed=1)
     return {"project_year": None, "projects": [], "global_notes": ["Model failed to return valid JSON."]}
 
+# --- bounded-concurrency fan-out over chunks ---
+LLM_MAX_IN_FLIGHT = int(os.getenv("LLM_MAX_IN_FLIGHT", "4"))
+INGEST_DEADLINE_SECONDS = float(os.getenv("INGEST_DEADLINE_SECONDS", "120"))
+
+def _empty_partial(note: str) -> dict:
+    return {"project_year": None, "projects": [], "global_notes": [note]}
+
+def iter_extract_chunks(parts: List[str], hints, max_in_flight: Optional[int] = None,
+                        deadline_s: Optional[float] = None, pool=None, stats: Optional[LLMCallStats] = None):
+    """
+    Run call_llm_json over every chunk with at most `max_in_flight` calls outstanding and
+    yield (index, status, partial) as each chunk settles, in completion order.
+    `hints` is one dict for all chunks or a list with one dict per chunk.
+    Chunks that fail ("failed"), or are still pending when the per-request deadline
+    expires ("timeout"), yield empty partials carrying a note.
+    `pool` (optional) is a shared executor, so several documents share one in-flight limit;
+    it is left running afterwards. `stats` (optional) collects call_llm_json counters.
+    """
+    if not parts:
+        return
+    max_in_flight = max(1, max_in_flight or LLM_MAX_IN_FLIGHT)
+    deadline_s = INGEST_DEADLINE_SECONDS if deadline_s is None else deadline_s
+
+    per_chunk = hints if isinstance(hints, list) else [hints] * len(parts)
+    settled = set()
+    own_pool = pool is None
+    if own_pool:
+        pool = ThreadPoolExecutor(max_workers=min(max_in_flight, len(parts)), thread_name_prefix="llm-chunk")
+    try:
+        futures = {pool.submit(call_llm_json, p, per_chunk[i], stats): i for i, p in enumerate(parts)}
+        try:
+            for fut in as_completed(futures, timeout=deadline_s if deadline_s > 0 else None):
+                i = futures[fut]
+                try:
+                    partial, status = fut.result(), "done"
+                except Exception as e:
+                    partial, status = _empty_partial(f"Chunk {i + 1} failed: {e}"), "failed"
+                settled.add(i)
+                yield i, status, partial
+        except FuturesTimeout:
+            pass
+        for fut, i in futures.items():
+            if i not in settled:
+                fut.cancel()
+                settled.add(i)
+                yield i, "timeout", _empty_partial(f"Chunk {i + 1} exceeded the {deadline_s:g}s ingest deadline.")
+    finally:
+        # don't block the response on stragglers past the deadline
+        if own_pool:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+def extract_chunks(parts: List[str], hints, max_in_flight: Optional[int] = None,
+                   deadline_s: Optional[float] = None, on_chunk=None, pool=None,
+                   stats: Optional[LLMCallStats] = None) -> List[dict]:
+    """
+    iter_extract_chunks, collected: partials come back in chunk order so the merge
+    still runs on whatever finished in time.
+    `on_chunk(index, status)` is called as each chunk settles ("done", "failed", "timeout").
+    """
+    partials: List[Optional[dict]] = [None] * len(parts)
+    for i, status, partial in iter_extract_chunks(parts, hints, max_in_flight, deadline_s, pool, stats):
+        partials[i] = partial
+        if on_chunk is not None:
+            on_chunk(i, status)
+    return partials
+
+def _merge_partials(partials: List[dict]) -> dict:
+    """Concatenation of per-chunk outputs (project dedupe happens after sanitize, see project_merge.py)."""
+    raw_out = {"project_year": None, "projects": [], "global_notes": []}
+    for p in partials:
+        if not isinstance(p, dict):
+            continue
+        if raw_out["project_year"] is None and p.get("project_year"):
+            raw_out["project_year"] = p["project_year"]
+        if isinstance(p.get("projects"), list):
+            raw_out["projects"].extend(p["projects"])
+        if isinstance(p.get("global_notes"), list):
+            raw_out["global_notes"].extend(p["global_notes"])
+    # overlapping chunks repeat the same notes
+    notes, seen = [], set()
+    for n in raw_out["global_notes"]:
+        key = str(n).strip().lower()
+        if key not in seen:
+            seen.add(key)
+            notes.append(n)
+    raw_out["global_notes"] = notes
+    return raw_out
+
 # --- sanitize + optional dedupe ---
 def _sanitize_llm_output(raw_out: dict) -> dict:
     """Coerce nulls to strings where needed and normalize fields."""
@@ -353,31 +482,335 @@ def _sanitize_llm_output(raw_out: dict) -> dict:
 
     return raw_out
 
-def merge_projects_by_trial_id(projects: List[dict]) -> List[dict]:
-    """Light dedupe: if multiple entries share trial_id, merge into one."""
-    by_id = {}
-    for p in projects:
-        key = p.get("trial_id", "") or p.get("title", "").lower().strip()
-        if key in by_id:
-            base = by_id[key]
-            # keep longest lay summary
-            if len(p.get("layman_summary", "")) > len(base.get("layman_summary", "")):
-                base["layman_summary"] = p["layman_summary"]
-            # union future_goals
-            base["future_goals"] = sorted(set((base.get("future_goals") or []) + (p.get("future_goals") or [])), key=str.lower)
-            # prefer non-null amount_numeric
-            bu = base.get("fund_usage") or {}
-            pu = p.get("fund_usage") or {}
-            if bu.get("amount_numeric") is None and pu.get("amount_numeric") is not None:
-                bu["amount_numeric"] = pu["amount_numeric"]
-                bu["amount_display"] = pu.get("amount_display", bu.get("amount_display",""))
-            for k in ("period", "recipient_org", "purpose"):
-                if not bu.get(k) and pu.get(k):
-                    bu[k] = pu[k]
-            base["fund_usage"] = bu
+# ----------------- Ingest pipeline -----------------
+class IngestError(Exception):
+    """Ingest failure that maps to a specific HTTP status (and optional details)."""
+    def __init__(self, message: str, status: int = 400, details=None):
+        super().__init__(message)
+        self.status = status
+        self.details = details
+
+    def to_dict(self) -> dict:
+        body = {"error": str(self)}
+        if self.details is not None:
+            body["details"] = self.details
+        return body
+
+def _read_ingest_input() -> dict:
+    """
+    Parse the ingest request body into {label, sdate, text, pdf}.
+    Exactly one of `text` (already normalized) or `pdf` (werkzeug FileStorage) is set.
+    """
+    ctype = request.headers.get("Content-Type","")
+    label = (request.form.get("source_label") if "multipart/form-data" in ctype else None) or ""
+    sdate = (request.form.get("source_date") if "multipart/form-data" in ctype else None) or ""
+    text, pdf = None, None
+
+    if "multipart/form-data" in ctype:
+        raw_text = (request.form.get("raw_text") or "").strip()
+        if raw_text:
+            text = normalize_text(raw_text)
+        elif "file" in request.files:
+            f = request.files["file"]
+            if not f or f.mimetype != "application/pdf":
+                raise IngestError("Only PDF or raw_text supported", 400)
+            pdf = f
         else:
-            by_id[key] = p
-    return list(by_id.values())
+            raise IngestError("Provide raw_text or a PDF file", 400)
+
+    elif "application/json" in ctype:
+        data = request.get_json(silent=True) or {}
+        label = (data.get("source_label") or "").strip()
+        sdate = (data.get("source_date") or "").strip()
+        text = (data.get("raw_text") or "").strip()
+        if not text:
+            raise IngestError("raw_text required for JSON requests", 400)
+        text = normalize_text(text)
+
+    else:
+        raise IngestError("Unsupported Content-Type", 415)
+
+    return {"label": label, "sdate": sdate, "text": text, "pdf": pdf}
+
+def _chunks_and_hints(pages: Iterable[str], label: str, sdate: str) -> Tuple[List[str], List[dict]]:
+    """
+    One pass over the (normalized) pages: feed the chunker and the hint index as each
+    page arrives, so the pages themselves can be dropped right away. Returns the chunks
+    and, for each chunk, hints scoped to the trials it mentions.
+    """
+    provenance = f'[SOURCE: label="{label}", date={sdate}]'
+    chunker = ChunkStream() if CHUNKER == "fixed" else SemanticChunker()
+    index = HintIndex()
+    chunk_clock, hint_clock = metrics.StageClock("chunk"), metrics.StageClock("hints")
+    if not isinstance(pages, list):
+        pages = metrics.timed_iter("pdf", pages)  # page extraction runs as the pages are pulled
+    with chunk_clock:
+        chunker.feed(provenance)
+    with hint_clock:
+        index.add_text(provenance)
+    has_text = False
+    sep = "\n"
+    try:
+        for page in pages:
+            if not page:
+                continue
+            has_text = True
+            with chunk_clock:
+                chunker.feed(sep + page)
+            with hint_clock:
+                index.add_text(sep + page)
+            sep = "\n\n"
+    except PdfExtractionError as e:
+        raise IngestError(str(e), 422)
+    if not has_text:
+        raise IngestError("No readable text found", 422)
+
+    with chunk_clock:
+        chunks = chunker.finish()
+    with hint_clock:
+        chunk_hints = [index.hints_for_chunk(c, label=label, sdate=sdate) for c in chunks]
+    chunk_clock.record()
+    hint_clock.record()
+    return chunks, chunk_hints
+
+def _count_prompt_tokens(tokens: dict) -> None:
+    metrics.LLM_TOKENS.inc(tokens["prompt_tokens"], kind="prompt_estimated")
+    metrics.LLM_TOKENS.inc(tokens["content_tokens"], kind="content_estimated")
+
+def run_ingest_pipeline(text: str = "", label: str = "", sdate: str = "", progress=None,
+                        pages: Optional[Iterable[str]] = None, chunk_pool=None,
+                        deadline_s: Optional[float] = None, report: Optional[dict] = None) -> dict:
+    """
+    hints -> chunk -> per-chunk LLM -> sanitize -> dedupe -> validate.
+    Input is either normalized `text` or an iterator of normalized `pages` (streamed PDFs).
+    `progress` (optional) gets .start(total_chunks) and .chunk(index, status) calls.
+    `chunk_pool` / `deadline_s` (optional) are passed through to extract_chunks.
+    `report` (optional dict) is filled with {tokens: prompt_token_report, llm: LLMCallStats counts}.
+    Returns the validated OutputPayload as a dict; raises IngestError on bad input/output.
+    """
+    parts, chunk_hints = _chunks_and_hints([text] if pages is None else pages, label, sdate)
+    tokens, stats = prompt_token_report(parts, chunk_hints), LLMCallStats()
+    _count_prompt_tokens(tokens)
+    if progress is not None:
+        progress.start(len(parts))
+    # Call per chunk concurrently (bounded) and merge in chunk order
+    with metrics.stage("llm"):
+        partials = extract_chunks(parts, chunk_hints, deadline_s=deadline_s, pool=chunk_pool, stats=stats,
+                                  on_chunk=progress.chunk if progress is not None else None)
+    if report is not None:
+        report.update(tokens=tokens, llm=stats.to_dict())
+    return _finalize_partials(partials)
+
+def _finalize_partials(partials: List[dict]) -> dict:
+    """merge -> sanitize -> dedupe -> validate; raises IngestError(502) on a bad payload."""
+    with metrics.stage("merge"):
+        raw_out = partials[0] if len(partials) == 1 else _merge_partials(partials)
+
+        # sanitize, dedupe, validate
+        raw_out = _sanitize_llm_output(raw_out)
+        if isinstance(raw_out.get("projects"), list):
+            raw_out["projects"] = merge_projects(raw_out["projects"])
+
+    try:
+        with metrics.stage("validate"):
+            parsed = OutputPayload.model_validate(raw_out)
+    except ValidationError as ve:
+        raise IngestError("LLM JSON validation failed", 502, json.loads(ve.json()))
+
+    return parsed.model_dump()
+
+def iter_ingest_events(text: str = "", label: str = "", sdate: str = "",
+                       pages: Optional[Iterable[str]] = None):
+    """
+    Streaming run_ingest_pipeline: yields (event, data) pairs
+      ("start",  { chunks, tokens })                          tokens: prompt_token_report
+      ("chunk",  { index, status, projects, global_notes })   per chunk, as it settles,
+                 projects sanitized (not yet merged across chunks)
+      ("result", OutputPayload)                                 the merged, validated payload
+    """
+    parts, chunk_hints = _chunks_and_hints([text] if pages is None else pages, label, sdate)
+    tokens = prompt_token_report(parts, chunk_hints)
+    _count_prompt_tokens(tokens)
+    yield "start", {"chunks": len(parts), "tokens": tokens}
+    partials: List[Optional[dict]] = [None] * len(parts)
+    for i, status, partial in metrics.timed_iter("llm", iter_extract_chunks(parts, chunk_hints)):
+        partials[i] = partial
+        # sanitize a copy; the final merge sanitizes the originals again
+        chunk_out = _sanitize_llm_output(copy.deepcopy(partial))
+        yield "chunk", {"index": i, "status": status, "projects": chunk_out["projects"],
+                        "global_notes": chunk_out["global_notes"]}
+    yield "result", _finalize_partials(partials)
+
+def _sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+# --- async ingest jobs ---
+from jobs import JobQueue, JobStore
+
+JOBS_DB_PATH = os.getenv("JOBS_DB_PATH", os.path.join(BASE_DIR, "ingest_jobs.sqlite3"))
+JOB_UPLOAD_DIR = os.getenv("JOB_UPLOAD_DIR", os.path.join(BASE_DIR, "job_uploads"))
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+# a running job without a heartbeat this long is assumed orphaned by a dead process
+# (on this host a dead owner pid is noticed sooner, by the next sweep)
+JOB_STALE_SECONDS = float(os.getenv("JOB_STALE_SECONDS", str(max(600.0, INGEST_DEADLINE_SECONDS * 2))))
+# sweep and heartbeat period; keep it well below JOB_STALE_SECONDS
+JOB_SWEEP_SECONDS = float(os.getenv("JOB_SWEEP_SECONDS", "30"))
+# a job whose worker died this many times is failed instead of retried
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+
+def _run_ingest_job(job_input: dict, progress) -> dict:
+    pdf_path = job_input.get("pdf_path")
+    label, sdate = job_input.get("label", ""), job_input.get("sdate", "")
+    if pdf_path:
+        return run_ingest_pipeline(label=label, sdate=sdate, progress=progress, pages=iter_pdf_pages(pdf_path))
+    return run_ingest_pipeline(job_input.get("text") or "", label, sdate, progress=progress)
+
+def _remove_job_upload(job_input: dict) -> None:
+    pdf_path = job_input.get("pdf_path")
+    if pdf_path and os.path.exists(pdf_path):
+        os.remove(pdf_path)
+
+job_queue = JobQueue(JobStore(JOBS_DB_PATH), _run_ingest_job, workers=JOB_WORKERS,
+                     max_attempts=JOB_MAX_ATTEMPTS, cleanup=_remove_job_upload)
+
+def start_background_jobs() -> None:
+    """
+    Resume queued/orphaned ingest jobs and start the periodic sweep, once per serving
+    process. Called by wsgi.py and the dev server, not at import: spawned PDF workers
+    re-import the main module (as __mp_main__) and must not pick up jobs.
+    """
+    if os.getenv("JOBS_RESUME_ON_START", "1") != "1":
+        return
+    try:
+        job_queue.start(JOB_STALE_SECONDS, JOB_SWEEP_SECONDS)
+    except Exception as e:
+        print(f"Could not resume ingest jobs: {e}")
+
+def _enqueue_ingest_job(source: dict):
+    job_input = {"label": source["label"], "sdate": source["sdate"]}
+    if source["pdf"] is not None:
+        os.makedirs(JOB_UPLOAD_DIR, exist_ok=True)
+        pdf_path = os.path.join(JOB_UPLOAD_DIR, f"{uuid.uuid4().hex}.pdf")
+        source["pdf"].save(pdf_path)
+        job_input["pdf_path"] = pdf_path
+    else:
+        job_input["text"] = source["text"]
+    job_id = job_queue.submit(job_input)
+    resp = jsonify({"job_id": job_id, "status": "queued", "status_url": f"/jobs/{job_id}"})
+    resp.headers["Location"] = f"/jobs/{job_id}"
+    return resp, 202
+
+# --- batch ingest (many documents, one shared LLM in-flight limit) ---
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "100"))
+# documents read/chunked at once; their chunks all queue on one LLM_MAX_IN_FLIGHT pool
+BATCH_MAX_DOCUMENTS = int(os.getenv("BATCH_MAX_DOCUMENTS", "4"))
+BATCH_DEADLINE_SECONDS = float(os.getenv("BATCH_DEADLINE_SECONDS", str(INGEST_DEADLINE_SECONDS * 10)))
+
+def _read_batch_inputs(spool: ExitStack) -> List[dict]:
+    """
+    Parse a batch request into a list of {label, sdate, text, pdf_path, error}.
+    multipart/form-data: repeated `file` and/or `raw_text` fields, shared source_label/source_date
+    (files default to their filename as label).
+    application/json: { "items": [ { raw_text, source_label?, source_date? }, ... ] }
+    PDFs are spooled to temp files registered on `spool`. A bad item gets `error` set
+    instead of failing the whole batch.
+    """
+    ctype = request.headers.get("Content-Type","")
+    items = []
+    if "multipart/form-data" in ctype:
+        label = (request.form.get("source_label") or "").strip()
+        sdate = (request.form.get("source_date") or "").strip()
+        for raw_text in request.form.getlist("raw_text"):
+            if raw_text.strip():
+                items.append({"label": label, "sdate": sdate, "text": normalize_text(raw_text.strip())})
+        for f in request.files.getlist("file"):
+            item = {"label": label or f.filename or "", "sdate": sdate}
+            if f.mimetype != "application/pdf":
+                item["error"] = "Only PDF or raw_text supported"
+            else:
+                item["pdf_path"] = spool.enter_context(spooled_pdf(f))
+            items.append(item)
+
+    elif "application/json" in ctype:
+        data = request.get_json(silent=True) or {}
+        raw_items = data.get("items") if isinstance(data, dict) else data
+        for entry in raw_items if isinstance(raw_items, list) else []:
+            entry = entry if isinstance(entry, dict) else {}
+            item = {"label": (entry.get("source_label") or "").strip(),
+                    "sdate": (entry.get("source_date") or "").strip()}
+            text = (entry.get("raw_text") or "").strip()
+            if text:
+                item["text"] = normalize_text(text)
+            else:
+                item["error"] = "raw_text required for JSON items"
+            items.append(item)
+
+    else:
+        raise IngestError("Unsupported Content-Type", 415)
+
+    if not items:
+        raise IngestError("Provide at least one raw_text item or PDF file", 400)
+    if len(items) > BATCH_MAX_ITEMS:
+        raise IngestError(f"At most {BATCH_MAX_ITEMS} items per batch", 413)
+    return items
+
+def _until_cancelled(pages: Iterator[str], cancelled: threading.Event) -> Iterator[str]:
+    """`pages`, stopping (and closing the extractor) once the batch is cancelled."""
+    try:
+        for page in pages:
+            if cancelled.is_set():
+                raise IngestError("Batch cancelled", 499)  # client closed the request
+            yield page
+    finally:
+        pages.close()
+
+def _run_batch_item(item: dict, chunk_pool, deadline_at: float, cancelled: threading.Event) -> dict:
+    if item.get("error"):
+        raise IngestError(item["error"], 400)
+    if cancelled.is_set():
+        raise IngestError("Batch cancelled", 499)
+    remaining = max(0.001, deadline_at - time.monotonic())
+    if item.get("pdf_path"):
+        pages = _until_cancelled(iter_pdf_pages(item["pdf_path"]), cancelled)
+        return run_ingest_pipeline(label=item["label"], sdate=item["sdate"], pages=pages,
+                                   chunk_pool=chunk_pool, deadline_s=remaining)
+    return run_ingest_pipeline(item["text"], item["label"], item["sdate"],
+                               chunk_pool=chunk_pool, deadline_s=remaining)
+
+def iter_batch_results(items: List[dict]):
+    """
+    Run every item through the ingest pipeline and yield one result dict per item as it
+    finishes (completion order), then a summary line. All chunks of all documents share
+    one LLM_MAX_IN_FLIGHT pool and one BATCH_DEADLINE_SECONDS deadline.
+    """
+    deadline_at = time.monotonic() + BATCH_DEADLINE_SECONDS
+    cancelled = threading.Event()
+    chunk_pool = ThreadPoolExecutor(max_workers=max(1, LLM_MAX_IN_FLIGHT), thread_name_prefix="llm-batch")
+    doc_pool = ThreadPoolExecutor(max_workers=max(1, min(BATCH_MAX_DOCUMENTS, len(items))),
+                                  thread_name_prefix="ingest-batch")
+    succeeded = 0
+    try:
+        futures = {doc_pool.submit(_run_batch_item, item, chunk_pool, deadline_at, cancelled): i
+                   for i, item in enumerate(items)}
+        for fut in as_completed(futures):
+            i = futures[fut]
+            line = {"index": i, "source_label": items[i]["label"]}
+            try:
+                line.update(status="succeeded", result=fut.result())
+                succeeded += 1
+            except IngestError as e:
+                line.update(status="failed", **e.to_dict())
+            except Exception as e:
+                line.update(status="failed", error=str(e))
+            yield line
+    finally:
+        # on client disconnect, stop the batch before the route deletes the spooled PDFs:
+        # drop queued documents and LLM calls, have running documents stop at their next
+        # page, and wait for them (they only wait on LLM calls already in flight)
+        cancelled.set()
+        chunk_pool.shutdown(wait=False, cancel_futures=True)
+        doc_pool.shutdown(wait=True, cancel_futures=True)
+    yield {"done": True, "total": len(items), "succeeded": succeeded, "failed": len(items) - succeeded}
 
 # ----------------- API -----------------
 @app.route("/ingest-and-summarize", methods=["POST"])
@@ -391,79 +824,141 @@ def ingest_and_summarize():
         - source_date: YYYY-MM-DD (optional)
       OR application/json:
         { "raw_text": "...", "source_label": "...", "source_date": "YYYY-MM-DD" }
+    Query: ?mode=async queues the work and returns 202 { job_id, status_url } instead.
+           ?mode=stream returns text/event-stream: `start`, one `chunk` event per chunk
+           as it finishes, then `result` (the OutputPayload) or `error`.
     Returns: OutputPayload JSON or { error, details? }
+             (header X-Ingest-Report: estimated prompt vs. content tokens, model calls/retries/repairs)
     """
     try:
-        ctype = request.headers.get("Content-Type","")
-        label = (request.form.get("source_label") if "multipart/form-data" in ctype else None) or ""
-        sdate = (request.form.get("source_date") if "multipart/form-data" in ctype else None) or ""
-
-        if "multipart/form-data" in ctype:
-            raw_text = (request.form.get("raw_text") or "").strip()
-            if raw_text:
-                text = normalize_text(raw_text)
-            elif "file" in request.files:
-                f = request.files["file"]
-                if not f or f.mimetype != "application/pdf":
-                    return jsonify({"error":"Only PDF or raw_text supported"}), 400
-                text = pdf_to_text(f.read())
-            else:
-                return jsonify({"error":"Provide raw_text or a PDF file"}), 400
-
-        elif "application/json" in ctype:
-            data = request.get_json(silent=True) or {}
-            label = (data.get("source_label") or "").strip()
-            sdate = (data.get("source_date") or "").strip()
-            text = (data.get("raw_text") or "").strip()
-            if not text:
-                return jsonify({"error":"raw_text required for JSON requests"}), 400
-            text = normalize_text(text)
+        source = _read_ingest_input()
+        if request.args.get("mode") == "async":
+            return _enqueue_ingest_job(source)
+        if request.args.get("mode") == "stream":
+            return _stream_ingest(source)
 
+        report = {}
+        if source["pdf"] is not None:
+            # spool to disk and stream pages into the chunker instead of f.read()
+            with spooled_pdf(source["pdf"]) as path:
+                payload = run_ingest_pipeline(label=source["label"], sdate=source["sdate"],
+                                              pages=iter_pdf_pages(path), report=report)
         else:
-            return jsonify({"error":"Unsupported Content-Type"}), 415
+            payload = run_ingest_pipeline(source["text"], source["label"], source["sdate"], report=report)
+        resp = jsonify(payload)
+        resp.headers["X-Ingest-Report"] = json.dumps(report, separators=(",", ":"))
+        return resp, 200
 
-        if not text:
-            return jsonify({"error":"No readable text found"}), 422
+    except IngestError as e:
+        return jsonify(e.to_dict()), e.status
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
 
-        # provenance note + hints
-        provenance = f'[SOURCE: label="{label}", date={sdate}]'
-        combined = f"{provenance}\n{text}".strip()
-        hints = make_hints_for_any_text(combined, label=label, sdate=sdate)
+def _stream_ingest(source: dict):
+    # the upload has to be spooled here: the request (and its files) is closed before
+    # the generator runs. Until the response owns the spool, any error deletes it.
+    spool = ExitStack()
+    try:
+        pages = None
+        if source["pdf"] is not None:
+            pages = iter_pdf_pages(spool.enter_context(spooled_pdf(source["pdf"])))
 
-        parts = chunk_text(combined)
-        if len(parts) == 1:
-            raw_out = call_llm_json(parts[0], hints)
-        else:
-            # Call per chunk and merge (simple concatenation + dedupe)
-            partials = [call_llm_json(p, hints) for p in parts]
-            raw_out = {"project_year": None, "projects": [], "global_notes": []}
-            for p in partials:
-                if raw_out["project_year"] is None and p.get("project_year"):
-                    raw_out["project_year"] = p["project_year"]
-                if isinstance(p.get("projects"), list):
-                    raw_out["projects"].extend(p["projects"])
-                if isinstance(p.get("global_notes"), list):
-                    raw_out["global_notes"].extend(p["global_notes"])
+        def generate():
+            try:
+                for event, data in iter_ingest_events(source["text"] or "", source["label"], source["sdate"], pages):
+                    yield _sse(event, data)
+            except IngestError as e:
+                yield _sse("error", {**e.to_dict(), "status": e.status})
+            except Exception as e:
+                yield _sse("error", {"error": str(e), "status": 500})
 
-        # sanitize, dedupe, validate
-        raw_out = _sanitize_llm_output(raw_out)
-        if isinstance(raw_out.get("projects"), list):
-            raw_out["projects"] = merge_projects_by_trial_id(raw_out["projects"])
+        resp = Response(generate(), mimetype="text/event-stream")
+        resp.headers["Cache-Control"] = "no-cache"
+        resp.headers["X-Accel-Buffering"] = "no"  # keep nginx from buffering the stream
+        resp.call_on_close(spool.close)
+    except BaseException:
+        spool.close()
+        raise
+    return resp
 
-        try:
-            parsed = OutputPayload.model_validate(raw_out)
-        except ValidationError as ve:
-            return jsonify({"error":"LLM JSON validation failed", "details": json.loads(ve.json())}), 502
+@app.route("/jobs/<job_id>", methods=["GET", "OPTIONS"])
+def get_ingest_job(job_id):
+    """Status, per-chunk progress and (when finished) the OutputPayload of an async ingest."""
+    if request.method == "OPTIONS":
+        return ("", 204)
+
+    job = job_queue.store.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job), 200
 
-        return jsonify(parsed.model_dump()), 200
+@app.route("/ingest-batch", methods=["POST", "OPTIONS"])
+def ingest_batch():
+    """
+    Ingest many documents in one request (see _read_batch_inputs for the body).
+    Streams application/x-ndjson: one line per document as it finishes,
+      { index, source_label, status: "succeeded", result: OutputPayload }
+      { index, source_label, status: "failed", error, details? }
+    followed by { done: true, total, succeeded, failed }.
+    """
+    if request.method == "OPTIONS":
+        return ("", 204)
 
+    spool = ExitStack()
+    try:
+        items = _read_batch_inputs(spool)
+    except IngestError as e:
+        spool.close()
+        return jsonify(e.to_dict()), e.status
     except Exception as e:
+        spool.close()
         return jsonify({"error": str(e)}), 500
 
+    def generate():
+        for line in iter_batch_results(items):
+            yield json.dumps(line) + "\n"
+
+    resp = Response(generate(), mimetype="application/x-ndjson")
+    # temp PDFs live until the stream is done (or the client goes away)
+    resp.call_on_close(spool.close)
+    return resp
+
 @app.get("/health")
 def health():
     return jsonify({"ok": True, "time": datetime.utcnow().isoformat()})
 
+def _cache_and_limiter_metrics():
+    """Scrape-time view of the caches and the Gemini rate limiter."""
+    from gemini_client import limiter
+
+    caches = {"research": research_cache.stats(), "auth_token": token_cache.stats()}
+    if extraction_cache is not None:
+        caches["extraction"] = extraction_cache.stats()
+    lim = limiter.stats()
+    return [
+        ("cache_hits_total", "counter", "Cache hits.", [({"cache": n}, c["hits"]) for n, c in caches.items()]),
+        ("cache_misses_total", "counter", "Cache misses.", [({"cache": n}, c["misses"]) for n, c in caches.items()]),
+        ("cache_hit_ratio", "gauge", "Hits / lookups since start.",
+         [({"cache": n}, round(c["hit_rate"], 4)) for n, c in caches.items()]),
+        ("cache_entries", "gauge", "Entries currently cached.", [({"cache": n}, c["entries"]) for n, c in caches.items()]),
+        ("llm_admitted_total", "counter", "LLM calls admitted by the rate limiter.", [({}, lim["admitted"])]),
+        ("llm_throttled_total", "counter", "LLM calls the provider throttled (429/503).", [({}, lim["throttled"])]),
+        ("llm_failed_total", "counter", "LLM calls that failed with other errors.", [({}, lim["failed"])]),
+        ("llm_admission_timeouts_total", "counter", "LLM calls that timed out waiting for admission.",
+         [({}, lim["timeouts"])]),
+        ("llm_admission_wait_seconds_total", "counter", "Time spent waiting for admission.", [({}, lim["wait_seconds"])]),
+        ("llm_in_flight", "gauge", "LLM calls in flight.", [({}, lim["in_flight"])]),
+        ("llm_rate_scale", "gauge", "Rate limiter throughput scale after backoff (1 = full rate).",
+         [({}, lim["rate_scale"])]),
+    ]
+
+metrics.register_collector(_cache_and_limiter_metrics)
+
+@app.get("/metrics")
+def metrics_endpoint():
+    """Prometheus text format: request/stage/storage/LLM histograms, LLM counters, cache + rate-limiter stats."""
+    return Response(metrics.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
 @app.route("/generate-email", methods=["POST", "OPTIONS"])
 def generate_email():
     """
@@ -509,6 +1004,14 @@ def generate_email():
         return jsonify({"error": str(e)}), 500
 
 # ----------------- Auth Helpers -----------------
+from password_hashing import PasswordHashBusy, check_password, hash_password
+
+def _hash_busy(e: PasswordHashBusy):
+    """Logins shed load on their own instead of tying up request threads."""
+    resp = jsonify({"error": f"{e}, please retry shortly"})
+    resp.headers["Retry-After"] = "1"
+    return resp, 503
+
 def create_token(user_id: str, email: str, role: str) -> str:
     """Create JWT token."""
     payload = {
@@ -519,14 +1022,34 @@ def create_token(user_id: str, email: str, role: str) -> str:
     }
     return jwt.encode(payload, JWT_SECRET, algorithm="HS256")
 
+# verified claims per token (until exp) + logout revocations, see token_cache.py
+from token_cache import RevocationStore, TokenCache, token_key
+
+TOKEN_CACHE_MAX_ENTRIES = int(os.getenv("TOKEN_CACHE_MAX_ENTRIES", "10000"))
+# revocations shared by every worker on this host (empty: this process only)
+REVOKED_TOKENS_PATH = os.getenv("REVOKED_TOKENS_PATH", os.path.join(BASE_DIR, "revoked_tokens.sqlite3"))
+token_cache = TokenCache(TOKEN_CACHE_MAX_ENTRIES,
+                         RevocationStore(REVOKED_TOKENS_PATH) if REVOKED_TOKENS_PATH else None)
+
 def verify_token(token: str) -> dict:
-    """Verify JWT token."""
+    """Verify JWT token (claims are cached until exp; revoked tokens are refused, checked first on every call)."""
+    key = token_key(token)
+    if token_cache.is_revoked(key):
+        raise Exception("Token revoked")
+    claims = token_cache.get(key)
+    if claims is not None:
+        return claims
     try:
-        return jwt.decode(token, JWT_SECRET, algorithms=["HS256"])
+        claims = jwt.decode(token, JWT_SECRET, algorithms=["HS256"])
     except jwt.ExpiredSignatureError:
         raise Exception("Token expired")
     except jwt.InvalidTokenError:
         raise Exception("Invalid token")
+    token_cache.put(key, claims)
+    return claims
+
+def revoke_token(token: str, claims: dict) -> None:
+    token_cache.revoke(token_key(token), claims.get("exp", time.time() + 24 * 3600))
 
 def require_auth(f):
     """Decorator to require authentication."""
@@ -544,10 +1067,11 @@ def require_auth(f):
         token = auth_header.split(" ")[1]
         try:
             user = verify_token(token)
-            request.user = user
-            return f(*args, **kwargs)
         except Exception as e:
             return jsonify({"error": str(e)}), 403
+        request.user = user
+        request.token = token
+        return f(*args, **kwargs)
     
     return decorated
 
@@ -571,14 +1095,15 @@ def auth_register():
         if existing_user:
             return jsonify({"error": "User already exists"}), 400
         
-        # Hash the password
-        hashed_password = bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt())
+        # Hash the password (on the bcrypt pool, see password_hashing.py)
+        hashed_password = hash_password(password)
         
         # Save the new user to Supabase
         user_data = register_user(
             email=email,
-            password=hashed_password.decode("utf-8"),
-            role=role  # save role
+            password_hash=hashed_password,
+            name=(data.get("name") or "").strip() or email.split("@")[0],
+            role=role or "user"  # save role
         )
         
         # Automatically log in the user after registration
@@ -591,6 +1116,8 @@ def auth_register():
             "token": token
         }), 201
     
+    except PasswordHashBusy as e:
+        return _hash_busy(e)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -613,7 +1140,7 @@ def auth_login():
             return jsonify({"error": "Invalid email or password"}), 401
         
         # Check if the password matches
-        if not bcrypt.checkpw(password.encode("utf-8"), user["password"].encode("utf-8")):
+        if not check_password(password, user["password"]):
             return jsonify({"error": "Invalid email or password"}), 401
         
         # Create a JWT token
@@ -626,26 +1153,79 @@ def auth_login():
             "token": token
         }), 200
     
+    except PasswordHashBusy as e:
+        return _hash_busy(e)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route("/api/auth/logout", methods=["POST", "OPTIONS"])
+@require_auth
+def auth_logout():
+    """Revoke the bearer token for the rest of its lifetime."""
+    revoke_token(request.token, request.user)
+    return ("", 204)
+
 # ----------------- Research Data Routes -----------------
+from response_cache import ResponseCache
+
+# serialized read responses; cleared by the write routes below (0 disables caching)
+research_cache = ResponseCache(
+    ttl_seconds=float(os.getenv("RESEARCH_CACHE_TTL_SECONDS", "30")),
+    max_entries=int(os.getenv("RESEARCH_CACHE_MAX_ENTRIES", "256")),
+)
+
+def _cached_json_response(key, load):
+    """
+    JSON response for `load()` served from research_cache, with an ETag;
+    a matching If-None-Match gets a 304 without touching the database.
+    """
+    entry = research_cache.get_or_build(key, lambda: app.json.dumps(load()).encode())
+    resp = Response(entry.body, status=200, mimetype="application/json")
+    resp.set_etag(entry.etag)
+    # always revalidate: writes invalidate the cache, so a stored copy can go stale
+    resp.headers["Cache-Control"] = "no-cache"
+    return resp.make_conditional(request)
+
+RESEARCH_PAGE_DEFAULT = int(os.getenv("RESEARCH_PAGE_DEFAULT", "50"))
+RESEARCH_PAGE_MAX = int(os.getenv("RESEARCH_PAGE_MAX", "200"))
+
+def _load_research(year: Optional[int] = None, fields: Optional[tuple] = None) -> list:
+    data = get_research_by_year(year, fields) if year is not None else get_all_research(fields)
+    print(f"Returning {len(data)} research items from database" + (f" for year {year}" if year is not None else ""))
+    return data
+
+def _load_research_page(limit: int, cursor: Optional[str], year: Optional[int], fields: Optional[tuple]) -> dict:
+    rows, next_cursor = get_research_page(limit, cursor=cursor, year=year, fields=fields)
+    print(f"Returning {len(rows)} research items from database (page)")
+    return {"items": rows, "next_cursor": next_cursor}
+
 @app.route("/api/research", methods=["GET", "OPTIONS"])
 def get_research():
-    """Get all research data from Supabase database."""
+    """
+    Get research data from Supabase database.
+    Query (all optional):
+      year=2024            only that year
+      fields=title,year    column projection (id and year are always included)
+      limit=50 / cursor=…  keyset pagination in (year desc, id desc) order; returns
+                           { items, next_cursor } instead of a bare list
+    """
     if request.method == "OPTIONS":
         return ("", 204)
     
     try:
         year = request.args.get("year")
-        
-        if year:
-            data = get_research_by_year(int(year))
-        else:
-            data = get_all_research()
-        
-        print(f"Returning {len(data)} research items from database")
-        return jsonify(data), 200
+        year = int(year) if year else None
+        fields = tuple(f for f in (request.args.get("fields") or "").split(",") if f.strip()) or None
+        cursor = request.args.get("cursor") or None
+        limit = request.args.get("limit")
+        if limit is None and cursor is None:
+            return _cached_json_response(("research", year, fields), lambda: _load_research(year, fields))
+
+        limit = min(max(1, int(limit)), RESEARCH_PAGE_MAX) if limit else RESEARCH_PAGE_DEFAULT
+        return _cached_json_response(("research-page", year, fields, limit, cursor),
+                                     lambda: _load_research_page(limit, cursor, year, fields))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         print(f"Error fetching research: {e}")
         return jsonify({"error": str(e)}), 500
@@ -657,9 +1237,7 @@ def get_research_by_year_route(year):
         return ("", 204)
     
     try:
-        data = get_research_by_year(year)
-        print(f"Returning {len(data)} research items for year {year}")
-        return jsonify(data), 200
+        return _cached_json_response(("research", year, None), lambda: _load_research(year))
     except Exception as e:
         print(f"Error fetching research for year {year}: {e}")
         return jsonify({"error": str(e)}), 500
@@ -691,6 +1269,7 @@ def add_research_manual():
             created_by=request.user["id"]
         )
         
+        research_cache.invalidate()
         print(f"Successfully saved research tile: {research_data}")
         return jsonify(research_data), 201
         
@@ -700,6 +1279,77 @@ def add_research_manual():
         traceback.print_exc()
         return jsonify({"error": str(e)}), 500
 
+# --- bulk add (admin dashboard approving many extracted tiles at once) ---
+RESEARCH_BULK_MAX_ITEMS = int(os.getenv("RESEARCH_BULK_MAX_ITEMS", "200"))
+
+class ResearchTileIn(BaseModel):
+    title: str = Field(min_length=1)
+    year: int = Field(gt=0)
+    impact: str = ""
+    money: str = ""
+    summary: str = ""
+    pdf_id: Optional[str] = None
+
+    @field_validator("title", "impact", "money", "summary", mode="before")
+    @classmethod
+    def _strip(cls, v):
+        return "" if v is None else (v.strip() if isinstance(v, str) else v)
+
+@app.route("/api/research/bulk-add", methods=["POST", "OPTIONS"])
+@require_auth
+def add_research_bulk():
+    """
+    Add many research tiles in one write.
+    Body: { "tiles": [ { title, year, impact?, money?, summary?, pdf_id? }, ... ] }
+    Each tile is validated on its own; the valid ones get an id here, are saved with a
+    single insert and the read caches are cleared once. Saved rows are matched back to
+    tiles by id, so a tile the database did not return is reported as failed rather than
+    credited with another tile's row. Returns { created, failed, results: [ { index,
+    status: "created" | "invalid" | "failed", item | errors | error } ] } in request
+    order: 201 when at least one tile was saved, 400 when none were valid, 500 when
+    valid tiles were sent but none came back.
+    """
+    data = request.get_json(silent=True) or {}
+    tiles = data.get("tiles") if isinstance(data, dict) else None
+    if not isinstance(tiles, list) or not tiles:
+        return jsonify({"error": "Body must be {\"tiles\": [...]} with at least one tile"}), 400
+    if len(tiles) > RESEARCH_BULK_MAX_ITEMS:
+        return jsonify({"error": f"At most {RESEARCH_BULK_MAX_ITEMS} tiles per request"}), 413
+
+    results, valid, valid_idx = [], [], []
+    for i, raw in enumerate(tiles):
+        try:
+            tile = ResearchTileIn.model_validate(raw)
+        except ValidationError as ve:
+            results.append({"index": i, "status": "invalid", "errors": json.loads(ve.json())})
+            continue
+        results.append(None)
+        valid.append({**tile.model_dump(), "id": str(uuid.uuid4())})
+        valid_idx.append(i)
+
+    created = 0
+    if valid:
+        try:
+            rows = save_research_batch(valid)
+        except Exception as e:
+            print(f"Error bulk-adding research: {e}")
+            import traceback
+            traceback.print_exc()
+            return jsonify({"error": str(e)}), 500
+        research_cache.invalidate()
+        saved = {row.get("id"): row for row in rows or []}
+        for i, tile in zip(valid_idx, valid):
+            row = saved.get(tile["id"])
+            if row is None:
+                results[i] = {"index": i, "status": "failed", "error": "Tile was not saved by the database"}
+            else:
+                results[i] = {"index": i, "status": "created", "item": row}
+                created += 1
+        print(f"Bulk-saved {created} of {len(valid)} research tiles ({len(tiles) - len(valid)} invalid)")
+
+    body = {"created": created, "failed": len(tiles) - created, "results": results}
+    return jsonify(body), (201 if created else 500 if valid else 400)
+
 @app.route("/api/research/update/<research_id>", methods=["PUT", "OPTIONS"])
 @require_auth
 def update_research(research_id):
@@ -719,19 +1369,20 @@ def update_research(research_id):
             return jsonify({"error": "Title and year are required"}), 400
         
         # Update in Supabase
-        result = supabase.table("research_data").update({
+        updated = update_research_data(research_id, {
             "title": title,
             "year": int(year),
             "impact": impact,
             "money": money,
             "updated_at": datetime.utcnow().isoformat()
-        }).eq("id", research_id).execute()
+        })
         
-        if not result.data:
+        if not updated:
             return jsonify({"error": "Research tile not found"}), 404
         
+        research_cache.invalidate()
         print(f"Successfully updated research tile: {research_id}")
-        return jsonify(result.data[0]), 200
+        return jsonify(updated), 200
         
     except Exception as e:
         print(f"Error updating research: {e}")
@@ -740,4 +1391,9 @@ def update_research(research_id):
         return jsonify({"error": str(e)}), 500
 
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=int(os.getenv("PORT", "8000")), debug=True)
+    # development server only; production: gunicorn -c gunicorn.conf.py wsgi:app
+    debug = os.getenv("FLASK_DEBUG", "0") == "1"
+    if not debug or os.getenv("WERKZEUG_RUN_MAIN") == "true":  # with the reloader, only in the serving child
+        start_background_jobs()
+    app.run(host="0.0.0.0", port=int(os.getenv("PORT", "8000")),
+            debug=debug, threaded=True)
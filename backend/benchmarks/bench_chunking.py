@@ -0,0 +1,64 @@
+"""
+Compare the fixed-window chunker with the semantic chunker.
+
+    python benchmarks/bench_chunking.py                 # synthetic reports
+    python benchmarks/bench_chunking.py report.pdf ...  # your own PDFs
+
+For each report: chunk count, estimated tokens sent (sum over chunks), and how many
+trial ids end up spread over more than one chunk (a proxy for split sections).
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chunking import ChunkStream, SemanticChunker, estimate_tokens  # noqa: E402
+from text_processing import TRIAL_ID_RE  # noqa: E402
+from synthetic_reports import make_report_pages  # noqa: E402
+
+
+def _split_trials(chunks) -> int:
+    seen = {}
+    for i, c in enumerate(chunks):
+        for m in TRIAL_ID_RE.finditer(c):
+            seen.setdefault(m.group(0).upper(), set()).add(i)
+    return sum(1 for idx in seen.values() if len(idx) > 1)
+
+
+def _run(chunker, pages):
+    start = time.perf_counter()
+    chunker.feed('[SOURCE: label="bench", date=]')
+    sep = "\n"
+    for page in pages:
+        chunker.feed(sep + page)
+        sep = "\n\n"
+    chunks = chunker.finish()
+    elapsed = time.perf_counter() - start
+    return chunks, elapsed
+
+
+def compare(name: str, pages) -> None:
+    total_tokens = sum(estimate_tokens(p) for p in pages)
+    print(f"\n{name}: {len(pages)} pages, ~{total_tokens:,} content tokens")
+    print(f"  {'chunker':<10}{'chunks':>8}{'tokens sent':>14}{'overhead':>10}{'split trials':>14}{'ms':>8}")
+    for label, chunker in (("fixed", ChunkStream()), ("semantic", SemanticChunker())):
+        chunks, elapsed = _run(chunker, pages)
+        sent = sum(estimate_tokens(c) for c in chunks)
+        overhead = (sent / total_tokens - 1) * 100 if total_tokens else 0.0
+        print(f"  {label:<10}{len(chunks):>8}{sent:>14,}{overhead:>9.1f}%{_split_trials(chunks):>14}"
+              f"{elapsed * 1000:>8.1f}")
+
+
+def main(argv) -> None:
+    if argv:
+        from pdf_stream import iter_pdf_pages
+        for path in argv:
+            compare(os.path.basename(path), list(iter_pdf_pages(path)))
+        return
+    for trials in (5, 20, 60):
+        compare(f"synthetic {trials} trials", make_report_pages(trials=trials, seed=trials))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
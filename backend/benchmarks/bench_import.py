@@ -0,0 +1,99 @@
+"""
+Worker cold start: time to `import app` in a fresh interpreter (what every gunicorn
+worker and test process pays), plus the first-use costs that were moved out of it.
+
+    python benchmarks/bench_import.py [--runs 7]
+    python benchmarks/bench_import.py --ref HEAD~1    # also measure another commit
+
+--ref checks the given commit out into a temporary git worktree and runs the same
+measurement there, so before/after numbers come from one machine and one run.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# runs inside the child interpreter; prints a JSON dict of timings in ms
+_PROBE = r"""
+import json, time
+t0 = time.perf_counter()
+import app
+t1 = time.perf_counter()
+out = {"import_app": (t1 - t0) * 1000}
+with app.app.test_client() as tc:
+    tc.get("/health")
+out["first_health"] = (time.perf_counter() - t1) * 1000
+t2 = time.perf_counter()
+if hasattr(app, "get_model"):
+    app.get_model()
+elif getattr(app, "model", None) is None:  # provider layer: build the Gemini model it would use
+    import gemini_client
+    gemini_client.get_model(app.GEMINI_MODEL_NAME)
+out["first_model"] = (time.perf_counter() - t2) * 1000
+t3 = time.perf_counter()
+import fitz
+out["first_fitz"] = (time.perf_counter() - t3) * 1000
+print(json.dumps(out))
+"""
+
+
+def _env(tmp: str) -> dict:
+    env = dict(os.environ)
+    env.update({
+        "STORAGE_BACKEND": "sqlite",
+        "SQLITE_DB_PATH": os.path.join(tmp, "data.sqlite3"),
+        "EXTRACTION_CACHE_PATH": "",
+        "JOBS_DB_PATH": os.path.join(tmp, "jobs.sqlite3"),
+        "JOB_UPLOAD_DIR": os.path.join(tmp, "uploads"),
+        "JOBS_RESUME_ON_START": "0",
+        # older trees create the Supabase client at import and need these set
+        "SUPABASE_URL": env.get("SUPABASE_URL", "https://example.supabase.co"),
+        "SUPABASE_KEY": env.get("SUPABASE_KEY", "eyJhbGciOiJIUzI1NiJ9.e30.x"),
+    })
+    return env
+
+
+def measure(backend_dir: str, runs: int) -> dict:
+    samples = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for _ in range(runs):
+            out = subprocess.run([sys.executable, "-c", _PROBE], cwd=backend_dir, env=_env(tmp),
+                                 capture_output=True, text=True, check=True)
+            samples.append(json.loads(out.stdout.strip().splitlines()[-1]))
+    return {k: statistics.median(s[k] for s in samples) for k in samples[0]}
+
+
+def _print(label: str, result: dict) -> None:
+    print(f"{label:<12}" + "".join(f"{result[k]:>14.1f}" for k in ("import_app", "first_health", "first_model", "first_fitz")))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=7)
+    parser.add_argument("--ref", help="git ref to compare against (checked out in a temp worktree)")
+    args = parser.parse_args()
+
+    print(f"median of {args.runs} fresh interpreters, ms")
+    print(f"{'tree':<12}{'import app':>14}{'1st /health':>14}{'1st model':>14}{'1st fitz':>14}")
+    if args.ref:
+        repo = subprocess.run(["git", "rev-parse", "--show-toplevel"], cwd=BACKEND_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+        with tempfile.TemporaryDirectory() as tmp:
+            worktree = os.path.join(tmp, "tree")
+            subprocess.run(["git", "worktree", "add", "--detach", worktree, args.ref], cwd=repo,
+                           capture_output=True, check=True)
+            try:
+                sub = os.path.relpath(BACKEND_DIR, repo)
+                _print(args.ref, measure(os.path.join(worktree, sub), args.runs))
+            finally:
+                subprocess.run(["git", "worktree", "remove", "--force", worktree], cwd=repo, capture_output=True)
+    _print("current", measure(BACKEND_DIR, args.runs))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+"""
+End-to-end ingest benchmark on a synthetic grant report, stage by stage.
+
+    python benchmarks/bench_ingest.py                        # compare with the saved baseline
+    python benchmarks/bench_ingest.py --trials 200 --latency-ms 300
+    python benchmarks/bench_ingest.py --save-baseline        # record the current numbers
+
+Writes a multi-page report PDF (synthetic_reports.py, `--trials` sections of
+`--paragraphs` paragraphs) and runs it through the same functions as
+/ingest-and-summarize, with the LLM replaced by the stub provider (`--latency-ms`
+per call), so no network is needed:
+
+    pdf        pdf_to_text (PyMuPDF extraction + per-page normalization)
+    normalize  normalize_text over the raw page text (the part of `pdf` that is ours)
+    chunk      the configured chunker (CHUNKER)
+    hints      HintIndex scan + per-chunk hints
+    llm        extract_chunks fan-out (LLM_MAX_IN_FLIGHT calls in flight)
+    sanitize   _merge_partials + _sanitize_llm_output
+    merge      merge_projects (reduce stage)
+    validate   OutputPayload validation
+
+For each stage: best-of-`--repeat` wall time and peak traced Python memory (a separate
+tracemalloc pass, so tracing does not inflate the timings), plus overall throughput.
+The baseline (benchmarks/ingest_baseline.json) is machine-specific: stages slower than
+`--tolerance` times their baseline are reported and the exit status is 1.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+# no caches, no job recovery; the LLM is the local stub
+os.environ.setdefault("EXTRACTION_CACHE_PATH", "")
+os.environ.setdefault("JOBS_RESUME_ON_START", "0")
+os.environ.setdefault("LLM_PROVIDER", "stub")
+
+import app as appmod  # noqa: E402
+import llm_providers  # noqa: E402
+from chunking import ChunkStream, SemanticChunker  # noqa: E402
+from project_merge import merge_projects  # noqa: E402
+from text_processing import HintIndex, normalize_text  # noqa: E402
+from synthetic_reports import make_report_pdf  # noqa: E402
+
+BASELINE_PATH = os.path.join(BENCH_DIR, "ingest_baseline.json")
+STAGES = ("pdf", "normalize", "chunk", "hints", "llm", "sanitize", "merge", "validate")
+
+
+def _raw_pages(path: str):
+    import fitz
+    with fitz.open(path) as doc:
+        return [f"[PDF p{i}]\n{page.get_text('text')}" for i, page in enumerate(doc, start=1)]
+
+
+def run_once(pdf_bytes: bytes, raw_pages, trace: bool = False) -> dict:
+    """{stage: seconds} or, with `trace`, {stage: peak bytes}, plus the final payload under "_out"."""
+    out = {}
+
+    def stage(name, fn, *args):
+        if trace:
+            tracemalloc.start()
+        start = time.perf_counter()
+        result = fn(*args)
+        elapsed = time.perf_counter() - start
+        if trace:
+            out[name] = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        else:
+            out[name] = elapsed
+        return result
+
+    text = stage("pdf", appmod.pdf_to_text, pdf_bytes)
+    stage("normalize", lambda: [normalize_text(p) for p in raw_pages])
+
+    def chunk():
+        chunker = ChunkStream() if appmod.CHUNKER == "fixed" else SemanticChunker()
+        chunker.feed(text)
+        return chunker.finish()
+    parts = stage("chunk", chunk)
+
+    def hints():
+        index = HintIndex()
+        index.add_text(text)
+        return [index.hints_for_chunk(c, label="bench", sdate="") for c in parts]
+    chunk_hints = stage("hints", hints)
+
+    partials = stage("llm", appmod.extract_chunks, parts, chunk_hints)
+    raw_out = stage("sanitize", lambda: appmod._sanitize_llm_output(appmod._merge_partials(partials)))
+    raw_out["projects"] = stage("merge", merge_projects, raw_out["projects"])
+    payload = stage("validate", appmod.OutputPayload.model_validate, raw_out)
+    out["_out"] = {"pages": len(raw_pages), "chars": len(text), "chunks": len(parts),
+                   "projects": len(payload.projects)}
+    return out
+
+
+def measure(args) -> dict:
+    llm_providers.set_provider(llm_providers.StubProvider(latency_s=args.latency_ms / 1000.0))
+    appmod.extraction_cache = None
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "report.pdf")
+        make_report_pdf(path, trials=args.trials, paragraphs_per_trial=args.paragraphs)
+        with open(path, "rb") as f:
+            pdf_bytes = f.read()
+        raw_pages = _raw_pages(path)
+
+    run_once(pdf_bytes, raw_pages)  # warm-up: imports, PDF worker pool
+    best = {}
+    for _ in range(args.repeat):
+        run = run_once(pdf_bytes, raw_pages)
+        shape = run.pop("_out")
+        for name, secs in run.items():
+            best[name] = min(best.get(name, secs), secs)
+    peaks = run_once(pdf_bytes, raw_pages, trace=True)
+    peaks.pop("_out")
+
+    total = sum(best.values())
+    return {
+        "config": {"trials": args.trials, "paragraphs": args.paragraphs, "latency_ms": args.latency_ms,
+                   "chunker": appmod.CHUNKER, "max_in_flight": appmod.LLM_MAX_IN_FLIGHT},
+        "shape": shape,
+        "stages": {name: {"ms": round(best[name] * 1000, 3), "peak_kb": round(peaks[name] / 1024, 1)}
+                   for name in STAGES},
+        "total_ms": round(total * 1000, 3),
+        "throughput": {"pages_per_s": round(shape["pages"] / total, 1),
+                       "mb_per_s": round(shape["chars"] / total / 1e6, 3),
+                       "chunks_per_s": round(shape["chunks"] / total, 1)},
+    }
+
+
+def compare(result: dict, baseline: dict, tolerance: float) -> list:
+    """Stages slower than `tolerance` x baseline (tiny stages get a 1 ms allowance)."""
+    slower = []
+    for name in STAGES:
+        old = baseline["stages"].get(name, {}).get("ms")
+        new = result["stages"][name]["ms"]
+        if old is not None and new > old * tolerance + 1.0:
+            slower.append(name)
+    return slower
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--trials", type=int, default=60)
+    parser.add_argument("--paragraphs", type=int, default=4)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="stub LLM latency per call")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=1.5, help="allowed slowdown factor per stage")
+    args = parser.parse_args()
+
+    result = measure(args)
+    shape = result["shape"]
+    print(f"{shape['pages']} pages, {shape['chars']:,} chars, {shape['chunks']} chunks -> "
+          f"{shape['projects']} projects (stub LLM {args.latency_ms:g} ms/call)")
+
+    baseline = None
+    if not args.save_baseline and os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get("config") != result["config"]:
+            print(f"baseline {args.baseline} was recorded with {baseline.get('config')}; not comparing")
+            baseline = None
+
+    print(f"  {'stage':<11}{'ms':>10}{'peak KB':>10}{'baseline ms':>13}")
+    for name in STAGES:
+        row = result["stages"][name]
+        old = baseline["stages"][name]["ms"] if baseline and name in baseline["stages"] else None
+        print(f"  {name:<11}{row['ms']:>10.2f}{row['peak_kb']:>10.1f}{'' if old is None else f'{old:.2f}':>13}")
+    tp = result["throughput"]
+    print(f"  {'total':<11}{result['total_ms']:>10.2f}   {tp['pages_per_s']} pages/s, "
+          f"{tp['mb_per_s']} MB/s, {tp['chunks_per_s']} chunks/s")
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(result, f, indent=2)
+            f.write("\n")
+        print(f"saved baseline to {args.baseline}")
+        return
+    if baseline:
+        slower = compare(result, baseline, args.tolerance)
+        if slower:
+            print(f"REGRESSION (> {args.tolerance:g}x baseline): {', '.join(slower)}")
+            sys.exit(1)
+        print("no regressions against baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Login burst vs. the rest of the API: bcrypt inline on request threads vs. on the hash pool.
+
+    python benchmarks/bench_login.py [--logins 16] [--readers 4] [--duration 10]
+    python benchmarks/bench_login.py --rounds 10 --pool-workers 2
+
+For each mode a gunicorn server (threaded profile, SQLite storage) is spawned with
+one registered user. `--logins` clients post /api/auth/login in a loop while
+`--readers` clients read /api/research. The table shows login throughput and
+latency, logins refused with 503, and /api/research latency during the burst.
+"""
+import argparse
+import http.client
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from load_test import BACKEND_DIR, run, spawn  # noqa: E402
+
+sys.path.insert(0, BACKEND_DIR)
+
+EMAIL, PASSWORD = "bench@example.org", "correct horse battery staple"
+
+
+def _seed_user(db_path: str, rounds: int) -> None:
+    import bcrypt
+    from storage import SQLiteStorage
+    store = SQLiteStorage(db_path, os.path.dirname(db_path))
+    hashed = bcrypt.hashpw(PASSWORD.encode("utf-8"), bcrypt.gensalt(rounds)).decode("utf-8")
+    store.insert("users", {"email": EMAIL, "password": hashed, "name": "bench", "role": "user"})
+
+
+def login_burst(url: str, clients: int, duration: float) -> dict:
+    host, port = url.rsplit("//", 1)[1].split(":")
+    body = json.dumps({"email": EMAIL, "password": PASSWORD})
+    latencies, counts = [], {"ok": 0, "busy": 0, "error": 0}
+    lock = threading.Lock()
+    stop_at = time.monotonic() + duration
+
+    def client():
+        conn = http.client.HTTPConnection(host, int(port), timeout=60)
+        mine, local = [], {"ok": 0, "busy": 0, "error": 0}
+        while time.monotonic() < stop_at:
+            start = time.perf_counter()
+            try:
+                conn.request("POST", "/api/auth/login", body, {"Content-Type": "application/json"})
+                resp = conn.getresponse()
+                resp.read()
+            except (OSError, http.client.HTTPException):
+                local["error"] += 1
+                conn.close()
+                conn = http.client.HTTPConnection(host, int(port), timeout=60)
+                continue
+            if resp.status == 200:
+                local["ok"] += 1
+                mine.append(time.perf_counter() - start)
+            elif resp.status == 503:
+                local["busy"] += 1
+                time.sleep(float(resp.getheader("Retry-After") or 1) / 10)
+            else:
+                local["error"] += 1
+        with lock:
+            latencies.extend(mine)
+            for k, v in local.items():
+                counts[k] += v
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    latencies.sort()
+    return {
+        "per_s": counts["ok"] / duration,
+        "p50": statistics.median(latencies) * 1000 if latencies else 0.0,
+        "p99": latencies[max(0, int(len(latencies) * 0.99) - 1)] * 1000 if latencies else 0.0,
+        **counts,
+    }
+
+
+def measure(args, mode: str) -> tuple:
+    os.environ["BCRYPT_ROUNDS"] = str(args.rounds)
+    os.environ["PASSWORD_HASH_WORKERS"] = "0" if mode == "inline" else str(args.pool_workers)
+    server_args = SimpleNamespace(profile="threaded", workers=args.workers, threads=args.threads,
+                                  rows=200, cache=False)
+    with tempfile.TemporaryDirectory() as tmp:
+        proc, url = spawn(server_args, tmp)
+        try:
+            _seed_user(os.path.join(tmp, "data.sqlite3"), args.rounds)
+            reads = {}
+            reader = threading.Thread(target=lambda: reads.update(
+                run(url, "/api/research?limit=20", args.readers, args.duration)))
+            reader.start()
+            logins = login_burst(url, args.logins, args.duration)
+            reader.join()
+            return logins, reads
+        finally:
+            proc.terminate()
+            proc.wait(timeout=30)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--logins", type=int, default=16, help="concurrent login clients")
+    parser.add_argument("--readers", type=int, default=4, help="concurrent /api/research clients")
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--rounds", type=int, default=12, help="bcrypt cost of the seeded user")
+    parser.add_argument("--pool-workers", type=int, default=max(1, (os.cpu_count() or 2) // 2))
+    parser.add_argument("--workers", type=int, default=1, help="gunicorn worker processes")
+    parser.add_argument("--threads", type=int, default=16)
+    args = parser.parse_args()
+
+    print(f"{args.logins} login clients + {args.readers} /api/research clients x {args.duration:g}s, "
+          f"bcrypt cost {args.rounds}, {args.workers} worker(s) x {args.threads} threads")
+    print(f"  {'mode':<12}{'logins/s':>10}{'p50 ms':>9}{'p99 ms':>9}{'503s':>7}{'errors':>8}"
+          f"{'research p50':>14}{'p99 ms':>9}{'req/s':>8}")
+    for mode in ("inline", "pool"):
+        logins, reads = measure(args, mode)
+        label = mode if mode == "inline" else f"pool ({args.pool_workers})"
+        print(f"  {label:<12}{logins['per_s']:>10.1f}{logins['p50']:>9.0f}{logins['p99']:>9.0f}"
+              f"{logins['busy']:>7}{logins['error']:>8}{reads['p50']:>14.1f}{reads['p99']:>9.1f}{reads['rps']:>8.0f}")
+
+
+if __name__ == "__main__":
+    main()
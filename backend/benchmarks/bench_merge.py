@@ -0,0 +1,110 @@
+"""
+Reduce-stage benchmark: merge per-chunk project lists.
+
+    python benchmarks/bench_merge.py [--projects 500] [--unique 120] [--repeat 5]
+
+Builds `--projects` extracted entries for `--unique` real projects, the way overlapping
+chunks return them: same trial id, id missing, id written as PNOC13 vs PNOC013,
+title words reordered / phase numerals spelled differently. Compares
+  - exact:  the previous dedupe (same trial_id or same lowercase title)
+  - fuzzy:  project_merge.merge_projects (blocked prefix-filter join)
+  - naive:  the same similarity test over all pairs, for the sub-quadratic claim
+on output size, leftover duplicates, projects lost to a wrong merge, and time.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from project_merge import TITLE_SIMILARITY, merge_projects, title_tokens  # noqa: E402
+from synthetic_reports import PREFIXES, WORDS  # noqa: E402
+
+
+def make_entries(projects: int, unique: int, seed: int = 0):
+    """Extracted entries; `_project` is the real project each one came from."""
+    rng = random.Random(seed)
+    base = []
+    for i in range(unique):
+        words = rng.sample(WORDS, rng.randint(3, 6))
+        tid = f"{rng.choice(PREFIXES)}{100 + i:03d}" if rng.random() < 0.7 else ""
+        base.append((words, tid))
+
+    entries = []
+    for n in range(projects):
+        k = n if n < unique else rng.randrange(unique)
+        words, tid = base[k]
+        words = list(words)
+        roll = rng.random()
+        if roll < 0.3:
+            rng.shuffle(words)
+        elif roll < 0.45:
+            words.append(rng.choice(("study", "trial", "phase ii", "phase 2")))
+        if tid and rng.random() < 0.3:
+            tid = ""                                   # chunk never saw the id
+        elif tid and rng.random() < 0.2:
+            tid = tid[:-3] + str(int(tid[-3:]))        # PNOC013 -> PNOC13
+        entries.append({"_project": k, "title": " ".join(words).title(), "trial_id": tid,
+                        "layman_summary": "x" * rng.randint(20, 200), "timeline_snippet": "",
+                        "future_goals": [f"goal {rng.randint(0, 3)}"],
+                        "fund_usage": {"amount_numeric": None, "amount_display": "", "currency": "USD",
+                                       "period": "", "recipient_org": "", "purpose": ""}})
+    return entries
+
+
+def exact_merge(projects):
+    """The previous dedupe: first entry per trial_id / lowercase title (field merging omitted)."""
+    by_key = {}
+    for p in projects:
+        by_key.setdefault(p.get("trial_id", "") or p.get("title", "").lower().strip(), p)
+    return list(by_key.values())
+
+
+def naive_pairs(projects, threshold):
+    tokens = [title_tokens(p["title"]) for p in projects]
+    hits = 0
+    for i in range(len(tokens)):
+        for j in range(i):
+            if tokens[i] and tokens[j] and len(tokens[i] & tokens[j]) / len(tokens[i] | tokens[j]) >= threshold:
+                hits += 1
+    return hits
+
+
+def quality(merged, unique):
+    """(leftover duplicates, lost projects): outputs are labelled by the entry they kept."""
+    labels = [m["_project"] for m in merged]
+    return len(labels) - len(set(labels)), unique - len(set(labels))
+
+
+def _time(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - start)
+    return out, best * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--projects", type=int, default=500)
+    parser.add_argument("--unique", type=int, default=120)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    entries = make_entries(args.projects, args.unique)
+    print(f"{len(entries)} extracted entries for {args.unique} projects "
+          f"(threshold {TITLE_SIMILARITY:g})")
+    print(f"  {'merge':<8}{'out':>7}{'dupes':>8}{'lost':>8}{'ms':>10}")
+    for name, fn in (("exact", lambda: exact_merge(entries)), ("fuzzy", lambda: merge_projects(entries))):
+        merged, ms = _time(fn, args.repeat)
+        dupes, lost = quality(merged, args.unique)
+        print(f"  {name:<8}{len(merged):>7}{dupes:>8}{lost:>8}{ms:>10.2f}")
+    _, ms = _time(lambda: naive_pairs(entries, TITLE_SIMILARITY), 1)
+    print(f"  {'naive':<8}{'':>7}{'':>8}{'':>8}{ms:>10.2f}  (all-pairs similarity only)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Microbenchmark: normalize_text + hint extraction, original vs. compiled.
+
+    python benchmarks/bench_text.py [--trials 400] [--repeat 5]
+
+Builds a raw (un-normalized, line-wrapped) synthetic report of a few MB and times
+the frozen originals in tests/reference_text.py against text_processing.py,
+checking that both produce identical output.
+"""
+import argparse
+import os
+import sys
+import textwrap
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import text_processing as fast  # noqa: E402
+from tests import reference_text as ref  # noqa: E402
+from synthetic_reports import make_report_pages  # noqa: E402
+
+
+def raw_report(trials: int) -> str:
+    """Synthetic report wrapped at 78 columns with some hyphenation, like PDF text output."""
+    pages = make_report_pages(trials=trials, seed=1)
+    out = []
+    for page in pages:
+        for para in page.split("\n\n"):
+            lines = textwrap.wrap(para, 78)
+            out.append("\n".join(line + ("-" if i % 7 == 3 else "") for i, line in enumerate(lines)))
+    return "\n\n".join(out)
+
+
+def best_of(fn, arg, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(arg)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--trials", type=int, default=400)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    raw = raw_report(args.trials)
+    normalized = ref.normalize_text(raw)
+    assert fast.normalize_text(raw) == normalized
+    assert fast.choose_grant_amount(normalized) == ref.choose_grant_amount(normalized)
+    assert fast.choose_grant_amount(raw) == ref.choose_grant_amount(raw)
+    print(f"input: {len(raw) / 1e6:.2f} MB raw, {len(normalized) / 1e6:.2f} MB normalized")
+
+    rows = [
+        ("normalize_text", ref.normalize_text, fast.normalize_text, raw),
+        ("choose_grant_amount (normalized)", ref.choose_grant_amount, fast.choose_grant_amount, normalized),
+        ("choose_grant_amount (raw lines)", ref.choose_grant_amount, fast.choose_grant_amount, raw),
+    ]
+    print(f"{'stage':<34}{'original ms':>13}{'compiled ms':>13}{'speedup':>9}")
+    for name, old_fn, new_fn, arg in rows:
+        old = best_of(old_fn, arg, args.repeat)
+        new = best_of(new_fn, arg, args.repeat)
+        print(f"{name:<34}{old * 1000:>13.1f}{new * 1000:>13.1f}{old / new:>8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
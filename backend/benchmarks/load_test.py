@@ -0,0 +1,143 @@
+"""
+Requests/second for GET /health and GET /api/research.
+
+    python benchmarks/load_test.py                       # spawn gunicorn (threaded profile)
+    python benchmarks/load_test.py --profile gevent
+    python benchmarks/load_test.py --profile dev         # `python app.py` dev server, for comparison
+    python benchmarks/load_test.py --url http://host:8000 # an already running server
+
+Spawned servers use STORAGE_BACKEND=sqlite seeded with --rows research tiles, and
+RESEARCH_CACHE_TTL_SECONDS=0 unless --cache is given, so /api/research measures a
+real database read + serialization per request.
+Each client thread keeps one HTTP/1.1 connection open.
+"""
+import argparse
+import http.client
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import urlparse
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _seed(db_path: str, rows: int) -> None:
+    from storage import SQLiteStorage
+    store = SQLiteStorage(db_path, os.path.dirname(db_path))
+    for i in range(rows):
+        store.insert("research_data", {"title": f"Trial {i}", "year": 2015 + i % 10, "impact": "Impact " * 10,
+                                       "money": f"${i * 1000:,}", "summary": "Summary sentence. " * 20})
+
+
+def spawn(args, tmp: str):
+    port = _free_port()
+    db_path = os.path.join(tmp, "data.sqlite3")
+    _seed(db_path, args.rows)
+    env = dict(os.environ, STORAGE_BACKEND="sqlite", SQLITE_DB_PATH=db_path, PORT=str(port),
+               JOBS_DB_PATH=os.path.join(tmp, "jobs.sqlite3"), JOB_UPLOAD_DIR=os.path.join(tmp, "uploads"),
+               EXTRACTION_CACHE_PATH="", ACCESS_LOG="", WEB_MAX_REQUESTS="0",
+               RESEARCH_CACHE_TTL_SECONDS="30" if args.cache else "0",
+               SERVER_PROFILE=args.profile, WEB_CONCURRENCY=str(args.workers), WEB_THREADS=str(args.threads))
+    if args.profile == "dev":
+        cmd = [sys.executable, "app.py"]
+    else:
+        cmd = [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "wsgi:app"]
+    proc = subprocess.Popen(cmd, cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    url = f"http://127.0.0.1:{port}"
+    for _ in range(200):
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            conn.request("GET", "/health")
+            if conn.getresponse().status == 200:
+                return proc, url
+        except OSError:
+            time.sleep(0.05)
+    proc.terminate()
+    raise RuntimeError("server did not come up")
+
+
+def run(url: str, path: str, concurrency: int, duration: float) -> dict:
+    target = urlparse(url)
+    latencies, errors = [], [0]
+    lock = threading.Lock()
+    stop_at = time.monotonic() + duration
+
+    def client():
+        conn = http.client.HTTPConnection(target.hostname, target.port or 80, timeout=30)
+        mine, failed = [], 0
+        while time.monotonic() < stop_at:
+            start = time.perf_counter()
+            try:
+                conn.request("GET", path)
+                resp = conn.getresponse()
+                resp.read()
+                if resp.status != 200:
+                    failed += 1
+            except (OSError, http.client.HTTPException):
+                failed += 1
+                conn.close()
+                conn = http.client.HTTPConnection(target.hostname, target.port or 80, timeout=30)
+                continue
+            mine.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(mine)
+            errors[0] += failed
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    latencies.sort()
+    return {
+        "rps": len(latencies) / duration,
+        "p50": statistics.median(latencies) * 1000 if latencies else 0.0,
+        "p99": latencies[int(len(latencies) * 0.99) - 1] * 1000 if latencies else 0.0,
+        "errors": errors[0],
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", help="server to test; default: spawn one")
+    parser.add_argument("--profile", default="threaded", choices=["threaded", "gevent", "sync", "dev"])
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--rows", type=int, default=200)
+    parser.add_argument("--cache", action="store_true", help="leave the /api/research read cache on")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=5.0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        proc, url = (None, args.url) if args.url else spawn(args, tmp)
+        try:
+            if args.url:
+                label = args.url
+            else:
+                label = "dev server" if args.profile == "dev" else f"{args.profile} ({args.workers} workers)"
+            print(f"{label}: {args.concurrency} clients x {args.duration:g}s")
+            print(f"  {'path':<44}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'errors':>8}")
+            for path in ("/health", "/api/research", "/api/research?limit=20&fields=title,money"):
+                r = run(url, path, args.concurrency, args.duration)
+                print(f"  {path:<44}{r['rps']:>10.0f}{r['p50']:>10.1f}{r['p99']:>10.1f}{r['errors']:>8}")
+        finally:
+            if proc is not None:
+                proc.terminate()
+                proc.wait(timeout=30)
+
+
+if __name__ == "__main__":
+    main()
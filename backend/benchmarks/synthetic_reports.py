@@ -0,0 +1,70 @@
+"""
+Synthetic grant reports for benchmarks.
+
+Reports look like the researcher updates we ingest: an intro, then one section per
+trial (heading with the trial id, narrative paragraphs, a funding line, a budget
+table line), spread over pages. Output is deterministic for a given seed.
+"""
+import random
+from typing import List
+
+PREFIXES = ("PNOC", "NCT", "PBTC", "COG")
+
+WORDS = (
+    "tumor patients cohort enrollment therapy radiation imaging biopsy response "
+    "safety dose survival pediatric glioma medulloblastoma sequencing marker "
+    "trial sites protocol analysis outcomes toxicity biomarker clinical families "
+    "treatment progression genomic laboratory follow-up baseline study results"
+).split()
+
+
+def _sentence(rng: random.Random) -> str:
+    words = [rng.choice(WORDS) for _ in range(rng.randint(8, 22))]
+    return " ".join(words).capitalize() + "."
+
+
+def _paragraph(rng: random.Random, sentences: int) -> str:
+    return " ".join(_sentence(rng) for _ in range(sentences))
+
+
+def trial_ids(trials: int, seed: int = 0) -> List[str]:
+    rng = random.Random(seed)
+    return [f"{rng.choice(PREFIXES)}{100 + i:03d}" for i in range(trials)]
+
+
+def make_report_pages(trials: int = 10, paragraphs_per_trial: int = 4, page_chars: int = 3000,
+                      seed: int = 0) -> List[str]:
+    """Report text as normalized pages (each starting with its `[PDF pN]` marker)."""
+    rng = random.Random(seed)
+    blocks = [f"Annual research report. {_paragraph(rng, 5)}"]
+    for trial_id in trial_ids(trials, seed):
+        amount = rng.randint(50, 900) * 1000
+        blocks.append(f"{trial_id} - {_sentence(rng)[:-1].title()}")
+        for _ in range(paragraphs_per_trial):
+            blocks.append(f"{_paragraph(rng, rng.randint(3, 7))} ({trial_id})")
+        blocks.append(f"Grant amount: ${amount:,} over two years awarded to the {trial_id} consortium.")
+        blocks.append(f"Total project budget: ${amount * 3:,} including indirects.")
+
+    pages, current = [], []
+    for block in blocks:
+        current.append(block)
+        if sum(len(b) for b in current) >= page_chars:
+            pages.append(current)
+            current = []
+    if current:
+        pages.append(current)
+    return [f"[PDF p{i}] " + "\n\n".join(page) for i, page in enumerate(pages, start=1)]
+
+
+def make_report_pdf(path: str, trials: int = 10, paragraphs_per_trial: int = 4, seed: int = 0) -> int:
+    """Write the same report as a real PDF (PyMuPDF); returns the page count."""
+    import fitz
+
+    pages = make_report_pages(trials, paragraphs_per_trial, seed=seed)
+    with fitz.open() as doc:
+        for page_text in pages:
+            body = page_text.split("] ", 1)[1]
+            page = doc.new_page()
+            page.insert_textbox(fitz.Rect(54, 54, 558, 738), body, fontsize=9)
+        doc.save(path)
+        return len(pages)
@@ -0,0 +1,195 @@
+"""
+Chunking for LLM extraction.
+
+`chunk_text` / `ChunkStream` are the original fixed character windows with overlap.
+`SemanticChunker` is the default: text is split into paragraphs
+(page markers `[PDF pN]` always start one), and paragraphs are packed into chunks
+against an approximate token budget with no overlap. Paragraphs that belong to the
+same trial section (opened by a paragraph naming a trial id near its start) are
+kept in one chunk whenever the section fits the budget, so a trial's description
+is not split across model calls. Only paragraphs larger than the whole budget are
+cut, at sentence boundaries first.
+"""
+import math
+import os
+import re
+from typing import List
+
+from text_processing import TRIAL_ID_RE
+
+CHUNK_CHARS = 6500
+CHUNK_OVERLAP = 500
+
+CHUNK_TOKEN_BUDGET = int(os.getenv("CHUNK_TOKEN_BUDGET", "1600"))
+# a trial id within this many chars of a paragraph start marks a section heading
+SECTION_HEAD_CHARS = 120
+
+CHARS_PER_TOKEN = 4
+PARAGRAPH_SPLIT_RE = re.compile(r"\n\s*\n")
+PAGE_MARKER_RE = re.compile(r"\[PDF p\d+\]")
+SENTENCE_SPLIT_RE = re.compile(r"(?<=[.!?])\s+")
+
+
+def chunk_text(s: str, max_chars=CHUNK_CHARS, overlap=CHUNK_OVERLAP):
+    s = s.strip()
+    if len(s) <= max_chars:
+        return [s]
+    parts, i = [], 0
+    while i < len(s):
+        parts.append(s[i:min(i+max_chars, len(s))])
+        i += (max_chars - overlap)
+    return parts
+
+
+class ChunkStream:
+    """
+    Incremental chunk_text: feed text pieces in order, get the same windows that
+    chunk_text would produce for their concatenation, without holding the whole string.
+    """
+    def __init__(self, max_chars=CHUNK_CHARS, overlap=CHUNK_OVERLAP):
+        self.max_chars = max_chars
+        self.step = max_chars - overlap
+        self.chunks: List[str] = []
+        self._buf = ""
+        self._seen_text = False
+        self._windowed = False  # total is known to exceed max_chars
+
+    def feed(self, s: str) -> None:
+        if not self._seen_text:
+            s = s.lstrip()
+            self._seen_text = bool(s)
+        self._buf += s
+        # trailing whitespace might be the end of the document, which chunk_text strips
+        known = len(self._buf.rstrip())
+        if not self._windowed and known > self.max_chars:
+            self._windowed = True
+        while self._windowed and known >= self.max_chars:
+            self.chunks.append(self._buf[:self.max_chars])
+            self._buf = self._buf[self.step:]
+            known -= self.step
+
+    def finish(self) -> List[str]:
+        buf = self._buf.rstrip()
+        self._buf = ""
+        if not self._windowed:
+            self.chunks.append(buf)
+            return self.chunks
+        while buf:
+            self.chunks.append(buf[:self.max_chars])
+            buf = buf[self.step:]
+        return self.chunks
+
+
+def estimate_tokens(s: str) -> int:
+    """Cheap token estimate (~4 chars/token for English prose); good enough for packing."""
+    return math.ceil(len(s) / CHARS_PER_TOKEN) if s else 0
+
+
+def _section_trial_id(paragraph: str) -> str:
+    """Trial id if the paragraph reads like a section heading for that trial, else ""."""
+    head = PAGE_MARKER_RE.sub("", paragraph[:SECTION_HEAD_CHARS + 16]).lstrip()[:SECTION_HEAD_CHARS]
+    m = TRIAL_ID_RE.search(head)
+    return re.sub(r"[\s-]+", "", m.group(0).upper()) if m else ""
+
+
+def _split_oversized(paragraph: str, budget: int) -> List[str]:
+    """Cut a paragraph that alone exceeds the budget, preferring sentence ends."""
+    max_chars = budget * CHARS_PER_TOKEN
+    pieces, current = [], ""
+    for sentence in SENTENCE_SPLIT_RE.split(paragraph):
+        while len(sentence) > max_chars:
+            # no sentence break to use: cut at the last space in range (or hard cut)
+            cut = sentence.rfind(" ", 0, max_chars)
+            cut = cut if cut > 0 else max_chars
+            if current:
+                pieces.append(current)
+                current = ""
+            pieces.append(sentence[:cut])
+            sentence = sentence[cut:].lstrip()
+        if current and len(current) + 1 + len(sentence) > max_chars:
+            pieces.append(current)
+            current = sentence
+        else:
+            current = f"{current} {sentence}" if current else sentence
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+class SemanticChunker:
+    """
+    Streaming packer: feed() normalized text pieces (provenance line, pages) in order,
+    finish() returns the chunks. Same interface as ChunkStream.
+
+    Paragraphs are grouped into sections (a new section starts at a paragraph that
+    names a different trial near its start). Whole sections are packed greedily; a
+    section is only broken up when it does not fit in an empty chunk by itself.
+    """
+
+    def __init__(self, token_budget: int = CHUNK_TOKEN_BUDGET):
+        self.token_budget = token_budget
+        self.chunks: List[str] = []
+        self._current: List[str] = []
+        self._current_tokens = 0
+        self._section: List[tuple] = []  # (paragraph, page marker it sits on)
+        self._section_tokens = 0
+        self._section_trial = ""
+        self._page_marker = ""
+
+    def _flush(self) -> None:
+        if self._current:
+            self.chunks.append("\n\n".join(self._current))
+        self._current = []
+        self._current_tokens = 0
+
+    def _add(self, paragraph: str, marker: str) -> None:
+        tokens = estimate_tokens(paragraph)
+        if self._current and self._current_tokens + tokens > self.token_budget:
+            self._flush()
+        if not self._current and marker and not paragraph.startswith("[PDF p"):
+            # a chunk that starts mid-page still tells the model which page it is on
+            paragraph = f"{marker} {paragraph}"
+            tokens = estimate_tokens(paragraph)
+        self._current.append(paragraph)
+        self._current_tokens += tokens
+
+    def _close_section(self) -> None:
+        section, tokens = self._section, self._section_tokens
+        self._section, self._section_tokens = [], 0
+        if not section:
+            return
+        if self._current and self._current_tokens + tokens > self.token_budget:
+            self._flush()
+        for paragraph, marker in section:
+            if estimate_tokens(paragraph) > self.token_budget:
+                for piece in _split_oversized(paragraph, self.token_budget):
+                    self._add(piece, marker)
+            else:
+                self._add(paragraph, marker)
+
+    def feed(self, s: str) -> None:
+        for paragraph in PARAGRAPH_SPLIT_RE.split(s):
+            paragraph = paragraph.strip()
+            if not paragraph:
+                continue
+            markers = PAGE_MARKER_RE.findall(paragraph)
+            if markers:
+                self._page_marker = markers[-1]
+            trial = _section_trial_id(paragraph)
+            if trial and trial != self._section_trial:
+                self._close_section()
+                self._section_trial = trial
+            self._section.append((paragraph, self._page_marker))
+            self._section_tokens += estimate_tokens(paragraph)
+
+    def finish(self) -> List[str]:
+        self._close_section()
+        self._flush()
+        return self.chunks or [""]
+
+
+def semantic_chunks(s: str, token_budget: int = CHUNK_TOKEN_BUDGET) -> List[str]:
+    """Chunk a whole string (see SemanticChunker)."""
+    chunker = SemanticChunker(token_budget)
+    chunker.feed(s)
+    return chunker.finish()
@@ -38,6 +38,10 @@ CREATE TABLE IF NOT EXISTS research_data (
   created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
 );
 
+-- Indexes for timeline reads (year filter, keyset pagination) and pdf lookups
+CREATE INDEX IF NOT EXISTS idx_research_year_id ON research_data (year DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_research_pdf_id ON research_data (pdf_id);
+
 -- Email templates table
 CREATE TABLE IF NOT EXISTS email_templates (
   id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
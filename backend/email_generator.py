@@ -3,9 +3,9 @@ AI-powered email generator for research updates.
 Generates professional, engaging emails summarizing new research contributions.
 """
 
-import os
 from typing import List, Dict, Any
-import google.generativeai as genai
+
+from llm_providers import get_provider
 
 
 def generate_research_email(changes: List[Dict[str, Any]]) -> Dict[str, str]:
@@ -44,37 +44,31 @@ Impact: {change.get('impact', 'No description available')}
     
     context = "\n\n".join(research_summaries)
     
-    # Try to use Gemini if API key is available
-    api_key = os.getenv('GEMINI_API_KEY')
-    if api_key:
+    # Try the configured LLM provider if it can be used (e.g. Gemini with an API key)
+    provider = get_provider()
+    if provider.available():
         try:
-            return _generate_with_gemini(context, len(changes))
+            return _generate_with_llm(provider, context, len(changes))
         except Exception as e:
-            print(f"Gemini generation failed: {e}, falling back to template")
+            print(f"{provider.name} generation failed: {e}, falling back to template")
             return _generate_template_email(changes)
     else:
-        print("No Gemini API key found, using template email")
+        print(f"LLM provider {provider.name} not available, using template email")
         return _generate_template_email(changes)
 
 
-def _generate_with_gemini(research_context: str, count: int) -> Dict[str, str]:
+def _generate_with_llm(provider, research_context: str, count: int) -> Dict[str, str]:
     """
-    Generate email using Google Gemini API.
+    Generate email with the configured LLM provider (see llm_providers.py).
     
     Args:
+        provider: LLM provider to call
         research_context: Formatted string with all research project details
         count: Number of research projects
     
     Returns:
         Dict with 'subject' and 'body' keys
     """
-    # Configure Gemini
-    api_key = os.getenv('GEMINI_API_KEY')
-    genai.configure(api_key=api_key)
-    
-    # Use Gemini Pro model
-    model = genai.GenerativeModel('gemini-pro')
-    
     prompt = f"""You are writing a professional email to stakeholders about new research updates from a medical research foundation. 
 
 Here are {count} new research project(s) that have been approved and need to be communicated:
@@ -98,8 +92,8 @@ BODY:
 [email body]
 """
     
-    response = model.generate_content(prompt)
-    generated_text = response.text.strip()
+    # Gemini Pro when the provider is Gemini
+    generated_text = provider.generate(prompt, model='gemini-pro').strip()
     
     # Parse the response
     if 'SUBJECT:' in generated_text and 'BODY:' in generated_text:
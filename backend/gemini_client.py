@@ -0,0 +1,132 @@
+"""
+Process-wide Gemini client.
+
+`google.generativeai` takes most of a worker's import time, so it is imported and
+configured on first use rather than when app.py / email_generator.py are imported.
+Models are created once per (name, generation_config) and shared by all threads.
+
+Every call goes through generate_content(), which waits for admission from the
+shared rate limiter (GEMINI_RPM / GEMINI_TPM / GEMINI_MAX_CONCURRENCY) and retries
+quota/overload errors after the limiter's backoff.
+
+GEMINI_RPM / GEMINI_TPM are the project's quota. The limiter lives in one process,
+so each process gets 1/GEMINI_QUOTA_SHARES of it; gunicorn.conf.py sets that to the
+worker count. GEMINI_MAX_CONCURRENCY is per process.
+"""
+import json
+import os
+import threading
+
+from metrics import LLM_TOKENS
+from rate_limit import RateLimiter, is_throttle_error
+
+GEMINI_RPM = float(os.getenv("GEMINI_RPM", "1000"))
+GEMINI_TPM = float(os.getenv("GEMINI_TPM", "1000000"))
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "16"))
+# processes splitting the RPM/TPM quota (gunicorn.conf.py: the worker count)
+GEMINI_QUOTA_SHARES = max(1, int(os.getenv("GEMINI_QUOTA_SHARES", "1")))
+# retries of a call that came back 429/503 (each after the limiter's backoff)
+GEMINI_MAX_RETRIES = int(os.getenv("GEMINI_MAX_RETRIES", "4"))
+# how long a call may wait for admission before failing
+GEMINI_ADMISSION_TIMEOUT_SECONDS = float(os.getenv("GEMINI_ADMISSION_TIMEOUT_SECONDS", "120"))
+# tokens/minute accounting: reply size assumed at admission, corrected from usage_metadata
+GEMINI_EXPECTED_OUTPUT_TOKENS = int(os.getenv("GEMINI_EXPECTED_OUTPUT_TOKENS", "1024"))
+
+_lock = threading.Lock()
+_genai = None
+_models = {}
+
+limiter = RateLimiter(rpm=GEMINI_RPM / GEMINI_QUOTA_SHARES, tpm=GEMINI_TPM / GEMINI_QUOTA_SHARES,
+                      max_concurrency=GEMINI_MAX_CONCURRENCY)
+
+
+def get_genai():
+    """The configured `google.generativeai` module (imported on first call)."""
+    global _genai
+    if _genai is None:
+        with _lock:
+            if _genai is None:
+                import google.generativeai as genai
+                genai.configure(api_key=os.getenv("GEMINI_API_KEY", "DUMMY_FOR_TESTS"))
+                _genai = genai
+    return _genai
+
+
+def get_model(model_name: str, generation_config: dict = None, system_instruction: str = None):
+    """Shared GenerativeModel for this name/config/system instruction."""
+    key = (model_name, json.dumps(generation_config or {}, sort_keys=True), system_instruction)
+    model = _models.get(key)
+    if model is None:
+        genai = get_genai()
+        with _lock:
+            model = _models.get(key)
+            if model is None:
+                model = genai.GenerativeModel(model_name=model_name, generation_config=generation_config,
+                                              system_instruction=system_instruction)
+                _models[key] = model
+    return model
+
+
+def _usage_tokens(resp):
+    usage = getattr(resp, "usage_metadata", None)
+    total = getattr(usage, "total_token_count", None) if usage is not None else None
+    return total if isinstance(total, (int, float)) else None
+
+
+def generate_content(model, prompt: str, max_retries: int = None, timeout: float = None):
+    """
+    model.generate_content(prompt) under the shared rate limiter. Quota/overload errors
+    are retried up to `max_retries` times; anything else is raised straight away.
+    """
+    max_retries = GEMINI_MAX_RETRIES if max_retries is None else max_retries
+    timeout = GEMINI_ADMISSION_TIMEOUT_SECONDS if timeout is None else timeout
+    # ~4 chars per token for the prompt, plus the expected reply
+    estimate = len(prompt) / 4 + GEMINI_EXPECTED_OUTPUT_TOKENS
+    for attempt in range(max_retries + 1):
+        limiter.acquire(estimate, timeout=timeout)
+        try:
+            resp = model.generate_content(prompt)
+        except Exception as e:
+            throttled = is_throttle_error(e)
+            # only a real response counts as success; other errors leave the rate unchanged
+            limiter.release(estimate, throttled=throttled, failed=not throttled)
+            if throttled and attempt < max_retries:
+                print(f"Gemini throttled ({type(e).__name__}), retry {attempt + 1}/{max_retries}")
+                continue
+            raise
+        actual = _usage_tokens(resp)
+        limiter.release(estimate, actual_tokens=actual)
+        if actual is not None:
+            LLM_TOKENS.inc(actual, kind="usage")
+        return resp
+
+
+# OpenAPI subset accepted by Gemini's response_schema
+_SCHEMA_KEYS = {"type", "format", "description", "nullable", "enum", "properties", "required", "items"}
+
+
+def response_schema(model_cls) -> dict:
+    """
+    Gemini `response_schema` for a Pydantic model: $refs inlined, Optional[X] as
+    nullable X, and keywords Gemini rejects (title, default, ...) dropped.
+    """
+    root = model_cls.model_json_schema()
+    defs = root.get("$defs", {})
+
+    def convert(node: dict) -> dict:
+        if "$ref" in node:
+            return convert(defs[node["$ref"].rsplit("/", 1)[-1]])
+        if "anyOf" in node:
+            options = [o for o in node["anyOf"] if o.get("type") != "null"]
+            out = convert(options[0]) if len(options) == 1 else {"type": "string"}
+            if len(options) < len(node["anyOf"]):
+                out["nullable"] = True
+            return out
+        out = {k: v for k, v in node.items() if k in _SCHEMA_KEYS}
+        if "properties" in out:
+            out["properties"] = {k: convert(v) for k, v in out["properties"].items()}
+        if "items" in out:
+            out["items"] = convert(out["items"])
+        return out
+
+    return convert(root)
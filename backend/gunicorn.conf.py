@@ -0,0 +1,66 @@
+"""
+Production server config:  gunicorn -c gunicorn.conf.py wsgi:app
+
+Request time is mostly spent waiting on Gemini and Supabase, so each worker process
+serves many requests concurrently. SERVER_PROFILE picks how:
+  threaded (default)  gthread workers, WEB_THREADS threads each
+  gevent              gevent workers, WEB_CONNECTIONS greenlets each (pip install gevent)
+  sync                one request per worker at a time (debugging)
+WEB_CONCURRENCY sets the number of worker processes.
+
+The worker timeout is derived from the ingest deadlines so a long ingest is not killed
+mid-request (for the sync profile that includes BATCH_DEADLINE_SECONDS); on
+shutdown/reload workers get GRACEFUL_TIMEOUT seconds to finish in-flight requests,
+so a batch still running after that is cut off.
+"""
+import multiprocessing
+import os
+
+SERVER_PROFILE = os.getenv("SERVER_PROFILE", "threaded")
+
+bind = os.getenv("BIND", f"0.0.0.0:{os.getenv('PORT', '8000')}")
+workers = int(os.getenv("WEB_CONCURRENCY", str(min(4, multiprocessing.cpu_count()))))
+# each worker has its own Gemini rate limiter: split GEMINI_RPM / GEMINI_TPM between them
+os.environ.setdefault("GEMINI_QUOTA_SHARES", str(workers))
+
+if SERVER_PROFILE == "gevent":
+    worker_class = "gevent"
+    worker_connections = int(os.getenv("WEB_CONNECTIONS", "200"))
+elif SERVER_PROFILE == "sync":
+    worker_class = "sync"
+else:
+    worker_class = "gthread"
+    threads = int(os.getenv("WEB_THREADS", "16"))
+
+# threaded/gevent workers heartbeat from their own loop, so `timeout` only catches a
+# stuck process. A sync worker cannot heartbeat while it serves a request, so there
+# `timeout` must outlast the longest request: /ingest-batch runs up to
+# BATCH_DEADLINE_SECONDS (streaming output does not count as a heartbeat), a single
+# /ingest-and-summarize up to INGEST_DEADLINE_SECONDS, plus PDF extraction and validation.
+_ingest_deadline = float(os.getenv("INGEST_DEADLINE_SECONDS", "120"))
+_batch_deadline = float(os.getenv("BATCH_DEADLINE_SECONDS", str(_ingest_deadline * 10)))
+_longest_request = max(_ingest_deadline, _batch_deadline) if SERVER_PROFILE == "sync" else _ingest_deadline
+timeout = int(os.getenv("WEB_TIMEOUT", str(int(_longest_request) + 60)))
+graceful_timeout = int(os.getenv("GRACEFUL_TIMEOUT", str(int(_ingest_deadline) + 30)))
+keepalive = int(os.getenv("WEB_KEEPALIVE", "5"))
+
+# recycle workers now and then to bound memory growth from large PDFs
+max_requests = int(os.getenv("WEB_MAX_REQUESTS", "2000"))
+max_requests_jitter = int(os.getenv("WEB_MAX_REQUESTS_JITTER", "200"))
+
+# not preloaded: wsgi.py starts the job queue threads, which must live in the workers
+preload_app = False
+
+# ACCESS_LOG="" turns request logging off
+accesslog = os.getenv("ACCESS_LOG", "-") or None
+errorlog = "-"
+
+
+def post_worker_init(worker):
+    if SERVER_PROFILE == "gevent":
+        # the Gemini SDK talks gRPC; let its I/O yield to other greenlets
+        try:
+            from grpc.experimental import gevent as grpc_gevent
+            grpc_gevent.init_gevent()
+        except Exception as e:
+            print(f"grpc gevent support not enabled: {e}")
@@ -0,0 +1,352 @@
+"""
+Background ingestion jobs.
+
+`/ingest-and-summarize?mode=async` records a job here and returns immediately; a
+small local worker pool runs the extraction and writes per-chunk progress and the
+final OutputPayload back to a SQLite store, so `GET /jobs/<id>` can be polled and
+unfinished jobs are picked up again after a restart.
+
+Each running job records its owner (host, pid and a per-process token) and a
+heartbeat (`updated_at`), refreshed by every progress update and by the owner's
+periodic sweep. The sweep requeues running jobs whose heartbeat is older than
+`stale_after` seconds, whoever owns them, and, sooner, those whose owner on this
+host is gone (crash, restart, a recycled gunicorn worker). A job that has been started `max_attempts` times is failed
+instead of being retried again.
+"""
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+
+class JobStore:
+    """SQLite-backed job records (input, status, per-chunk progress, result)."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            folder = os.path.dirname(self.path)
+            if folder:
+                os.makedirs(folder, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS ingest_jobs ("
+                " id TEXT PRIMARY KEY,"
+                " status TEXT NOT NULL,"
+                " input TEXT NOT NULL,"
+                " chunks TEXT NOT NULL DEFAULT '[]',"
+                " result TEXT,"
+                " error TEXT,"
+                " owner TEXT,"
+                " attempts INTEGER NOT NULL DEFAULT 0,"
+                " created_at REAL NOT NULL,"
+                " updated_at REAL NOT NULL)"
+            )
+            columns = {r["name"] for r in conn.execute("PRAGMA table_info(ingest_jobs)")}
+            if "attempts" not in columns:  # store created before attempts were counted
+                conn.execute("ALTER TABLE ingest_jobs ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_ingest_jobs_status ON ingest_jobs (status)")
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def _execute(self, sql: str, params=()) -> int:
+        with self._lock:
+            conn = self._connect()
+            cur = conn.execute(sql, params)
+            conn.commit()
+            return cur.rowcount
+
+    def create(self, job_input: dict) -> str:
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        self._execute(
+            "INSERT INTO ingest_jobs (id, status, input, created_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+            (job_id, QUEUED, json.dumps(job_input), now, now),
+        )
+        return job_id
+
+    def claim(self, job_id: str, owner: str) -> int:
+        """
+        Atomically move a queued job to running and count the attempt.
+        Returns the attempt number (1 for the first run), or 0 if someone else has it.
+        """
+        with self._lock:
+            conn = self._connect()
+            cur = conn.execute(
+                "UPDATE ingest_jobs SET status = ?, owner = ?, attempts = attempts + 1, updated_at = ?"
+                " WHERE id = ? AND status = ?",
+                (RUNNING, owner, time.time(), job_id, QUEUED),
+            )
+            conn.commit()
+            if cur.rowcount != 1:
+                return 0
+            return conn.execute("SELECT attempts FROM ingest_jobs WHERE id = ?", (job_id,)).fetchone()["attempts"]
+
+    def set_chunks(self, job_id: str, total: int) -> None:
+        self._execute(
+            "UPDATE ingest_jobs SET chunks = ?, updated_at = ? WHERE id = ?",
+            (json.dumps(["pending"] * total), time.time(), job_id),
+        )
+
+    def update_chunk(self, job_id: str, index: int, status: str) -> None:
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute("SELECT chunks FROM ingest_jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                return
+            chunks = json.loads(row["chunks"])
+            if 0 <= index < len(chunks):
+                chunks[index] = status
+            conn.execute(
+                "UPDATE ingest_jobs SET chunks = ?, updated_at = ? WHERE id = ?",
+                (json.dumps(chunks), time.time(), job_id),
+            )
+            conn.commit()
+
+    @staticmethod
+    def _owned(owner: Optional[str]) -> tuple:
+        """SQL suffix/params limiting an update to the run that `owner` claimed (if given)."""
+        return (" AND owner = ?", (owner,)) if owner is not None else ("", ())
+
+    def finish(self, job_id: str, result: dict, owner: Optional[str] = None) -> None:
+        """Record the result; with `owner`, only if that run still owns the job (it was not requeued)."""
+        where, params = self._owned(owner)
+        self._execute(
+            "UPDATE ingest_jobs SET status = ?, result = ?, error = NULL, updated_at = ? WHERE id = ?" + where,
+            (SUCCEEDED, json.dumps(result), time.time(), job_id, *params),
+        )
+
+    def fail(self, job_id: str, error: dict, owner: Optional[str] = None) -> None:
+        where, params = self._owned(owner)
+        self._execute(
+            "UPDATE ingest_jobs SET status = ?, error = ?, updated_at = ? WHERE id = ?" + where,
+            (FAILED, json.dumps(error), time.time(), job_id, *params),
+        )
+
+    def heartbeat(self, owner: str) -> int:
+        """Mark every job `owner` is running as alive now."""
+        return self._execute(
+            "UPDATE ingest_jobs SET updated_at = ? WHERE status = ? AND owner = ?",
+            (time.time(), RUNNING, owner),
+        )
+
+    def get_input(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self._connect().execute("SELECT input FROM ingest_jobs WHERE id = ?", (job_id,)).fetchone()
+        return json.loads(row["input"]) if row else None
+
+    def get(self, job_id: str) -> Optional[dict]:
+        """Public view of a job (no input payload)."""
+        with self._lock:
+            row = self._connect().execute("SELECT * FROM ingest_jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        chunks = json.loads(row["chunks"])
+        return {
+            "id": row["id"],
+            "status": row["status"],
+            "progress": {
+                "total_chunks": len(chunks),
+                "completed_chunks": sum(1 for c in chunks if c != "pending"),
+                "chunks": chunks,
+            },
+            "result": json.loads(row["result"]) if row["result"] else None,
+            "error": json.loads(row["error"]) if row["error"] else None,
+            "attempts": row["attempts"],
+            "created_at": row["created_at"],
+            "updated_at": row["updated_at"],
+        }
+
+    def requeue_stale(self, stale_after: float) -> int:
+        """Running jobs without a heartbeat for `stale_after` seconds belonged to a dead worker."""
+        return self._execute(
+            "UPDATE ingest_jobs SET status = ?, owner = NULL, updated_at = ? WHERE status = ? AND updated_at < ?",
+            (QUEUED, time.time(), RUNNING, time.time() - stale_after),
+        )
+
+    def requeue_owner(self, owner: str) -> int:
+        """Put the running jobs of a worker that is known to be gone back in the queue."""
+        return self._execute(
+            "UPDATE ingest_jobs SET status = ?, owner = NULL, updated_at = ? WHERE status = ? AND owner = ?",
+            (QUEUED, time.time(), RUNNING, owner),
+        )
+
+    def running_owners(self) -> list:
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT DISTINCT owner FROM ingest_jobs WHERE status = ? AND owner IS NOT NULL", (RUNNING,)
+            ).fetchall()
+        return [r["owner"] for r in rows]
+
+    def queued_ids(self) -> list:
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT id FROM ingest_jobs WHERE status = ? ORDER BY created_at", (QUEUED,)
+            ).fetchall()
+        return [r["id"] for r in rows]
+
+
+class JobProgress:
+    """Progress sink handed to the ingest pipeline for one job."""
+
+    def __init__(self, store: JobStore, job_id: str):
+        self.store = store
+        self.job_id = job_id
+
+    def start(self, total_chunks: int) -> None:
+        self.store.set_chunks(self.job_id, total_chunks)
+
+    def chunk(self, index: int, status: str) -> None:
+        self.store.update_chunk(self.job_id, index, status)
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:  # exists, owned by another user
+        return True
+    return True
+
+
+class JobQueue:
+    """
+    Local worker pool for ingest jobs.
+
+    `handler(job_input, progress)` does the work and returns the result dict; any
+    exception marks the job failed (use `.details` on the exception for structured errors).
+    `cleanup(job_input)` (optional) runs once the job is finished here, succeeded or
+    failed, e.g. to delete a spooled upload; it does not run for a job that is requeued.
+    """
+
+    def __init__(self, store: JobStore, handler: Callable[[dict, JobProgress], dict], workers: int = 2,
+                 max_attempts: int = 3, cleanup: Optional[Callable[[dict], None]] = None):
+        self.store = store
+        self.handler = handler
+        self.workers = max(1, workers)
+        self.max_attempts = max(1, max_attempts)
+        self.cleanup = cleanup
+        self.host = socket.gethostname()
+        # the token tells this process apart from an earlier one that had the same pid
+        self.owner = f"{self.host}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        self._scheduled = set()  # job ids waiting in or running on this process's pool
+        self._sweeper = None
+        self._stop = threading.Event()
+
+    def _executor(self) -> ThreadPoolExecutor:
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="ingest-job")
+            return self._pool
+
+    def submit(self, job_input: dict) -> str:
+        job_id = self.store.create(job_input)
+        self._schedule(job_id)
+        return job_id
+
+    def _schedule(self, job_id: str) -> bool:
+        with self._pool_lock:
+            if job_id in self._scheduled:
+                return False
+            self._scheduled.add(job_id)
+        self._executor().submit(self._run, job_id)
+        return True
+
+    def _owner_gone(self, owner: str) -> bool:
+        """
+        True when `owner` was a process on this host that no longer exists. A live pid
+        proves nothing (it may have been reused), so those jobs are left to the heartbeat.
+        """
+        parts = owner.split(":")
+        if owner == self.owner or len(parts) < 2 or parts[0] != self.host or not parts[1].isdigit():
+            return False
+        pid = int(parts[1])
+        return pid == os.getpid() or not _pid_alive(pid)
+
+    def resume(self, stale_after: float) -> int:
+        """
+        Heartbeat this process's running jobs, requeue orphaned ones (owner pid gone on
+        this host, or no heartbeat for `stale_after` seconds) and schedule every queued
+        job. Returns the number of jobs newly scheduled here.
+        """
+        self.store.heartbeat(self.owner)
+        for owner in self.store.running_owners():
+            if self._owner_gone(owner):
+                requeued = self.store.requeue_owner(owner)
+                if requeued:
+                    print(f"Requeued {requeued} ingest job(s) of dead worker {owner}")
+        self.store.requeue_stale(stale_after)
+        return sum(self._schedule(job_id) for job_id in self.store.queued_ids())
+
+    def start(self, stale_after: float, interval: float) -> None:
+        """
+        resume() now and then every `interval` seconds on a daemon thread; `interval`
+        must stay well below `stale_after`, as it is also the heartbeat period.
+        """
+        self.resume(stale_after)
+        if interval <= 0 or self._sweeper is not None:
+            return
+
+        def sweep():
+            while not self._stop.wait(interval):
+                try:
+                    self.resume(stale_after)
+                except Exception as e:
+                    print(f"Ingest job sweep failed: {e}")
+
+        self._sweeper = threading.Thread(target=sweep, name="ingest-job-sweep", daemon=True)
+        self._sweeper.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _run(self, job_id: str) -> None:
+        try:
+            attempt = self.store.claim(job_id, self.owner)
+            if attempt:
+                self._run_claimed(job_id, attempt)
+        finally:
+            with self._pool_lock:
+                self._scheduled.discard(job_id)
+
+    def _run_claimed(self, job_id: str, attempt: int) -> None:
+        job_input = {}
+        try:
+            job_input = self.store.get_input(job_id) or {}
+            if attempt > self.max_attempts:
+                raise RuntimeError(f"Job was interrupted {attempt - 1} times; not retrying")
+            result = self.handler(job_input, JobProgress(self.store, job_id))
+            self.store.finish(job_id, result, owner=self.owner)
+        except Exception as e:
+            error = {"error": str(e)}
+            details = getattr(e, "details", None)
+            if details is not None:
+                error["details"] = details
+            print(f"Ingest job {job_id} failed: {e}")
+            self.store.fail(job_id, error, owner=self.owner)
+        finally:
+            if self.cleanup is not None:
+                try:
+                    self.cleanup(job_input)
+                except Exception as e:
+                    print(f"Ingest job {job_id} cleanup failed: {e}")
@@ -0,0 +1,119 @@
+"""
+Salvage JSON objects from imperfect model output without another model call.
+
+parse_json_object() accepts what json.loads accepts, plus the usual failure shapes:
+  - markdown code fences or prose around the object
+  - trailing commas before } or ]
+  - output cut off mid-way (token limit): open strings and brackets are closed, and a
+    dangling key or half-written value is dropped; if that still does not parse, the
+    text is cut back to the last complete element at any depth
+One pass over the text records the bracket stack at every element boundary, so the
+fallbacks need no re-scanning.
+"""
+import json
+import re
+from typing import Optional, Tuple
+
+_FENCE_RE = re.compile(r"^\s*```(?:json)?\s*|\s*```\s*$", re.IGNORECASE)
+_TRAILING_COMMA_RE = re.compile(r",(\s*[}\]])")
+_CLOSER = {"{": "}", "[": "]"}
+
+# how many element boundaries to try cutting back to before giving up
+MAX_CUTS = 50
+
+
+def _loads_object(text: str) -> Optional[dict]:
+    try:
+        out = json.loads(text)
+    except ValueError:
+        return None
+    return out if isinstance(out, dict) else None
+
+
+def _scan(text: str) -> Tuple[list, bool, list]:
+    """
+    Stack of open brackets at the end of `text`, whether it ends inside a string, and
+    (position, stack) for every comma between elements (cut points).
+    """
+    stack, cuts = [], []
+    in_string = escaped = False
+    for i, ch in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch in "{[":
+            stack.append(ch)
+        elif ch in "}]":
+            if stack:
+                stack.pop()
+        elif ch == "," and stack:
+            cuts.append((i, tuple(stack)))
+    return stack, in_string, cuts
+
+
+def _close(text: str, stack) -> str:
+    return text + "".join(_CLOSER[b] for b in reversed(stack))
+
+
+def _complete_tail(text: str, stack) -> str:
+    """Close a truncated document: drop a dangling `"key"`, `"key":` or trailing comma, then close brackets."""
+    text = text.rstrip()
+    while True:
+        if text.endswith(","):
+            text = text[:-1].rstrip()
+        elif text.endswith(":"):
+            # `"key":` with no value: drop the key too
+            text = re.sub(r'(?:,\s*)?"(?:[^"\\]|\\.)*"\s*:$', "", text).rstrip()
+        elif stack and stack[-1] == "{" and re.search(r'[{,]\s*"(?:[^"\\]|\\.)*"$', text):
+            # a lone key (object context, no colon yet)
+            text = re.sub(r'(?:,\s*)?"(?:[^"\\]|\\.)*"$', "", text).rstrip()
+        else:
+            break
+    return _close(text, stack)
+
+
+def parse_json_object(raw: str) -> Tuple[Optional[dict], bool]:
+    """
+    (object, repaired): the parsed JSON object, and whether it needed repair.
+    (None, False) when nothing usable is found.
+    """
+    if not raw:
+        return None, False
+    out = _loads_object(raw)
+    if out is not None:
+        return out, False
+
+    text = _FENCE_RE.sub("", raw)
+    start = text.find("{")
+    if start < 0:
+        return None, False
+    text = text[start:]
+    end = text.rfind("}")
+    # prose after a complete object
+    if end >= 0:
+        out = _loads_object(_TRAILING_COMMA_RE.sub(r"\1", text[:end + 1]))
+        if out is not None:
+            return out, True
+
+    text = _TRAILING_COMMA_RE.sub(r"\1", text)
+    stack, in_string, cuts = _scan(text)
+    if in_string:
+        if text.endswith("\\"):
+            text = text[:-1]  # half of an escape sequence
+        text += '"'
+    out = _loads_object(_complete_tail(text, stack))
+    if out is not None:
+        return out, True
+
+    # drop the unfinished element: cut back to the last comma boundary that parses
+    for pos, cut_stack in reversed(cuts[-MAX_CUTS:]):
+        out = _loads_object(_complete_tail(text[:pos], cut_stack))
+        if out is not None:
+            return out, True
+    return None, False
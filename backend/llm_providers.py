@@ -0,0 +1,199 @@
+"""
+LLM backends behind one interface.
+
+Callers (call_llm_json in app.py, email_generator.py) ask the configured provider
+for text: generate(prompt, system_instruction=..., response_schema=..., ...). When
+`response_schema` (a Pydantic model class) is given the reply is JSON of that shape.
+
+LLM_PROVIDER picks the backend:
+  - "gemini" (default): Google Gemini through gemini_client (shared models, rate limiter)
+  - "stub": deterministic local replies after a configurable delay
+    (LLM_STUB_LATENCY_MS, LLM_STUB_JITTER_MS), for load tests, benchmarks and
+    offline runs of the whole ingest pipeline; no network, no API key
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from typing import Optional
+
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "gemini")
+LLM_STUB_LATENCY_MS = float(os.getenv("LLM_STUB_LATENCY_MS", "0"))
+LLM_STUB_JITTER_MS = float(os.getenv("LLM_STUB_JITTER_MS", "0"))
+
+DEFAULT_GEMINI_MODEL = "gemini-2.5-flash"
+
+
+class LLMProvider:
+    """Interface every backend implements."""
+
+    name = "base"
+
+    def available(self) -> bool:
+        """Whether calls can be made at all (e.g. an API key is configured)."""
+        return True
+
+    def generate(self, prompt: str, system_instruction: Optional[str] = None, response_schema=None,
+                 temperature: Optional[float] = None, model: Optional[str] = None) -> str:
+        """Reply text for `prompt` (JSON when `response_schema` is given)."""
+        raise NotImplementedError
+
+
+def _response_text(resp) -> str:
+    raw = getattr(resp, "text", None)
+    if raw:
+        return raw
+    # fallback: walk candidates
+    for cand in getattr(resp, "candidates", []) or []:
+        content = getattr(cand, "content", None)
+        parts = getattr(content, "parts", None) if content else None
+        if parts:
+            for p in parts:
+                t = getattr(p, "text", None)
+                if t:
+                    return t
+    return ""
+
+
+class GeminiProvider(LLMProvider):
+    """Google Gemini; models are created lazily and shared (see gemini_client.py)."""
+
+    name = "gemini"
+
+    def __init__(self, default_model: str = DEFAULT_GEMINI_MODEL):
+        self.default_model = default_model
+        self._schemas = {}
+
+    def available(self) -> bool:
+        return bool(os.getenv("GEMINI_API_KEY"))
+
+    def generate(self, prompt: str, system_instruction: Optional[str] = None, response_schema=None,
+                 temperature: Optional[float] = None, model: Optional[str] = None) -> str:
+        import gemini_client
+
+        config = {}
+        if temperature is not None:
+            config["temperature"] = temperature
+        if response_schema is not None:
+            # native structured output: the model is constrained to the schema
+            schema = self._schemas.get(response_schema)
+            if schema is None:
+                schema = self._schemas[response_schema] = gemini_client.response_schema(response_schema)
+            config["response_mime_type"] = "application/json"
+            config["response_schema"] = schema
+        gm = gemini_client.get_model(model or self.default_model, config or None,
+                                     system_instruction=system_instruction)
+        return _response_text(gemini_client.generate_content(gm, prompt))
+
+
+# --- stub ---
+_TRIAL_RE = re.compile(r"\b(PNOC|NCT|PBTC|COG)\s*-?\s*(\d+)\b", re.I)
+_SENTENCE_RE = re.compile(r"[^.!?\n]*[.!?]")
+
+
+class StubProvider(LLMProvider):
+    """
+    Deterministic local replies, no network. JSON requests get one project per trial
+    id found in the prompt's CONTENT (title from the heading line, summary from the
+    first sentence that mentions it, amount from the HINTS); other requests get an
+    email-shaped `SUBJECT: / BODY:` text. Each call sleeps `latency_s` plus a jitter in
+    [0, jitter_s) derived from the prompt, so runs are reproducible.
+    """
+
+    name = "stub"
+
+    def __init__(self, latency_s: float = 0.0, jitter_s: float = 0.0):
+        self.latency_s = latency_s
+        self.jitter_s = jitter_s
+        self._lock = threading.Lock()
+        self.calls = 0
+
+    def _sleep(self, prompt: str) -> None:
+        delay = self.latency_s
+        if self.jitter_s:
+            digest = hashlib.sha1(prompt.encode("utf-8")).digest()
+            delay += self.jitter_s * int.from_bytes(digest[:4], "big") / 2 ** 32
+        if delay > 0:
+            time.sleep(delay)
+
+    def generate(self, prompt: str, system_instruction: Optional[str] = None, response_schema=None,
+                 temperature: Optional[float] = None, model: Optional[str] = None) -> str:
+        with self._lock:
+            self.calls += 1
+        self._sleep(prompt)
+        if response_schema is not None:
+            return json.dumps(self._extract(prompt))
+        return self._email(prompt)
+
+    @staticmethod
+    def _extract(prompt: str) -> dict:
+        hints, content = {}, prompt
+        if prompt.startswith("HINTS:") and "\n\nCONTENT:\n" in prompt:
+            head, content = prompt[len("HINTS:"):].split("\n\nCONTENT:\n", 1)
+            try:
+                hints = json.loads(head)
+            except ValueError:
+                hints = {}
+        grant = hints.get("grant_amount") or {}
+
+        def ids_in(text):
+            return [f"{m.group(1).upper()}{m.group(2)}" for m in _TRIAL_RE.finditer(text)]
+
+        sentences = [(s.strip(), ids_in(s)) for s in _SENTENCE_RE.findall(content)]
+        projects, seen = [], set()
+        for m in _TRIAL_RE.finditer(content):
+            trial_id = f"{m.group(1).upper()}{m.group(2)}"
+            if trial_id in seen:
+                continue
+            seen.add(trial_id)
+            line_start = content.rfind("\n", 0, m.start()) + 1
+            line_end = content.find("\n", m.end())
+            title = content[line_start:line_end if line_end >= 0 else len(content)].strip()[:120]
+            sentence = next((text for text, ids in sentences if trial_id in ids), "")
+            own_grant = grant if hints.get("trial_id") == trial_id else {}
+            projects.append({
+                "title": title,
+                "trial_id": trial_id,
+                "layman_summary": sentence[:400],
+                "fund_usage": {"amount_numeric": own_grant.get("amount_numeric"),
+                               "amount_display": own_grant.get("amount_display", ""),
+                               "currency": "USD", "period": "", "recipient_org": "", "purpose": ""},
+                "future_goals": [],
+                "timeline_snippet": "",
+            })
+        return {"project_year": None, "projects": projects, "global_notes": []}
+
+    @staticmethod
+    def _email(prompt: str) -> str:
+        titles = re.findall(r"(?m)^Title: (.+)$", prompt)
+        body = "\n".join(f"- {t}" for t in titles) or prompt[:200]
+        return f"SUBJECT: Research update ({len(titles)} project{'s' if len(titles) != 1 else ''})\n\n" \
+               f"BODY:\nDear supporters,\n\n{body}\n\nThe Research Team"
+
+
+# --- process-wide provider ---
+_provider: Optional[LLMProvider] = None
+_provider_lock = threading.Lock()
+
+
+def get_provider() -> LLMProvider:
+    """The configured provider (created on first use)."""
+    global _provider
+    if _provider is None:
+        with _provider_lock:
+            if _provider is None:
+                if LLM_PROVIDER == "gemini":
+                    _provider = GeminiProvider(os.getenv("GEMINI_MODEL_NAME", DEFAULT_GEMINI_MODEL))
+                elif LLM_PROVIDER == "stub":
+                    _provider = StubProvider(LLM_STUB_LATENCY_MS / 1000.0, LLM_STUB_JITTER_MS / 1000.0)
+                else:
+                    raise ValueError(f"Unknown LLM_PROVIDER: {LLM_PROVIDER}")
+    return _provider
+
+
+def set_provider(provider: Optional[LLMProvider]) -> None:
+    """Install a provider explicitly (tests, benchmarks); None re-reads the config on next use."""
+    global _provider
+    _provider = provider
@@ -0,0 +1,243 @@
+"""
+In-process metrics in the Prometheus text format, plus per-request Server-Timing.
+
+Counters and histograms are module-level objects that any thread may update;
+render() produces the `/metrics` body. Values that already live elsewhere (cache and
+rate-limiter stats) are read at scrape time through register_collector().
+
+Each gunicorn worker keeps its own numbers: a scrape reports the worker that
+answered it, so aggregate over instances in the Prometheus query.
+
+Stage timings (stage(), timed()) are also noted for the current request, on the
+thread that handles it; app.py turns them into the Server-Timing header.
+"""
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+_metrics: List["_Metric"] = []
+_collectors: List[Callable[[], Iterable[tuple]]] = []
+_local = threading.local()
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(pairs: Iterable[Tuple[str, object]]) -> str:
+    pairs = list(pairs)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _number(v: float) -> str:
+    return repr(float(v)) if v != int(v) else str(int(v))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = ()):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[tuple, object] = {}
+        _metrics.append(self)
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"] + self._samples()
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_labels(zip(self.labelnames, key))} {_number(v)}" for key, v in items]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = (), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            counts = self._values.get(key)
+            if counts is None:
+                counts = self._values[key] = [0] * len(self.buckets) + [0, 0.0]  # buckets..., count, sum
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            counts[-2] += 1
+            counts[-1] += value
+
+    def count(self, **labels) -> int:
+        with self._lock:
+            counts = self._values.get(self._key(labels))
+            return counts[-2] if counts else 0
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, list(counts)) for key, counts in self._values.items())
+        out = []
+        for key, counts in items:
+            base = list(zip(self.labelnames, key))
+            for bound, n in zip(self.buckets, counts):
+                out.append(f"{self.name}_bucket{_labels(base + [('le', _number(bound))])} {n}")
+            out.append(f"{self.name}_bucket{_labels(base + [('le', '+Inf')])} {counts[-2]}")
+            out.append(f"{self.name}_sum{_labels(base)} {_number(round(counts[-1], 6))}")
+            out.append(f"{self.name}_count{_labels(base)} {counts[-2]}")
+        return out
+
+
+def register_collector(fn: Callable[[], Iterable[tuple]]) -> None:
+    """
+    `fn()` is called at scrape time and returns (name, kind, help, samples) tuples,
+    where samples is a list of (labels dict, value).
+    """
+    _collectors.append(fn)
+
+
+def render() -> str:
+    lines = []
+    for m in _metrics:
+        lines.extend(m.render())
+    for fn in _collectors:
+        try:
+            families = list(fn())
+        except Exception as e:  # a broken source must not take /metrics down
+            print(f"metrics collector failed: {e}")
+            continue
+        for name, kind, help, samples in families:
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.extend(f"{name}{_labels(sorted(labels.items()))} {_number(v)}" for labels, v in samples)
+    return "\n".join(lines) + "\n"
+
+
+# --- shared metrics ---
+HTTP_REQUEST_SECONDS = Histogram("http_request_duration_seconds", "HTTP request latency.",
+                                 ("method", "endpoint", "status"))
+INGEST_STAGE_SECONDS = Histogram("ingest_stage_duration_seconds", "Time spent in each ingest pipeline stage.",
+                                 ("stage",))
+STORAGE_CALL_SECONDS = Histogram("storage_call_duration_seconds", "Latency of data helpers (Supabase or SQLite).",
+                                 ("helper", "outcome"))
+LLM_CALL_SECONDS = Histogram("llm_call_duration_seconds", "Latency of one LLM round trip.", ("provider",))
+LLM_EVENTS = Counter("llm_events_total", "call_llm_json outcomes (calls, model_calls, retries, repaired, "
+                                         "cache_hits, failed).", ("event",))
+LLM_TOKENS = Counter("llm_tokens_total", "LLM tokens: estimated prompt/content sent, and provider-reported usage.",
+                     ("kind",))
+
+
+# --- per-request timings (Server-Timing) ---
+def start_request() -> None:
+    _local.timings = {}
+
+
+def finish_request() -> Dict[str, float]:
+    """Seconds per stage noted on this thread since start_request()."""
+    timings = getattr(_local, "timings", None) or {}
+    _local.timings = None
+    return timings
+
+
+def _note(name: str, seconds: float) -> None:
+    timings = getattr(_local, "timings", None)
+    if timings is not None:
+        timings[name] = timings.get(name, 0.0) + seconds
+
+
+def server_timing(timings: Dict[str, float], total: Optional[float] = None) -> str:
+    entries = [f"{name};dur={secs * 1000:.1f}" for name, secs in timings.items()]
+    if total is not None:
+        entries.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(entries)
+
+
+def observe_stage(name: str, seconds: float) -> None:
+    INGEST_STAGE_SECONDS.observe(seconds, stage=name)
+    _note(name, seconds)
+
+
+@contextmanager
+def stage(name: str):
+    """Time one ingest stage."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(name, time.perf_counter() - start)
+
+
+class StageClock:
+    """Time a stage that runs in several pieces (`with clock:` each piece, then record())."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.seconds = 0.0
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.seconds += time.perf_counter() - self._start
+
+    def record(self) -> None:
+        observe_stage(self.name, self.seconds)
+
+
+def timed_iter(name: str, items: Iterable):
+    """Yield from `items`, timing only the time spent producing them (e.g. PDF pages)."""
+    clock = StageClock(name)
+    it = iter(items)
+    try:
+        while True:
+            with clock:
+                item = next(it, clock)
+            if item is clock:
+                return
+            yield item
+    finally:
+        clock.record()
+
+
+def timed_helper(fn):
+    """Record a data helper's latency (storage_call_duration_seconds, Server-Timing `db`)."""
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        outcome = "error"
+        try:
+            result = fn(*args, **kwargs)
+            outcome = "ok"
+            return result
+        finally:
+            seconds = time.perf_counter() - start
+            STORAGE_CALL_SECONDS.observe(seconds, helper=fn.__name__, outcome=outcome)
+            _note("db", seconds)
+    return wrapper
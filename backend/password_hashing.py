@@ -0,0 +1,88 @@
+"""
+bcrypt hashing on a small dedicated thread pool.
+
+bcrypt is deliberately CPU-heavy (~0.25 s per hash at cost 12). Run inline, a burst
+of logins keeps every request thread busy hashing and the whole API stalls. Here at
+most PASSWORD_HASH_WORKERS hashes run at once. bcrypt releases the GIL, so other
+requests keep being served alongside them. At most PASSWORD_HASH_MAX_PENDING are
+queued or running: past that, or after PASSWORD_HASH_TIMEOUT_SECONDS of waiting,
+callers get PasswordHashBusy (a 503 for the client) rather than a growing queue.
+
+BCRYPT_ROUNDS sets the cost of new hashes; existing hashes keep the cost they were
+created with. PASSWORD_HASH_WORKERS=0 hashes inline on the calling thread (the old
+behaviour; used as the benchmark baseline).
+"""
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FuturesTimeout
+
+import bcrypt
+
+import metrics
+
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(max(1, (os.cpu_count() or 2) // 2))))
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", str(max(1, PASSWORD_HASH_WORKERS) * 8)))
+PASSWORD_HASH_TIMEOUT_SECONDS = float(os.getenv("PASSWORD_HASH_TIMEOUT_SECONDS", "10"))
+
+HASH_SECONDS = metrics.Histogram("password_hash_duration_seconds",
+                                 "bcrypt time per call, excluding time queued for the pool.", ("op",))
+HASH_REJECTED = metrics.Counter("password_hash_rejected_total",
+                                "Hash calls refused because the pool was full or too slow.", ("reason",))
+
+_lock = threading.Lock()
+_pool = None
+_slots = threading.BoundedSemaphore(PASSWORD_HASH_MAX_PENDING)
+
+
+class PasswordHashBusy(Exception):
+    """Too many hashes queued, or no result within PASSWORD_HASH_TIMEOUT_SECONDS."""
+
+
+def _get_pool() -> ThreadPoolExecutor:
+    global _pool
+    if _pool is None:
+        with _lock:
+            if _pool is None:
+                _pool = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt")
+    return _pool
+
+
+def _timed(op: str, fn, *args):
+    start = time.perf_counter()
+    try:
+        return fn(*args)
+    finally:
+        HASH_SECONDS.observe(time.perf_counter() - start, op=op)
+
+
+def _run(op: str, fn, *args):
+    if PASSWORD_HASH_WORKERS <= 0:
+        return _timed(op, fn, *args)
+    if not _slots.acquire(blocking=False):
+        HASH_REJECTED.inc(reason="queue_full")
+        raise PasswordHashBusy("Too many password checks in progress")
+    try:
+        future = _get_pool().submit(_timed, op, fn, *args)
+    except BaseException:
+        _slots.release()
+        raise
+    future.add_done_callback(lambda _: _slots.release())
+    try:
+        return future.result(timeout=PASSWORD_HASH_TIMEOUT_SECONDS)
+    except FuturesTimeout:
+        HASH_REJECTED.inc(reason="timeout")
+        raise PasswordHashBusy("Password check timed out")
+
+
+def hash_password(password: str) -> str:
+    """bcrypt hash (cost BCRYPT_ROUNDS) as a str."""
+    def _hash(pw: bytes) -> bytes:
+        return bcrypt.hashpw(pw, bcrypt.gensalt(BCRYPT_ROUNDS))
+    return _run("hash", _hash, password.encode("utf-8")).decode("utf-8")
+
+
+def check_password(password: str, hashed: str) -> bool:
+    return _run("check", bcrypt.checkpw, password.encode("utf-8"), hashed.encode("utf-8"))
@@ -0,0 +1,142 @@
+"""
+Streaming, page-parallel PDF text extraction.
+
+Uploads are spooled to a temp file instead of being read into memory, page ranges
+are extracted by a process pool (PyMuPDF text extraction is CPU-bound), and each
+page is normalized as soon as it is produced. `iter_pdf_pages` keeps only a small
+window of page ranges in flight, so extraction never holds the PDF bytes or more
+than a few pages of raw text at once. The ingest pipeline still keeps the chunked
+text of the whole document (the hint index and the job progress need every chunk
+before the first LLM call), so its memory grows with the document's text, not
+with the size of the PDF file.
+
+The pool uses the `spawn` start method, so each worker re-imports the parent's main
+module as `__mp_main__`: under `python app.py` that is the whole Flask app. app.py
+therefore keeps start-up work (the ingest job queue) out of import time; see
+`start_background_jobs`. Under gunicorn the main module is gunicorn's own script.
+"""
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from typing import Iterator, List, Optional
+
+from text_processing import normalize_text
+
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", str(min(4, os.cpu_count() or 1))))
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "8"))
+# below this many pages a worker round trip costs more than it saves
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "24"))
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+class PdfExtractionError(Exception):
+    """This document could not be extracted (its worker process kept dying)."""
+
+
+def _get_pool(workers: int) -> ProcessPoolExecutor:
+    """One process pool per API process, created on first large PDF."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn: forking a threaded Flask/gRPC process is not safe
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+
+def _reset_pool(broken: ProcessPoolExecutor) -> None:
+    """Drop a pool whose worker died so the next call starts a fresh one."""
+    global _pool
+    with _pool_lock:
+        if _pool is broken:
+            _pool = None
+    broken.shutdown(wait=False, cancel_futures=True)
+
+
+def _page_text(page, number: int) -> str:
+    t = page.get_text("text") or ""
+    return normalize_text(f"[PDF p{number}]\n{t}")
+
+
+def _extract_page_range(path: str, start: int, stop: int) -> List[str]:
+    """Worker: normalized text for pages [start, stop) (0-based)."""
+    import fitz  # PyMuPDF; imported on first PDF, not at API import
+    with fitz.open(path) as doc:
+        return [_page_text(doc[i], i + 1) for i in range(start, stop)]
+
+
+def iter_pdf_pages(path: str, workers: Optional[int] = None, pages_per_task: Optional[int] = None) -> Iterator[str]:
+    """Yield each page's normalized text (with its `[PDF pN]` marker) in page order."""
+    workers = PDF_WORKERS if workers is None else workers
+    pages_per_task = max(1, pages_per_task or PDF_PAGES_PER_TASK)
+
+    import fitz  # PyMuPDF; imported on first PDF, not at API import
+    with fitz.open(path) as doc:
+        page_count = doc.page_count
+        if workers <= 1 or page_count < PDF_PARALLEL_MIN_PAGES:
+            for i, page in enumerate(doc, start=1):
+                yield _page_text(page, i)
+            return
+
+    # a dead worker (e.g. OOM on a malformed PDF) breaks the whole pool: replace it and
+    # retry the rest of this document once on a fresh pool, then give up on the document
+    done = 0
+    for attempt in range(2):
+        pool = _get_pool(workers)
+        try:
+            for pages in _extract_ranges(pool, path, done, page_count, pages_per_task, workers * 2):
+                done += len(pages)
+                yield from pages
+            return
+        except BrokenProcessPool:
+            _reset_pool(pool)
+            print(f"PDF worker died on {os.path.basename(path)} (page {done + 1}+), attempt {attempt + 1}")
+    raise PdfExtractionError(f"PDF text extraction crashed at page {done + 1}")
+
+
+def _extract_ranges(pool: ProcessPoolExecutor, path: str, start: int, page_count: int,
+                    pages_per_task: int, window: int) -> Iterator[List[str]]:
+    """Page lists for [start, page_count) in order, at most `window` ranges in flight."""
+    ranges = iter([(s, min(s + pages_per_task, page_count)) for s in range(start, page_count, pages_per_task)])
+    in_flight = deque()
+    for _ in range(window):
+        r = next(ranges, None)
+        if r is None:
+            break
+        in_flight.append(pool.submit(_extract_page_range, path, *r))
+    try:
+        while in_flight:
+            pages = in_flight.popleft().result()
+            r = next(ranges, None)
+            if r is not None:
+                in_flight.append(pool.submit(_extract_page_range, path, *r))
+            yield pages
+    finally:
+        # closed early (caller gave up): workers must be done with the file before it is deleted
+        for fut in in_flight:
+            fut.cancel()
+        wait(in_flight)
+
+
+@contextmanager
+def spooled_pdf(upload) -> Iterator[str]:
+    """
+    Copy an upload (werkzeug FileStorage or any binary file object) to a temp file
+    in fixed-size blocks and yield its path; the file is removed afterwards.
+    """
+    stream = getattr(upload, "stream", upload)
+    fd, path = tempfile.mkstemp(suffix=".pdf")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            shutil.copyfileobj(stream, out, length=1024 * 1024)
+        yield path
+    finally:
+        if os.path.exists(path):
+            os.remove(path)
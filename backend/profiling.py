@@ -0,0 +1,127 @@
+"""
+Opt-in profiling of individual requests.
+
+A request is profiled when it carries `X-Profile: <PROFILE_TOKEN>` (header use is off
+while PROFILE_TOKEN is unset) or is picked by PROFILE_SAMPLE_RATE (0..1). Sampled
+requests are only written out when they took at least PROFILE_THRESHOLD_MS; requests
+profiled on demand are always written. Files go to PROFILE_DIR, named
+<time>-<endpoint>-<ms>ms-<request id>.
+
+PROFILE_MODE:
+  - "sample" (default): a helper thread records the handler thread's stack every
+    PROFILE_INTERVAL_MS. Output is `.folded` (one "frame;frame;... count" line per
+    stack), which flamegraph.pl and speedscope open directly. Overhead does not grow
+    with call counts. Needs OS-thread workers (dev server, gunicorn threaded/sync).
+  - "cprofile": deterministic cProfile of the handler thread, saved as `.prof`
+    (pstats; snakeviz / flameprof). Exact call counts, but slows the request.
+
+Chunk LLM calls run on pool threads, so they show up as time spent waiting in the
+handler's fan-out (the `llm` stage), not as their own frames.
+"""
+import cProfile
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Optional
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_THRESHOLD_MS = float(os.getenv("PROFILE_THRESHOLD_MS", "1000"))
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN", "")
+PROFILE_MODE = os.getenv("PROFILE_MODE", "sample")
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(BASE_DIR, "profiles"))
+# a sampler still running after this long is stopped (e.g. a response that was never closed)
+PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", "900"))
+
+_SAFE_NAME_RE = re.compile(r"[^A-Za-z0-9_.-]+")
+
+
+def wanted(header_value: Optional[str]) -> Optional[bool]:
+    """None: do not profile; True: profile on demand (always written); False: sampled."""
+    if PROFILE_TOKEN and header_value and header_value == PROFILE_TOKEN:
+        return True
+    if PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE:
+        return False
+    return None
+
+
+def safe_name(value: str, limit: int = 64) -> str:
+    return _SAFE_NAME_RE.sub("_", value)[:limit]
+
+
+class _StackSampler:
+    def __init__(self, thread_id: int, interval_s: float):
+        self.thread_id = thread_id
+        self.interval_s = interval_s
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def _run(self) -> None:
+        deadline = time.monotonic() + PROFILE_MAX_SECONDS
+        while not self._stop.wait(self.interval_s) and time.monotonic() < deadline:
+            frame = sys._current_frames().get(self.thread_id)
+            frames = []
+            while frame is not None:
+                code = frame.f_code
+                frames.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if frames:
+                self.stacks[";".join(reversed(frames))] += 1
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def save(self, path: str) -> None:
+        with open(path, "w") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+class RequestProfile:
+    """Profile of the calling thread from start() until finish()."""
+
+    def __init__(self, forced: bool, mode: Optional[str] = None):
+        self.forced = forced
+        self.mode = mode or PROFILE_MODE
+        self._start = time.perf_counter()
+        if self.mode == "cprofile":
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        else:
+            self._profiler = _StackSampler(threading.get_ident(), PROFILE_INTERVAL_MS / 1000.0)
+            self._profiler.start()
+
+    def finish(self, request_id: str, endpoint: str) -> Optional[str]:
+        """Stop profiling; write the profile if it qualifies and return its path."""
+        elapsed_ms = (time.perf_counter() - self._start) * 1000
+        if self.mode == "cprofile":
+            self._profiler.disable()
+        else:
+            self._profiler.stop()
+        if not self.forced and elapsed_ms < PROFILE_THRESHOLD_MS:
+            return None
+
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}-{safe_name(endpoint)}-{elapsed_ms:.0f}ms-{safe_name(request_id)}"
+        path = os.path.join(PROFILE_DIR, name + (".prof" if self.mode == "cprofile" else ".folded"))
+        try:
+            if self.mode == "cprofile":
+                self._profiler.dump_stats(path)
+            else:
+                self._profiler.save(path)
+        except OSError as e:
+            print(f"Could not write profile {path}: {e}")
+            return None
+        print(f"Profile written: {path}")
+        return path
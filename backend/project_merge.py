@@ -0,0 +1,156 @@
+"""
+Reduce stage of multi-chunk extraction: collapse the per-chunk project lists into one.
+
+Each chunk is extracted on its own, so the same project comes back several times,
+either with the same trial_id or, when a chunk never saw the id, under a slightly
+different title ("Phase II glioma imaging study" / "Glioma imaging study (phase 2)").
+merge_projects() reduces in two levels:
+  1. entries with the same trial_id are grouped (always the same project; "PNOC13"
+     and "PNOC013" count as the same id for the consortium ids written with or
+     without zero padding, PNOC/PBTC/COG; fixed-width registry ids such as NCT
+     numbers are compared as written)
+  2. groups and id-less entries are joined when the token-set (Jaccard) similarity of
+     their titles reaches TITLE_SIMILARITY; two different trial ids never merge
+
+Step 2 stays sub-quadratic: candidates come from an inverted index over each title's
+rarest tokens (prefix filtering, which still finds every pair above the threshold),
+blocked by trial-ID prefix (PNOC, NCT, ...). Entries with an id are only compared
+with id-less entries, never with other trials; id-less entries look in every block.
+
+Field merging only depends on input (chunk) order: first title, id and fund-usage
+details seen; longest summary and timeline; union of future goals, sorted.
+"""
+import math
+import os
+import re
+from collections import defaultdict
+from typing import Dict, List
+
+TITLE_SIMILARITY = float(os.getenv("MERGE_TITLE_SIMILARITY", "0.75"))
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_TRIAL_ID_PARTS_RE = re.compile(r"^([A-Z]*)(\d*)(.*)$")
+# ids whose number is written both with and without leading zeros
+_UNPADDED_PREFIXES = frozenset({"PNOC", "PBTC", "COG"})
+_STOPWORDS = frozenset("a an and at by for from in of on or the to with".split())
+_ROMAN = {"i": "1", "ii": "2", "iii": "3", "iv": "4"}
+
+
+def title_tokens(title: str) -> frozenset:
+    """Normalized title words: lowercase, no stopwords, phase numerals as digits."""
+    words = _TOKEN_RE.findall((title or "").lower())
+    return frozenset(_ROMAN.get(w, w) for w in words if w not in _STOPWORDS)
+
+
+def title_similarity(a: str, b: str) -> float:
+    """Token-set (Jaccard) similarity of two titles, 0..1."""
+    ta, tb = title_tokens(a), title_tokens(b)
+    if not ta or not tb:
+        return 0.0
+    return len(ta & tb) / len(ta | tb)
+
+
+def _trial_key(trial_id: str) -> tuple:
+    """(block, canonical id) for a normalized trial id; ("", "") when there is none."""
+    if not trial_id:
+        return "", ""
+    prefix, number, rest = _TRIAL_ID_PARTS_RE.match(trial_id).groups()
+    if prefix in _UNPADDED_PREFIXES:
+        number = number.lstrip("0")
+    return prefix, f"{prefix}{number}{rest}" or trial_id
+
+
+def _find(parent: List[int], i: int) -> int:
+    while parent[i] != i:
+        parent[i] = parent[parent[i]]
+        i = parent[i]
+    return i
+
+
+def _merge_fields(members: List[dict]) -> dict:
+    base = dict(members[0])
+    fund = dict(base.get("fund_usage") or {})
+    goals, seen_goals = [], set()
+    for p in members:
+        if not base.get("trial_id") and p.get("trial_id"):
+            base["trial_id"] = p["trial_id"]
+        for key in ("layman_summary", "timeline_snippet"):
+            if len(p.get(key) or "") > len(base.get(key) or ""):
+                base[key] = p[key]
+        pu = p.get("fund_usage") or {}
+        if fund.get("amount_numeric") is None and pu.get("amount_numeric") is not None:
+            fund["amount_numeric"] = pu["amount_numeric"]
+            fund["amount_display"] = pu.get("amount_display", fund.get("amount_display", ""))
+        for k in ("period", "recipient_org", "purpose"):
+            if not fund.get(k) and pu.get(k):
+                fund[k] = pu[k]
+        for g in p.get("future_goals") or []:
+            key = str(g).strip().lower()
+            if key and key not in seen_goals:
+                seen_goals.add(key)
+                goals.append(g)
+    base["fund_usage"] = fund
+    base["future_goals"] = sorted(goals, key=str.lower)
+    return base
+
+
+def merge_projects(projects: List[dict], threshold: float = None) -> List[dict]:
+    """Deduplicated projects, in order of first appearance."""
+    threshold = TITLE_SIMILARITY if threshold is None else threshold
+
+    # level 1: one group per trial_id, id-less entries on their own
+    groups: List[List[dict]] = []
+    by_id: Dict[str, int] = {}
+    block_of: List[str] = []
+    for p in projects:
+        block, key = _trial_key(p.get("trial_id") or "")
+        if key and key in by_id:
+            groups[by_id[key]].append(p)
+            continue
+        if key:
+            by_id[key] = len(groups)
+        groups.append([p])
+        block_of.append(block)
+
+    # level 2: fuzzy title join between groups
+    ids = [g[0].get("trial_id") or "" for g in groups]
+    tokens = [title_tokens(g[0].get("title", "")) for g in groups]
+    freq = defaultdict(int)
+    for ts in tokens:
+        for t in ts:
+            freq[t] += 1
+
+    parent = list(range(len(groups)))
+    root_id = list(ids)               # trial_id carried by each union-find root
+    index = defaultdict(list)         # (block, token) -> group indexes
+    blocks = set()
+    for i, ts in enumerate(tokens):
+        if not ts:
+            continue
+        ordered = sorted(ts, key=lambda t: (freq[t], t))
+        prefix = ordered[:len(ordered) - math.ceil(threshold * len(ordered)) + 1]
+        block = block_of[i]
+        probe_blocks = ("",) if block else blocks | {""}
+
+        candidates = set()
+        for t in prefix:
+            for b in probe_blocks:
+                candidates.update(index.get((b, t), ()))
+        for j in sorted(candidates):
+            ri, rj = _find(parent, i), _find(parent, j)
+            if ri == rj or (root_id[ri] and root_id[rj]):
+                continue
+            if len(ts & tokens[j]) / len(ts | tokens[j]) >= threshold:
+                keep, drop = min(ri, rj), max(ri, rj)
+                parent[drop] = keep
+                root_id[keep] = root_id[keep] or root_id[drop]
+
+        if block:
+            blocks.add(block)
+        for t in prefix:
+            index[(block, t)].append(i)
+
+    clusters: Dict[int, List[dict]] = {}
+    for i, g in enumerate(groups):
+        clusters.setdefault(_find(parent, i), []).extend(g)
+    return [_merge_fields(members) for members in clusters.values()]
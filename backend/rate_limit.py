@@ -0,0 +1,155 @@
+"""
+Client-side admission control for LLM calls.
+
+One RateLimiter per process is shared by every thread that talks to Gemini (chunk
+fan-out, batch ingest, async jobs, email generation). Its buckets are not shared
+between processes: each server process is given its own share of the quota (see
+GEMINI_QUOTA_SHARES in gemini_client.py). Before a call, a caller waits
+for admission: a request token (requests/minute bucket), enough LLM tokens for its
+estimated size (tokens/minute bucket) and a free in-flight slot. Waiters are served
+first come, first served, so a big batch cannot starve a single upload.
+
+When the provider still pushes back (429 / 503), the limiter pauses admission with
+exponential backoff and halves its effective rate; successful calls raise the rate
+again step by step (AIMD), so throughput settles just under the real quota instead
+of alternating between overload and failure. Calls that fail for other reasons
+(timeouts, 5xx, bad requests) only free their slot and leave the rate alone.
+"""
+import random
+import threading
+import time
+from collections import deque
+from typing import Optional
+
+# bucket capacity: how many seconds' worth of quota may be spent in one burst
+BURST_SECONDS = 10.0
+
+
+class AdmissionTimeout(Exception):
+    """No capacity became available within the caller's timeout."""
+
+
+def is_throttle_error(exc: Exception) -> bool:
+    """True for provider quota / overload errors (HTTP 429 / 503, gRPC RESOURCE_EXHAUSTED / UNAVAILABLE)."""
+    name = type(exc).__name__
+    if name in ("ResourceExhausted", "TooManyRequests", "ServiceUnavailable"):
+        return True
+    code = getattr(exc, "code", None)
+    code = code() if callable(code) else code
+    code = getattr(code, "value", code)
+    if isinstance(code, tuple):  # grpc.StatusCode values are (int, name)
+        code = code[0]
+    return code in (429, 503, 8, 14)  # 8/14: gRPC RESOURCE_EXHAUSTED / UNAVAILABLE
+
+
+class RateLimiter:
+    """
+    Token buckets for requests/minute and tokens/minute plus an in-flight cap
+    (0 disables any of them). acquire() before the call, release() after it.
+    """
+
+    def __init__(self, rpm: float = 0, tpm: float = 0, max_concurrency: int = 0,
+                 backoff_base: float = 1.0, backoff_max: float = 60.0, min_scale: float = 0.1):
+        self.rpm, self.tpm, self.max_concurrency = rpm, tpm, max_concurrency
+        self.backoff_base, self.backoff_max, self.min_scale = backoff_base, backoff_max, min_scale
+        self._req_capacity = max(1.0, rpm / 60.0 * BURST_SECONDS) if rpm else 0.0
+        self._tok_capacity = max(1.0, tpm / 60.0 * BURST_SECONDS) if tpm else 0.0
+        self._req = self._req_capacity
+        self._tok = self._tok_capacity
+        self._scale = 1.0           # multiplier on the refill rates, lowered on throttling
+        self._paused_until = 0.0
+        self._failures = 0          # consecutive throttled calls
+        self._in_flight = 0
+        self._last = time.monotonic()
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self.admitted = 0
+        self.throttled = 0
+        self.failed = 0
+        self.timeouts = 0
+        self.wait_seconds = 0.0
+
+    def _refill(self, now: float) -> None:
+        elapsed, self._last = now - self._last, now
+        if self.rpm:
+            self._req = min(self._req_capacity, self._req + elapsed * self.rpm / 60.0 * self._scale)
+        if self.tpm:
+            self._tok = min(self._tok_capacity, self._tok + elapsed * self.tpm / 60.0 * self._scale)
+
+    def _wait_needed(self, now: float, tokens: float) -> Optional[float]:
+        """Seconds until the head of the queue could be admitted; 0 = now, None = on release."""
+        if now < self._paused_until:
+            return self._paused_until - now
+        if self.max_concurrency and self._in_flight >= self.max_concurrency:
+            return None
+        wait = 0.0
+        if self.rpm and self._req < 1:
+            wait = max(wait, (1 - self._req) / (self.rpm / 60.0 * self._scale))
+        if self.tpm and self._tok < tokens:
+            wait = max(wait, (tokens - self._tok) / (self.tpm / 60.0 * self._scale))
+        return wait
+
+    def acquire(self, tokens: float = 0, timeout: Optional[float] = None) -> None:
+        """Block until this call may go out (FIFO). Raises AdmissionTimeout after `timeout` seconds."""
+        tokens = min(tokens, self._tok_capacity) if self.tpm else 0
+        ticket = object()
+        start = time.monotonic()
+        deadline = None if timeout is None else start + timeout
+        with self._cond:
+            self._queue.append(ticket)
+            try:
+                while True:
+                    now = time.monotonic()
+                    self._refill(now)
+                    wait = self._wait_needed(now, tokens) if self._queue[0] is ticket else None
+                    if wait == 0:
+                        if self.rpm:
+                            self._req -= 1
+                        if self.tpm:
+                            self._tok -= tokens
+                        self._in_flight += 1
+                        self.admitted += 1
+                        self.wait_seconds += now - start
+                        return
+                    if deadline is not None:
+                        if now >= deadline:
+                            self.timeouts += 1
+                            raise AdmissionTimeout(f"LLM call not admitted within {timeout:g}s")
+                        wait = deadline - now if wait is None else min(wait, deadline - now)
+                    self._cond.wait(wait)
+            finally:
+                self._queue.remove(ticket)
+                self._cond.notify_all()
+
+    def release(self, estimated_tokens: float = 0, actual_tokens: Optional[float] = None,
+                throttled: bool = False, failed: bool = False) -> None:
+        """
+        Report the outcome of an admitted call. `actual_tokens` (if known) corrects the
+        estimate charged at admission; `throttled` starts a backoff; `failed` (an error
+        that is not throttling) frees the slot without counting as a success.
+        """
+        with self._cond:
+            self._in_flight = max(0, self._in_flight - 1)
+            if self.tpm and actual_tokens is not None:
+                # may go negative: an underestimate is paid back before the next admission
+                self._tok -= actual_tokens - min(estimated_tokens, self._tok_capacity)
+            if throttled:
+                self.throttled += 1
+                self._failures += 1
+                delay = min(self.backoff_max, self.backoff_base * 2 ** (self._failures - 1))
+                delay *= 0.5 + random.random() / 2  # jitter so workers do not retry in lockstep
+                self._paused_until = max(self._paused_until, time.monotonic() + delay)
+                self._scale = max(self.min_scale, self._scale * 0.5)
+            elif failed:
+                self.failed += 1
+            else:
+                self._failures = 0
+                self._scale = min(1.0, self._scale + 0.1)
+            self._cond.notify_all()
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {"admitted": self.admitted, "throttled": self.throttled, "failed": self.failed,
+                    "timeouts": self.timeouts,
+                    "wait_seconds": round(self.wait_seconds, 3), "in_flight": self._in_flight,
+                    "queued": len(self._queue), "rate_scale": round(self._scale, 3)}
@@ -0,0 +1,74 @@
+"""
+In-process cache of serialized read responses.
+
+The public timeline reads (`/api/research`, `/api/research/year/<year>`) are cached
+here as ready-to-send JSON bytes plus an ETag, so a hit costs no Supabase round trip
+and no re-serialization, and a client holding the current ETag gets a 304.
+Writes through the API call invalidate(); entries also expire after a TTL, which
+bounds staleness for writes made elsewhere (Supabase dashboard, other processes).
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, NamedTuple, Optional
+
+
+class CachedBody(NamedTuple):
+    body: bytes
+    etag: str
+
+
+class ResponseCache:
+    """Thread-safe TTL + LRU map of key -> CachedBody."""
+
+    def __init__(self, ttl_seconds: float = 30.0, max_entries: int = 256):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[object, tuple]" = OrderedDict()  # key -> (CachedBody, expires_at)
+        self._lock = threading.Lock()
+        # bumped by invalidate(); a fill that started before an invalidation is not stored
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key) -> Optional[CachedBody]:
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None or item[1] <= time.monotonic():
+                if item is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return item[0]
+
+    def get_or_build(self, key, build: Callable[[], bytes]) -> CachedBody:
+        """Cached body for `key`, or build() it (outside the lock) and cache the result."""
+        cached = self.get(key)
+        if cached is not None:
+            return cached
+        with self._lock:
+            generation = self._generation
+        body = build()
+        entry = CachedBody(body, hashlib.sha1(body).hexdigest())
+        if self.ttl_seconds > 0:
+            with self._lock:
+                if generation == self._generation:
+                    self._entries[key] = (entry, time.monotonic() + self.ttl_seconds)
+                    self._entries.move_to_end(key)
+                    while len(self._entries) > self.max_entries:
+                        self._entries.popitem(last=False)
+        return entry
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses,
+                    "hit_rate": (self.hits / total) if total else 0.0}
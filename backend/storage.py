@@ -0,0 +1,356 @@
+"""
+Storage backends behind the data helpers in supabase_client.py.
+
+STORAGE_BACKEND selects the implementation:
+  supabase (default)  the hosted Supabase project (SUPABASE_URL / SUPABASE_KEY)
+  sqlite              a local SQLite file (SQLITE_DB_PATH) plus a folder for PDFs
+                      (LOCAL_STORAGE_DIR), for offline runs, benchmarks and on-prem installs
+
+Both expose the same methods and return rows as plain dicts shaped like the
+Supabase tables in database-schema.sql. The backend is created on first use, so
+importing this module (or supabase_client) never needs credentials.
+"""
+import os
+import sqlite3
+import threading
+import uuid
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "supabase")
+SQLITE_DB_PATH = os.getenv("SQLITE_DB_PATH", os.path.join(BASE_DIR, "local_data.sqlite3"))
+LOCAL_STORAGE_DIR = os.getenv("LOCAL_STORAGE_DIR", os.path.join(BASE_DIR, "local_storage"))
+
+RESEARCH_COLUMNS = ("id", "pdf_id", "title", "year", "impact", "money", "summary",
+                    "created_by", "created_at", "updated_at")
+
+
+def _now() -> str:
+    return datetime.utcnow().isoformat()
+
+
+class Storage(ABC):
+    """Interface shared by the backends (all methods required). `columns=None` means every column."""
+
+    @abstractmethod
+    def upload_pdf(self, storage_path: str, file_bytes: bytes) -> str:
+        """Store the PDF bytes at `storage_path`; returns a URL for it."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def insert(self, table: str, data: dict) -> dict:
+        raise NotImplementedError
+
+    @abstractmethod
+    def insert_many(self, table: str, rows: List[dict]) -> list:
+        """Insert all `rows` in one statement (all or none); returns them in the same order."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def update_research(self, research_id: str, data: dict) -> Optional[dict]:
+        """Updated row, or None when no row has that id."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def mark_pdf_processed(self, pdf_id: str) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_research(self, year: Optional[int] = None, columns: Optional[List[str]] = None) -> list:
+        """Research rows (optionally one year), newest year first."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_research_page(self, limit: int, after: Optional[Tuple[int, str]] = None, year: Optional[int] = None,
+                          columns: Optional[List[str]] = None) -> list:
+        """Up to `limit` rows in (year desc, id desc) order, strictly after the (year, id) key `after`."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_all_pdfs(self) -> list:
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_user_by_email(self, email: str) -> Optional[dict]:
+        raise NotImplementedError
+
+
+class SupabaseStorage(Storage):
+    def __init__(self, client=None):
+        if client is None:
+            from supabase import create_client
+            url, key = os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_KEY")
+            if not url or not key:
+                raise ValueError("Missing SUPABASE_URL or SUPABASE_KEY in environment variables")
+            client = create_client(url, key)
+        self.client = client
+
+    @staticmethod
+    def _select(columns: Optional[List[str]]) -> str:
+        return ",".join(columns) if columns else "*"
+
+    def upload_pdf(self, storage_path: str, file_bytes: bytes) -> str:
+        bucket = self.client.storage.from_("pdfs")
+        try:
+            response = bucket.upload(
+                storage_path,
+                file_bytes,
+                file_options={"content-type": "application/pdf", "upsert": "false"}
+            )
+            print(f"Upload response: {response}")
+        except Exception as e:
+            print(f"Storage upload error: {e}")
+            # If upload fails, still return the path (file might already exist)
+        return bucket.get_public_url(storage_path)
+
+    def insert(self, table: str, data: dict) -> dict:
+        response = self.client.table(table).insert(data).execute()
+        return response.data[0] if response.data else {}
+
+    def insert_many(self, table: str, rows: List[dict]) -> list:
+        if not rows:
+            return []
+        # PostgREST takes a JSON array as one multi-row INSERT and returns rows in input order
+        response = self.client.table(table).insert(rows).execute()
+        return response.data or []
+
+    def update_research(self, research_id: str, data: dict) -> Optional[dict]:
+        response = self.client.table("research_data").update(data).eq("id", research_id).execute()
+        return response.data[0] if response.data else None
+
+    def mark_pdf_processed(self, pdf_id: str) -> None:
+        self.client.table("pdfs").update({"processed": True}).eq("id", pdf_id).execute()
+
+    def get_research(self, year: Optional[int] = None, columns: Optional[List[str]] = None) -> list:
+        query = self.client.table("research_data").select(self._select(columns))
+        if year is not None:
+            response = query.eq("year", year).execute()
+        else:
+            response = query.order("year", desc=True).execute()
+        return response.data or []
+
+    def get_research_page(self, limit: int, after: Optional[Tuple[int, str]] = None, year: Optional[int] = None,
+                          columns: Optional[List[str]] = None) -> list:
+        query = self.client.table("research_data").select(self._select(columns))
+        if year is not None:
+            query = query.eq("year", year)
+        if after is not None:
+            after_year, after_id = after
+            query = query.or_(f"year.lt.{after_year},and(year.eq.{after_year},id.lt.{after_id})")
+        response = query.order("year", desc=True).order("id", desc=True).limit(limit).execute()
+        return response.data or []
+
+    def get_all_pdfs(self) -> list:
+        response = self.client.table("pdfs").select("*").order("uploaded_at", desc=True).execute()
+        return response.data or []
+
+    def get_user_by_email(self, email: str) -> Optional[dict]:
+        response = self.client.table("users").select("*").eq("email", email).execute()
+        return response.data[0] if response.data else None
+
+
+_SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+  id TEXT PRIMARY KEY,
+  email TEXT UNIQUE NOT NULL,
+  password TEXT NOT NULL,
+  name TEXT NOT NULL,
+  role TEXT DEFAULT 'user',
+  created_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS pdfs (
+  id TEXT PRIMARY KEY,
+  filename TEXT NOT NULL,
+  original_name TEXT NOT NULL,
+  storage_path TEXT NOT NULL,
+  file_size INTEGER,
+  uploaded_by TEXT REFERENCES users(id),
+  uploaded_at TEXT NOT NULL,
+  processed INTEGER DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS research_data (
+  id TEXT PRIMARY KEY,
+  pdf_id TEXT REFERENCES pdfs(id) ON DELETE SET NULL,
+  title TEXT NOT NULL,
+  year INTEGER NOT NULL,
+  impact TEXT,
+  money TEXT,
+  summary TEXT,
+  created_by TEXT REFERENCES users(id),
+  created_at TEXT NOT NULL,
+  updated_at TEXT
+);
+CREATE TABLE IF NOT EXISTS email_templates (
+  id TEXT PRIMARY KEY,
+  research_id TEXT REFERENCES research_data(id),
+  subject TEXT NOT NULL,
+  body TEXT NOT NULL,
+  generated_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_research_year_id ON research_data (year DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_research_pdf_id ON research_data (pdf_id);
+CREATE INDEX IF NOT EXISTS idx_pdfs_uploaded_at ON pdfs (uploaded_at);
+"""
+# users.email is indexed by its UNIQUE constraint
+
+# column filled with the insert time, per table
+_CREATED_COLUMN = {"users": "created_at", "pdfs": "uploaded_at", "research_data": "created_at",
+                   "email_templates": "generated_at"}
+
+
+class SQLiteStorage(Storage):
+    """Same tables as database-schema.sql in one local SQLite file (WAL, one shared connection)."""
+
+    def __init__(self, path: str = SQLITE_DB_PATH, files_dir: str = LOCAL_STORAGE_DIR):
+        self.path = path
+        self.files_dir = files_dir
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            folder = os.path.dirname(self.path)
+            if folder:
+                os.makedirs(folder, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SQLITE_SCHEMA)
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def _query(self, sql: str, params=()) -> list:
+        with self._lock:
+            rows = self._connect().execute(sql, params).fetchall()
+        return [self._row(r) for r in rows]
+
+    def _write(self, sql: str, params=()) -> int:
+        with self._lock:
+            conn = self._connect()
+            cur = conn.execute(sql, params)
+            conn.commit()
+            return cur.rowcount
+
+    @staticmethod
+    def _row(row: sqlite3.Row) -> dict:
+        out = dict(row)
+        if "processed" in out:
+            out["processed"] = bool(out["processed"])
+        return out
+
+    @staticmethod
+    def _columns(columns: Optional[List[str]]) -> str:
+        if not columns:
+            return "*"
+        for c in columns:
+            if c not in RESEARCH_COLUMNS:
+                raise ValueError(f"Unknown research field: {c}")
+        return ", ".join(columns)
+
+    def upload_pdf(self, storage_path: str, file_bytes: bytes) -> str:
+        path = os.path.abspath(os.path.join(self.files_dir, "pdfs", storage_path))
+        if not path.startswith(os.path.abspath(self.files_dir) + os.sep):
+            raise ValueError("Invalid storage path")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(file_bytes)
+        return "file://" + path
+
+    def insert(self, table: str, data: dict) -> dict:
+        if table not in _CREATED_COLUMN:
+            raise ValueError(f"Unknown table: {table}")
+        row = {"id": str(uuid.uuid4()), _CREATED_COLUMN[table]: _now(), **data}
+        cols = list(row)
+        self._write(f"INSERT INTO {table} ({', '.join(cols)}) VALUES ({', '.join('?' * len(cols))})",
+                    [row[c] for c in cols])
+        return self._query(f"SELECT * FROM {table} WHERE id = ?", (row["id"],))[0]
+
+    def insert_many(self, table: str, rows: List[dict]) -> list:
+        if table not in _CREATED_COLUMN:
+            raise ValueError(f"Unknown table: {table}")
+        if not rows:
+            return []
+        now = _now()
+        full = [{"id": str(uuid.uuid4()), _CREATED_COLUMN[table]: now, **r} for r in rows]
+        cols = sorted({c for r in full for c in r})
+        sql = f"INSERT INTO {table} ({', '.join(cols)}) VALUES ({', '.join('?' * len(cols))})"
+        with self._lock:
+            conn = self._connect()
+            with conn:  # one transaction: commit once, roll back everything on error
+                conn.executemany(sql, [[r.get(c) for c in cols] for r in full])
+        ids = [r["id"] for r in full]
+        by_id = {}
+        for start in range(0, len(ids), 500):  # stay under SQLite's bound-parameter limit
+            part = ids[start:start + 500]
+            for row in self._query(f"SELECT * FROM {table} WHERE id IN ({', '.join('?' * len(part))})", part):
+                by_id[row["id"]] = row
+        return [by_id[i] for i in ids]
+
+    def update_research(self, research_id: str, data: dict) -> Optional[dict]:
+        cols = [c for c in data if c in RESEARCH_COLUMNS and c != "id"]
+        if cols:
+            assignments = ", ".join(f"{c} = ?" for c in cols)
+            if not self._write(f"UPDATE research_data SET {assignments} WHERE id = ?",
+                               [data[c] for c in cols] + [research_id]):
+                return None
+        rows = self._query("SELECT * FROM research_data WHERE id = ?", (research_id,))
+        return rows[0] if rows else None
+
+    def mark_pdf_processed(self, pdf_id: str) -> None:
+        self._write("UPDATE pdfs SET processed = 1 WHERE id = ?", (pdf_id,))
+
+    def get_research(self, year: Optional[int] = None, columns: Optional[List[str]] = None) -> list:
+        sql = f"SELECT {self._columns(columns)} FROM research_data"
+        if year is not None:
+            return self._query(sql + " WHERE year = ? ORDER BY year DESC, id DESC", (year,))
+        return self._query(sql + " ORDER BY year DESC, id DESC")
+
+    def get_research_page(self, limit: int, after: Optional[Tuple[int, str]] = None, year: Optional[int] = None,
+                          columns: Optional[List[str]] = None) -> list:
+        where, params = [], []
+        if year is not None:
+            where.append("year = ?")
+            params.append(year)
+        if after is not None:
+            where.append("(year < ? OR (year = ? AND id < ?))")
+            params += [after[0], after[0], after[1]]
+        sql = f"SELECT {self._columns(columns)} FROM research_data"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        return self._query(sql + " ORDER BY year DESC, id DESC LIMIT ?", params + [limit])
+
+    def get_all_pdfs(self) -> list:
+        return self._query("SELECT * FROM pdfs ORDER BY uploaded_at DESC")
+
+    def get_user_by_email(self, email: str) -> Optional[dict]:
+        rows = self._query("SELECT * FROM users WHERE email = ?", (email,))
+        return rows[0] if rows else None
+
+
+_storage: Optional[Storage] = None
+_storage_lock = threading.Lock()
+
+
+def get_storage() -> Storage:
+    """The configured backend (created on first use)."""
+    global _storage
+    if _storage is None:
+        with _storage_lock:
+            if _storage is None:
+                if STORAGE_BACKEND == "sqlite":
+                    _storage = SQLiteStorage(SQLITE_DB_PATH, LOCAL_STORAGE_DIR)
+                elif STORAGE_BACKEND == "supabase":
+                    _storage = SupabaseStorage()
+                else:
+                    raise ValueError(f"Unknown STORAGE_BACKEND: {STORAGE_BACKEND}")
+    return _storage
+
+
+def set_storage(storage: Optional[Storage]) -> None:
+    """Install a backend explicitly (tests, scripts); None re-reads the config on next use."""
+    global _storage
+    _storage = storage
@@ -1,22 +1,31 @@
 """
-Supabase client configuration and helper functions.
+Data helper functions used by the API.
+
+They go through the storage backend chosen by STORAGE_BACKEND (see storage.py):
+Supabase by default, or a local SQLite file. The backend is created on first use,
+so importing this module does not require SUPABASE_URL / SUPABASE_KEY.
 """
-import os
-from supabase import create_client, Client
+import re
+import base64
+import json
+from typing import Iterable, List, Optional, Tuple
+
 from dotenv import load_dotenv
 
 load_dotenv()
 
-# Initialize Supabase client
-SUPABASE_URL = os.getenv("SUPABASE_URL")
-SUPABASE_KEY = os.getenv("SUPABASE_KEY")
+from metrics import timed_helper
+from storage import RESEARCH_COLUMNS, get_storage
 
-if not SUPABASE_URL or not SUPABASE_KEY:
-    raise ValueError("Missing SUPABASE_URL or SUPABASE_KEY in environment variables")
 
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+def __getattr__(name):
+    # `from supabase_client import supabase` still gives the raw Supabase client
+    if name == "supabase":
+        return get_storage().client
+    raise AttributeError(name)
 
 
+@timed_helper
 def upload_pdf_to_storage(file_bytes: bytes, filename: str, user_id: str) -> dict:
     """
     Upload PDF to Supabase Storage.
@@ -32,35 +41,16 @@ def upload_pdf_to_storage(file_bytes: bytes, filename: str, user_id: str) -> dic
     storage_path = f"{user_id}/{filename}"
     
     print(f"Uploading to storage: bucket='pdfs', path='{storage_path}'")
+    public_url = get_storage().upload_pdf(storage_path, file_bytes)
+    print(f"Public URL: {public_url}")
     
-    try:
-        response = supabase.storage.from_("pdfs").upload(
-            storage_path,
-            file_bytes,
-            file_options={"content-type": "application/pdf", "upsert": "false"}
-        )
-        
-        print(f"Upload response: {response}")
-        
-        # Get public URL
-        public_url = supabase.storage.from_("pdfs").get_public_url(storage_path)
-        
-        print(f"Public URL: {public_url}")
-        
-        return {
-            "storage_path": storage_path,
-            "public_url": public_url
-        }
-    except Exception as e:
-        print(f"Storage upload error: {e}")
-        # If upload fails, still return the path (file might already exist)
-        public_url = supabase.storage.from_("pdfs").get_public_url(storage_path)
-        return {
-            "storage_path": storage_path,
-            "public_url": public_url
-        }
+    return {
+        "storage_path": storage_path,
+        "public_url": public_url
+    }
 
 
+@timed_helper
 def save_pdf_metadata(filename: str, original_name: str, storage_path: str, 
                       file_size: int, uploaded_by: str) -> dict:
     """Save PDF metadata to database."""
@@ -73,10 +63,10 @@ def save_pdf_metadata(filename: str, original_name: str, storage_path: str,
         "processed": False
     }
     
-    response = supabase.table("pdfs").insert(data).execute()
-    return response.data[0] if response.data else {}
+    return get_storage().insert("pdfs", data)
 
 
+@timed_helper
 def save_research_data(pdf_id: str, title: str, year: int, impact: str, 
                        money: str, summary: str, created_by: str = None) -> dict:
     """Save research data to database."""
@@ -97,33 +87,109 @@ def save_research_data(pdf_id: str, title: str, year: int, impact: str,
     # if created_by is not None:
     #     data["created_by"] = created_by
     
-    response = supabase.table("research_data").insert(data).execute()
-    return response.data[0] if response.data else {}
+    return get_storage().insert("research_data", data)
+
 
+@timed_helper
+def save_research_batch(tiles: List[dict]) -> List[dict]:
+    """Save many research tiles in one insert (a tile's `id` is kept when given); returns the saved rows."""
+    rows = []
+    for t in tiles:
+        data = {k: t[k] for k in ("title", "year", "impact", "money", "summary")}
+        for k in ("id", "pdf_id"):
+            if t.get(k) is not None:
+                data[k] = t[k]
+        rows.append(data)
+    return get_storage().insert_many("research_data", rows)
 
+
+@timed_helper
 def mark_pdf_processed(pdf_id: str) -> None:
     """Mark PDF as processed."""
-    supabase.table("pdfs").update({"processed": True}).eq("id", pdf_id).execute()
+    get_storage().mark_pdf_processed(pdf_id)
+
+
+# Columns callers may ask for with `fields=`; id and year are always returned (cursor keys).
+RESEARCH_FIELDS = RESEARCH_COLUMNS
+
+
+_CURSOR_ID_RE = re.compile(r"[0-9A-Za-z-]{1,64}")
 
 
-def get_research_by_year(year: int) -> list:
+def research_columns(fields: Optional[Iterable[str]] = None) -> Optional[List[str]]:
+    """Column list for `fields` (None = all columns). Raises ValueError on unknown names."""
+    if not fields:
+        return None
+    fields = [f.strip() for f in fields if f.strip()]
+    unknown = [f for f in fields if f not in RESEARCH_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown research field(s): {', '.join(unknown)}")
+    columns = ["id", "year"] + [f for f in fields if f not in ("id", "year")]
+    return list(dict.fromkeys(columns))
+
+
+def encode_research_cursor(row: dict) -> str:
+    """Opaque cursor pointing just after `row` in (year desc, id desc) order."""
+    raw = json.dumps([row["year"], str(row["id"])]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_research_cursor(cursor: str) -> Tuple[int, str]:
+    """Inverse of encode_research_cursor. Raises ValueError on a malformed cursor."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        year, row_id = json.loads(raw)
+        year, row_id = int(year), str(row_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+    # the id is interpolated into a PostgREST filter: only allow uuid-style characters
+    if not _CURSOR_ID_RE.fullmatch(row_id):
+        raise ValueError("Invalid cursor")
+    return year, row_id
+
+
+@timed_helper
+def get_research_by_year(year: int, fields: Optional[Iterable[str]] = None) -> list:
     """Get all research data for a specific year."""
-    response = supabase.table("research_data").select("*").eq("year", year).execute()
-    return response.data or []
+    return get_storage().get_research(year=year, columns=research_columns(fields))
 
 
-def get_all_research() -> list:
+@timed_helper
+def get_all_research(fields: Optional[Iterable[str]] = None) -> list:
     """Get all research data."""
-    response = supabase.table("research_data").select("*").order("year", desc=True).execute()
-    return response.data or []
+    return get_storage().get_research(columns=research_columns(fields))
+
+
+@timed_helper
+def get_research_page(limit: int, cursor: Optional[str] = None, year: Optional[int] = None,
+                      fields: Optional[Iterable[str]] = None) -> Tuple[list, Optional[str]]:
+    """
+    One page of research data in (year desc, id desc) order using keyset pagination:
+    rows strictly after `cursor` (from a previous page), optionally for a single year.
+    Returns (rows, next_cursor); next_cursor is None on the last page.
+    """
+    after = decode_research_cursor(cursor) if cursor else None
+    # one extra row tells us whether there is a next page
+    rows = get_storage().get_research_page(limit + 1, after=after, year=year, columns=research_columns(fields))
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, encode_research_cursor(rows[-1])
+    return rows, None
+
+
+@timed_helper
+def update_research_data(research_id: str, data: dict) -> Optional[dict]:
+    """Update a research row; returns the updated row, or None if the id does not exist."""
+    return get_storage().update_research(research_id, data)
 
 
+@timed_helper
 def get_all_pdfs() -> list:
     """Get all PDFs with user info."""
-    response = supabase.table("pdfs").select("*").order("uploaded_at", desc=True).execute()
-    return response.data or []
+    return get_storage().get_all_pdfs()
 
 
+@timed_helper
 def save_email_template(research_id: str, subject: str, body: str) -> dict:
     """Save generated email template."""
     data = {
@@ -132,24 +198,23 @@ def save_email_template(research_id: str, subject: str, body: str) -> dict:
         "body": body
     }
     
-    response = supabase.table("email_templates").insert(data).execute()
-    return response.data[0] if response.data else {}
+    return get_storage().insert("email_templates", data)
 
 
-def register_user(email: str, password_hash: str, name: str) -> dict:
+@timed_helper
+def register_user(email: str, password_hash: str, name: str, role: str = "user") -> dict:
     """Register a new user (custom auth, not Supabase Auth)."""
     data = {
         "email": email,
         "password": password_hash,
         "name": name,
-        "role": "user"
+        "role": role
     }
     
-    response = supabase.table("users").insert(data).execute()
-    return response.data[0] if response.data else {}
+    return get_storage().insert("users", data)
 
 
+@timed_helper
 def get_user_by_email(email: str) -> dict:
     """Get user by email."""
-    response = supabase.table("users").select("*").eq("email", email).execute()
-    return response.data[0] if response.data else None
+    return get_storage().get_user_by_email(email)
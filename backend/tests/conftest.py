@@ -0,0 +1,20 @@
+import os
+import tempfile
+
+# Keep test runs from reading or writing the on-disk extraction cache;
+# tests that exercise the cache install their own via monkeypatch.
+os.environ.setdefault("EXTRACTION_CACHE_PATH", "")
+
+# Async ingest jobs go to a throwaway store for the session.
+_tmp = tempfile.mkdtemp(prefix="ingest-tests-")
+os.environ.setdefault("JOBS_DB_PATH", os.path.join(_tmp, "jobs.sqlite3"))
+os.environ.setdefault("JOB_UPLOAD_DIR", os.path.join(_tmp, "uploads"))
+os.environ.setdefault("REVOKED_TOKENS_PATH", os.path.join(_tmp, "revoked.sqlite3"))
+
+# Data helpers use a throwaway local SQLite store instead of Supabase.
+os.environ.setdefault("STORAGE_BACKEND", "sqlite")
+os.environ.setdefault("SQLITE_DB_PATH", os.path.join(_tmp, "data.sqlite3"))
+os.environ.setdefault("LOCAL_STORAGE_DIR", os.path.join(_tmp, "storage"))
+
+# Cheap bcrypt for the auth tests.
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
@@ -0,0 +1,99 @@
+"""
+Frozen copies of the original normalize_text / hint extractors (before the compiled
+rewrite in text_processing.py). Golden tests and benchmarks compare against these;
+do not "fix" them.
+"""
+import re
+from typing import Optional, Tuple
+
+def normalize_text(s: str) -> str:
+    # unwrap hyphenation across newlines: "medullo-\nblastoma" -> "medulloblastoma"
+    s = re.sub(r"-\s*\n\s*", "", s)
+    # join single line breaks inside paragraphs (keep blank lines)
+    s = re.sub(r"([^\n])\n(?!\n)", r"\1 ", s)
+    # fix spaced thousands: "90, 000" -> "90,000"; "100 000" -> "100,000"
+    s = re.sub(r"(?<=\d),(?:\s+)(?=\d{3})", ",", s)
+    s = re.sub(r"(?<=\d)\s(?=\d{3}\b)", ",", s)
+    # collapse multi-spaces
+    s = re.sub(r"[ \t]{2,}", " ", s)
+    return s.strip()
+
+
+TRIAL_ID_RE = re.compile(r"\b(PNOC|NCT|PBTC|COG)\s*[-]?\s*\d+\b", re.I)
+MONEY_TOKEN_RE = re.compile(
+    r"(?i)(\$?\s?\d{1,3}(?:[,\s]\d{3})+(?:\.\d{2})?|\$\s?\d+|\d{4,})(?:\s*(?:USD|dollars|over\s+\d+\s+years?)?)"
+)
+TOTAL_BUDGET_CUES = re.compile(r"(?i)\b(total (project )?budget|subtotal|indirects|overhead|total:)\b")
+GRANT_CUES = re.compile(r"(?i)\b(grant amount|grant:|awarded|provided by|funded by|our (?:foundation|nonprofit)|we (?:will|plan to) fund|committed)\b")
+
+def extract_trial_id(text: str) -> str:
+    m = TRIAL_ID_RE.search(text)
+    if not m:
+        return ""
+    return re.sub(r"[\s-]+", "", m.group(0).upper())  # PNOC044, NCT0123456
+
+def _normalize_money_token(tok: str) -> str:
+    tok = tok.strip()
+    if not tok.startswith("$"):
+        # add $ to naked numbers >= 4 digits (e.g., 781000)
+        if re.fullmatch(r"\d{4,}(?:\.\d{2})?", tok):
+            tok = "$" + tok
+    tok = tok.replace(" ", "")
+    if re.fullmatch(r"\$\d{4,}(?:\.\d{2})?", tok) and "," not in tok:
+        num = tok[1:]
+        try:
+            if "." in num:
+                left, right = num.split(".")
+                left = f"{int(left):,}"
+                tok = f"${left}.{right}"
+            else:
+                tok = f"${int(num):,}"
+        except Exception:
+            pass
+    return tok
+
+def _money_to_numeric(tok: str) -> Optional[float]:
+    digits = re.sub(r"[^\d.]", "", tok or "")
+    if not digits:
+        return None
+    try:
+        return float(digits)
+    except Exception:
+        return None
+
+def choose_grant_amount(text: str) -> Tuple[str, Optional[float]]:
+    """
+    Heuristic: scan lines. Prefer amounts on lines with 'grant/awarded/provided/funded/committed'.
+    Downrank lines that look like total project budget/indirects.
+    Return (amount_display, amount_numeric) or ("", None) if nothing plausible.
+    """
+    best = None  # (display, numeric, score)
+    for raw_line in text.splitlines():
+        line = raw_line.strip()
+        if not line:
+            continue
+        toks = [t.group(0) for t in MONEY_TOKEN_RE.finditer(line)]
+        if not toks:
+            continue
+        score = 0
+        if GRANT_CUES.search(line):
+            score += 3
+        if TOTAL_BUDGET_CUES.search(line):
+            score -= 2
+        if re.search(r"(?i)\bgrant\b", line):
+            score += 1
+        for tok in toks:
+            disp = _normalize_money_token(tok)
+            val = _money_to_numeric(disp)
+            if val and val < 1_000:
+                continue
+            cand = (disp, val, score)
+            if best is None:
+                best = cand
+            else:
+                if cand[2] > best[2] or (cand[2] == best[2] and (cand[1] or 0) > (best[1] or 0)):
+                    best = cand
+    if best:
+        return best[0], best[1]
+    return "", None
+
@@ -2,7 +2,7 @@ import json
 from io import BytesIO
 from app import app
 
-# ---------- Fake Gemini objects to avoid real API calls ----------
+# ---------- Fake LLM provider to avoid real API calls ----------
 FAKE_JSON = {
   "project_year": 2025,
   "projects": [{
@@ -22,14 +22,14 @@ FAKE_JSON = {
   "global_notes": []
 }
 
-class _FakeResponse:
-    def __init__(self, content: dict):
-        self.text = json.dumps(content)
+from llm_providers import LLMProvider
 
-class FakeModel:
-    def generate_content(self, prompt):
-        # Optionally assert the prompt contains "SCHEMA" / "CONTENT"
-        return _FakeResponse(FAKE_JSON)
+class FakeProvider(LLMProvider):
+    name = "fake"
+
+    def generate(self, prompt, **kwargs):
+        # Optionally assert the prompt contains "HINTS" / "CONTENT"
+        return json.dumps(FAKE_JSON)
 
 # ---------- Utilities ----------
 def make_text_pdf_bytes():
@@ -54,9 +54,9 @@ def test_health():
         assert data.get("ok") is True
 
 def test_ingest_raw_text_json(monkeypatch):
-    # Patch Gemini model used inside app
-    import app as appmod
-    monkeypatch.setattr(appmod, "model", FakeModel())
+    # Patch the LLM provider used inside app
+    import llm_providers
+    monkeypatch.setattr(llm_providers, "_provider", FakeProvider())
 
     with app.test_client() as tc:
         payload = {
@@ -70,9 +70,22 @@ def test_ingest_raw_text_json(monkeypatch):
         assert "projects" in data
         assert data["projects"][0]["fund_usage"]["amount_numeric"] == 340000
 
+def test_ingest_reports_token_and_llm_stats_header(monkeypatch):
+    import llm_providers
+    monkeypatch.setattr(llm_providers, "_provider", FakeProvider())
+
+    with app.test_client() as tc:
+        payload = {"raw_text": "Medulloblastoma... Grant Amount: $340,000 over two years",
+                   "source_label": "PNOC044 update", "source_date": "2025-01-10"}
+        r = tc.post("/ingest-and-summarize", json=payload)
+        assert r.status_code == 200, r.data
+        report = json.loads(r.headers["X-Ingest-Report"])
+        assert report["tokens"]["calls"] == 1
+        assert report["llm"] == {"calls": 1, "model_calls": 1, "retries": 0, "repaired": 0, "cache_hits": 0, "failed": 0}
+
 def test_ingest_pdf_multipart(monkeypatch):
-    import app as appmod
-    monkeypatch.setattr(appmod, "model", FakeModel())
+    import llm_providers
+    monkeypatch.setattr(llm_providers, "_provider", FakeProvider())
 
     pdf_bytes = make_text_pdf_bytes()
 
@@ -91,3 +104,411 @@ def test_errors_when_missing_input():
     with app.test_client() as tc:
         r = tc.post("/ingest-and-summarize", json={})
         assert r.status_code in (400, 415)  # 400: missing; 415: wrong content-type
+
+def test_ingest_async_job_reports_progress_and_result(monkeypatch):
+    import time
+    import llm_providers
+    monkeypatch.setattr(llm_providers, "_provider", FakeProvider())
+
+    with app.test_client() as tc:
+        payload = {"raw_text": "Grant Amount: $340,000 over two years", "source_label": "PNOC044 update"}
+        r = tc.post("/ingest-and-summarize?mode=async", json=payload)
+        assert r.status_code == 202, r.data
+        job_id = r.get_json()["job_id"]
+        assert r.headers["Location"] == f"/jobs/{job_id}"
+
+        for _ in range(100):
+            job = tc.get(f"/jobs/{job_id}").get_json()
+            if job["status"] in ("succeeded", "failed"):
+                break
+            time.sleep(0.02)
+        assert job["status"] == "succeeded", job
+        assert job["progress"]["chunks"] == ["done"]
+        assert job["result"]["projects"][0]["fund_usage"]["amount_numeric"] == 340000
+
+        assert tc.get("/jobs/does-not-exist").status_code == 404
+
+def test_ingest_batch_streams_ndjson_per_document(monkeypatch):
+    import llm_providers
+    monkeypatch.setattr(llm_providers, "_provider", FakeProvider())
+
+    with app.test_client() as tc:
+        data = {
+            "file": [(BytesIO(make_text_pdf_bytes()), "a.pdf"), (BytesIO(b"hi"), "notes.txt", "text/plain")],
+            "raw_text": "PNOC044 Grant Amount: $340,000 over two years",
+            "source_date": "2025-01-05",
+        }
+        r = tc.post("/ingest-batch", data=data, content_type="multipart/form-data")
+        assert r.status_code == 200, r.data
+        assert r.mimetype == "application/x-ndjson"
+        lines = [json.loads(line) for line in r.data.decode().splitlines()]
+
+    by_label = {line["source_label"]: line for line in lines[:-1]}
+    assert by_label["a.pdf"]["status"] == "succeeded"
+    assert by_label["a.pdf"]["result"]["projects"][0]["fund_usage"]["amount_numeric"] == 340000
+    assert by_label["notes.txt"]["status"] == "failed"
+    assert by_label[""]["status"] == "succeeded"  # raw_text item, no shared label
+    assert lines[-1] == {"done": True, "total": 3, "succeeded": 2, "failed": 1}
+
+    with app.test_client() as tc:
+        assert tc.post("/ingest-batch", json={"items": []}).status_code == 400
+
+def test_ingest_stream_removes_spooled_pdf_when_setup_fails(monkeypatch):
+    import os
+    import app as appmod
+
+    spooled = []
+    def broken_pages(path):
+        spooled.append(path)
+        raise RuntimeError("extractor unavailable")
+    monkeypatch.setattr(appmod, "iter_pdf_pages", broken_pages)
+
+    with app.test_client() as tc:
+        data = {"file": (BytesIO(b"%PDF-1.4 fake"), "r.pdf", "application/pdf")}
+        r = tc.post("/ingest-and-summarize?mode=stream", data=data, content_type="multipart/form-data")
+        assert r.status_code == 500
+    assert spooled and not os.path.exists(spooled[0])
+
+def test_ingest_stream_emits_chunk_events_then_result(monkeypatch):
+    import llm_providers
+    monkeypatch.setattr(llm_providers, "_provider", FakeProvider())
+
+    with app.test_client() as tc:
+        payload = {"raw_text": "PNOC044 Grant Amount: $340,000 over two years", "source_label": "PNOC044 update"}
+        r = tc.post("/ingest-and-summarize?mode=stream", json=payload)
+        assert r.status_code == 200
+        assert r.mimetype == "text/event-stream"
+        events = []
+        for block in r.data.decode().strip().split("\n\n"):
+            name, data = block.split("\n")
+            events.append((name[len("event: "):], json.loads(data[len("data: "):])))
+
+    assert [name for name, _ in events] == ["start", "chunk", "result"]
+    assert events[0][1]["chunks"] == 1
+    assert events[0][1]["tokens"]["calls"] == 1
+    assert events[1][1]["status"] == "done"
+    assert events[1][1]["projects"][0]["fund_usage"]["amount_numeric"] == 340000
+    assert events[2][1]["projects"][0]["title"].startswith("PNOC044")
+
+def test_research_reads_are_cached_with_etag_and_invalidated_on_write(monkeypatch):
+    import app as appmod
+    from response_cache import ResponseCache
+
+    rows = [{"id": "1", "title": "PNOC044", "year": 2024}]
+    calls = []
+    def fake_all(fields=None):
+        calls.append(1)
+        return list(rows)
+    monkeypatch.setattr(appmod, "research_cache", ResponseCache(ttl_seconds=60))
+    monkeypatch.setattr(appmod, "get_all_research", fake_all)
+    monkeypatch.setattr(appmod, "save_research_data", lambda **kw: rows.append({"id": "2", **kw}) or rows[-1])
+
+    with app.test_client() as tc:
+        first = tc.get("/api/research")
+        assert first.status_code == 200 and first.get_json() == rows
+        etag = first.headers["ETag"]
+        assert tc.get("/api/research").get_data() == first.get_data()
+        assert len(calls) == 1
+
+        r = tc.get("/api/research", headers={"If-None-Match": etag})
+        assert r.status_code == 304 and r.get_data() == b""
+        assert len(calls) == 1
+
+        token = appmod.create_token("u1", "a@b.c", "admin")
+        r = tc.post("/api/research/add", json={"title": "NCT01", "year": 2025},
+                    headers={"Authorization": f"Bearer {token}"})
+        assert r.status_code == 201
+
+        r = tc.get("/api/research", headers={"If-None-Match": etag})
+        assert r.status_code == 200 and len(r.get_json()) == 2
+        assert r.headers["ETag"] != etag
+        assert len(calls) == 2
+
+class _FakeResearchQuery:
+    """Just enough of the supabase-py query builder for keyset pagination."""
+    def __init__(self, rows, log):
+        self.rows, self.log = rows, log
+    def select(self, columns):
+        self.log.append(("select", columns))
+        return self
+    def or_(self, expr):
+        self.log.append(("or", expr))
+        # expr is "year.lt.Y,and(year.eq.Y,id.lt.I)"
+        year = int(expr.split(",")[0].split(".")[2])
+        after_id = expr.rsplit("id.lt.", 1)[1].rstrip(")")
+        self.rows = [r for r in self.rows if r["year"] < year or (r["year"] == year and r["id"] < after_id)]
+        return self
+    def eq(self, column, value):
+        self.rows = [r for r in self.rows if r[column] == value]
+        return self
+    def order(self, column, desc=False):
+        return self
+    def limit(self, n):
+        self.rows = sorted(self.rows, key=lambda r: (r["year"], r["id"]), reverse=True)[:n]
+        return self
+    def execute(self):
+        class R:
+            pass
+        r = R()
+        r.data = self.rows
+        return r
+
+def test_research_keyset_pagination_and_fields(monkeypatch):
+    import app as appmod
+    import storage
+    from response_cache import ResponseCache
+
+    rows = [{"id": f"id{i:02d}", "year": 2020 + i % 3, "title": f"T{i}", "summary": "long"} for i in range(7)]
+    log = []
+    class FakeClient:
+        def table(self, name):
+            assert name == "research_data"
+            return _FakeResearchQuery(list(rows), log)
+    monkeypatch.setattr(storage, "_storage", storage.SupabaseStorage(client=FakeClient()))
+    monkeypatch.setattr(appmod, "research_cache", ResponseCache(ttl_seconds=60))
+
+    seen, cursor = [], None
+    with app.test_client() as tc:
+        for _ in range(5):
+            url = "/api/research?limit=3&fields=title" + (f"&cursor={cursor}" if cursor else "")
+            page = tc.get(url).get_json()
+            seen.extend(page["items"])
+            cursor = page["next_cursor"]
+            if cursor is None:
+                break
+        assert tc.get("/api/research?cursor=bad!").status_code == 400
+        assert tc.get("/api/research?fields=password").status_code == 400
+
+    expected = sorted(rows, key=lambda r: (r["year"], r["id"]), reverse=True)
+    assert [r["id"] for r in seen] == [r["id"] for r in expected]
+    assert ("select", "id,year,title") in log
+
+def test_incomplete_storage_backend_fails_at_construction():
+    import pytest
+    import storage
+
+    class NoPages(storage.Storage):
+        def get_research(self, year=None, columns=None):
+            return []
+
+    with pytest.raises(TypeError, match="get_research_page"):
+        NoPages()
+
+def test_api_runs_on_local_sqlite_storage(monkeypatch, tmp_path):
+    import app as appmod
+    import storage
+    from response_cache import ResponseCache
+
+    monkeypatch.setattr(storage, "_storage", storage.SQLiteStorage(str(tmp_path / "data.sqlite3"), str(tmp_path / "files")))
+    monkeypatch.setattr(appmod, "research_cache", ResponseCache(ttl_seconds=0))
+
+    with app.test_client() as tc:
+        r = tc.post("/api/auth/register", json={"email": "a@b.c", "password": "secret123", "name": "A"})
+        assert r.status_code in (200, 201), r.data
+        r = tc.post("/api/auth/login", json={"email": "a@b.c", "password": "secret123"})
+        assert r.status_code == 200, r.data
+        auth = {"Authorization": f"Bearer {r.get_json()['token']}"}
+
+        ids = []
+        for i, year in enumerate([2023, 2024, 2024, 2025]):
+            r = tc.post("/api/research/add", json={"title": f"T{i}", "year": year, "money": "$1"}, headers=auth)
+            assert r.status_code == 201, r.data
+            ids.append(r.get_json()["id"])
+
+        r = tc.put(f"/api/research/update/{ids[0]}", json={"title": "Renamed", "year": 2023}, headers=auth)
+        assert r.status_code == 200 and r.get_json()["title"] == "Renamed"
+        assert tc.put("/api/research/update/nope", json={"title": "x", "year": 2023}, headers=auth).status_code == 404
+
+        assert [row["year"] for row in tc.get("/api/research").get_json()] == [2025, 2024, 2024, 2023]
+        assert len(tc.get("/api/research/year/2024").get_json()) == 2
+
+        first = tc.get("/api/research?limit=3&fields=title").get_json()
+        assert set(first["items"][0]) == {"id", "year", "title"}
+        rest = tc.get(f"/api/research?limit=3&cursor={first['next_cursor']}").get_json()
+        assert rest["next_cursor"] is None
+        assert [row["title"] for row in rest["items"]] == ["Renamed"]
+
+def test_login_sheds_load_when_hash_pool_is_full(monkeypatch, tmp_path):
+    import threading
+    import password_hashing
+    import storage
+
+    monkeypatch.setattr(storage, "_storage", storage.SQLiteStorage(str(tmp_path / "data.sqlite3"), str(tmp_path / "files")))
+    with app.test_client() as tc:
+        assert tc.post("/api/auth/register", json={"email": "a@b.c", "password": "pw"}).status_code == 201
+        assert tc.post("/api/auth/login", json={"email": "a@b.c", "password": "nope"}).status_code == 401
+
+        full = threading.BoundedSemaphore(1)
+        full.acquire()
+        monkeypatch.setattr(password_hashing, "_slots", full)
+        r = tc.post("/api/auth/login", json={"email": "a@b.c", "password": "pw"})
+        assert r.status_code == 503 and r.headers["Retry-After"] == "1"
+        assert tc.get("/health").status_code == 200
+
+def test_verified_tokens_are_cached_and_logout_revokes(monkeypatch, tmp_path):
+    import time
+    import app as appmod
+    import storage
+    from token_cache import TokenCache, token_key
+
+    monkeypatch.setattr(storage, "_storage", storage.SQLiteStorage(str(tmp_path / "data.sqlite3"), str(tmp_path / "files")))
+    monkeypatch.setattr(appmod, "token_cache", TokenCache(max_entries=2))
+    decodes = []
+    real_decode = appmod.jwt.decode
+    monkeypatch.setattr(appmod.jwt, "decode", lambda *a, **kw: decodes.append(1) or real_decode(*a, **kw))
+
+    token = appmod.create_token("u1", "a@b.c", "admin")
+    auth = {"Authorization": f"Bearer {token}"}
+    with app.test_client() as tc:
+        for i in range(3):
+            r = tc.post("/api/research/add", json={"title": f"T{i}", "year": 2025}, headers=auth)
+            assert r.status_code == 201, r.data
+        assert len(decodes) == 1 and appmod.token_cache.stats()["hits"] == 2
+
+        assert tc.post("/api/auth/logout", headers=auth).status_code == 204
+        r = tc.post("/api/research/add", json={"title": "late", "year": 2025}, headers=auth)
+        assert r.status_code == 403 and r.get_json()["error"] == "Token revoked"
+
+    cache = TokenCache()
+    cache.put(token_key("old"), {"id": "u1", "exp": time.time() - 1})
+    assert cache.get(token_key("old")) is None  # cached claims never outlive exp
+
+def test_revocation_in_one_worker_rejects_in_another(monkeypatch, tmp_path):
+    import time
+    import pytest
+    import app as appmod
+    from token_cache import RevocationStore, TokenCache, token_key
+
+    path = str(tmp_path / "revoked.sqlite3")
+    worker_a = TokenCache(revocations=RevocationStore(path))
+    worker_b = TokenCache(revocations=RevocationStore(path))
+    token = appmod.create_token("u1", "a@b.c", "admin")
+
+    monkeypatch.setattr(appmod, "token_cache", worker_b)
+    assert appmod.verify_token(token)["id"] == "u1"  # claims now cached in worker B
+    worker_a.revoke(token_key(token), time.time() + 3600)
+
+    assert worker_b.is_revoked(token_key(token))
+    with pytest.raises(Exception, match="Token revoked"):
+        appmod.verify_token(token)
+    assert worker_b.stats()["entries"] == 0
+
+def test_bulk_add_saves_valid_tiles_in_one_insert(monkeypatch, tmp_path):
+    import app as appmod
+    import storage
+
+    store = storage.SQLiteStorage(str(tmp_path / "data.sqlite3"), str(tmp_path / "files"))
+    monkeypatch.setattr(storage, "_storage", store)
+    inserts, invalidations = [], []
+    real_insert_many = store.insert_many
+    monkeypatch.setattr(store, "insert_many", lambda table, rows: inserts.append(len(rows)) or real_insert_many(table, rows))
+    monkeypatch.setattr(appmod.research_cache, "invalidate", lambda: invalidations.append(1))
+
+    auth = {"Authorization": f"Bearer {appmod.create_token('u1', 'a@b.c', 'admin')}"}
+    tiles = [{"title": " PNOC044 ", "year": "2024", "money": "$340,000"},
+             {"title": "", "year": 2024},
+             {"title": "NCT01", "year": 2025, "summary": "Phase I"}]
+    with app.test_client() as tc:
+        r = tc.post("/api/research/bulk-add", json={"tiles": tiles}, headers=auth)
+        assert r.status_code == 201, r.data
+        body = r.get_json()
+        assert (body["created"], body["failed"]) == (2, 1)
+        assert [x["status"] for x in body["results"]] == ["created", "invalid", "created"]
+        assert body["results"][0]["item"]["title"] == "PNOC044" and body["results"][0]["item"]["year"] == 2024
+        assert body["results"][1]["errors"][0]["loc"] == ["title"]
+
+        r = tc.post("/api/research/bulk-add", json={"tiles": [{"year": 2024}]}, headers=auth)
+        assert r.status_code == 400 and r.get_json()["created"] == 0
+        assert tc.post("/api/research/bulk-add", json={"tiles": []}, headers=auth).status_code == 400
+
+    assert inserts == [2] and invalidations == [1]
+    assert sorted(row["title"] for row in store.get_research()) == ["NCT01", "PNOC044"]
+
+def test_bulk_add_reports_tiles_missing_from_the_insert_result(monkeypatch):
+    import app as appmod
+
+    def save_some(tiles):  # the database hands back the rows out of order and drops one
+        return [{**tiles[2], "created_at": "now"}, {**tiles[0], "created_at": "now"}]
+    monkeypatch.setattr(appmod, "save_research_batch", save_some)
+
+    auth = {"Authorization": f"Bearer {appmod.create_token('u1', 'a@b.c', 'admin')}"}
+    tiles = [{"title": "A", "year": 2024}, {"title": "B", "year": 2024}, {"title": "C", "year": 2025}]
+    with app.test_client() as tc:
+        r = tc.post("/api/research/bulk-add", json={"tiles": tiles}, headers=auth)
+        assert r.status_code == 201, r.data
+        body = r.get_json()
+        assert (body["created"], body["failed"]) == (2, 1)
+        assert [x["status"] for x in body["results"]] == ["created", "failed", "created"]
+        assert [body["results"][i]["item"]["title"] for i in (0, 2)] == ["A", "C"]
+        assert body["results"][1]["error"] == "Tile was not saved by the database"
+
+        monkeypatch.setattr(appmod, "save_research_batch", lambda tiles: [])
+        r = tc.post("/api/research/bulk-add", json={"tiles": tiles[:1]}, headers=auth)
+        assert r.status_code == 500 and r.get_json()["created"] == 0
+
+def test_stub_provider_runs_ingest_and_email_offline(monkeypatch):
+    import llm_providers
+    from email_generator import generate_research_email
+    stub = llm_providers.StubProvider(latency_s=0.001)
+    monkeypatch.setattr(llm_providers, "_provider", stub)
+
+    with app.test_client() as tc:
+        payload = {"raw_text": "PNOC044 - Translating Thyroid Hormone\n\n"
+                               "The PNOC044 team enrolled twelve patients. Grant Amount: $340,000 over two years."}
+        r = tc.post("/ingest-and-summarize", json=payload)
+        assert r.status_code == 200, r.data
+        project = r.get_json()["projects"][0]
+    assert project["title"] == "PNOC044 - Translating Thyroid Hormone"
+    assert project["layman_summary"] == "The PNOC044 team enrolled twelve patients."
+    assert project["fund_usage"]["amount_numeric"] == 340000
+
+    email = generate_research_email([{"title": "Thyroid Hormone", "year": 2025}])
+    assert email["subject"] == "Research update (1 project)" and "- Thyroid Hormone" in email["body"]
+    assert stub.calls == 2
+
+def test_server_timing_and_prometheus_metrics(monkeypatch):
+    import llm_providers
+    monkeypatch.setattr(llm_providers, "_provider", FakeProvider())
+
+    with app.test_client() as tc:
+        r = tc.post("/ingest-and-summarize", json={"raw_text": "PNOC044 Grant Amount: $340,000 over two years"})
+        assert r.status_code == 200, r.data
+        timing = dict(entry.split(";dur=") for entry in r.headers["Server-Timing"].split(", "))
+        assert {"chunk", "hints", "llm", "merge", "validate", "total"} <= set(timing)
+        assert "db" in tc.get("/api/research").headers["Server-Timing"]
+
+        r = tc.get("/metrics")
+        assert r.status_code == 200 and r.mimetype == "text/plain"
+        body = r.data.decode()
+    assert 'ingest_stage_duration_seconds_bucket{stage="llm",le="+Inf"}' in body
+    assert 'llm_events_total{event="model_calls"}' in body
+    assert 'storage_call_duration_seconds_count{helper="get_all_research",outcome="ok"}' in body
+    assert 'http_request_duration_seconds_count{method="POST",endpoint="/ingest-and-summarize",status="200"}' in body
+    assert 'cache_hit_ratio{cache="research"}' in body
+
+def test_profiling_on_demand_and_sampled_threshold(monkeypatch, tmp_path):
+    import llm_providers
+    import profiling
+    monkeypatch.setattr(llm_providers, "_provider", FakeProvider())
+    monkeypatch.setattr(profiling, "PROFILE_DIR", str(tmp_path))
+    monkeypatch.setattr(profiling, "PROFILE_TOKEN", "secret")
+    monkeypatch.setattr(profiling, "PROFILE_INTERVAL_MS", 0.5)
+
+    with app.test_client() as tc:
+        assert "X-Request-ID" not in tc.get("/health", headers={"X-Profile": "wrong"}).headers
+        r = tc.post("/ingest-and-summarize", json={"raw_text": "PNOC044 Grant Amount: $340,000"},
+                    headers={"X-Profile": "secret", "X-Request-ID": "req/42"})
+        assert r.status_code == 200
+        r.close()
+        assert r.headers["X-Request-ID"] == "req_42"
+
+        # sampled requests are kept only above the threshold
+        monkeypatch.setattr(profiling, "PROFILE_SAMPLE_RATE", 1.0)
+        monkeypatch.setattr(profiling, "PROFILE_THRESHOLD_MS", 60_000)
+        tc.get("/health").close()
+
+    files = list(tmp_path.iterdir())
+    assert len(files) == 1 and files[0].name.endswith("-req_42.folded")
+    assert "ingest_and_summarize-" in files[0].name
+    lines = files[0].read_text().splitlines()
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in lines)
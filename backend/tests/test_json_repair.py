@@ -0,0 +1,36 @@
+import json
+
+from json_repair import parse_json_object
+
+FULL = {
+    "project_year": 2025,
+    "projects": [
+        {"title": "PNOC044, thyroid", "layman_summary": "Say \"hi\", then {go}.", "future_goals": ["a", "b"]},
+        {"title": "NCT01", "layman_summary": "Second project", "fund_usage": {"amount_numeric": 125000}},
+    ],
+    "global_notes": [],
+}
+
+def test_valid_json_is_not_marked_repaired():
+    assert parse_json_object(json.dumps(FULL)) == (FULL, False)
+
+def test_fences_prose_and_trailing_commas():
+    out, repaired = parse_json_object('Sure!\n```json\n{"a": [1, 2,], "b": {"c": 3,},}\n```\nThanks')
+    assert out == {"a": [1, 2], "b": {"c": 3}} and repaired
+
+def test_every_truncation_point_yields_an_object_or_nothing():
+    text = json.dumps(FULL)
+    for i in range(1, len(text)):
+        out, _ = parse_json_object(text[:i])
+        assert out is None or isinstance(out, dict), text[:i]
+    # cut inside the second project's summary: the first project survives intact
+    cut = text.index("Second project") + 6
+    out, repaired = parse_json_object(text[:cut])
+    assert repaired
+    assert out["projects"][0] == FULL["projects"][0]
+    assert out["projects"][1]["layman_summary"] == "Second"
+
+def test_half_written_value_is_dropped():
+    out, _ = parse_json_object('{"projects": [{"title": "A"}, {"title": "B", "fund_usage": {"amount_numeric": tru')
+    assert out == {"projects": [{"title": "A"}, {"title": "B"}]}
+    assert parse_json_object("no json here") == (None, False)
@@ -0,0 +1,498 @@
+import time
+
+import app as appmod
+import llm_providers
+
+# ---------- Chunk fan-out ----------
+def test_extract_chunks_keeps_chunk_order(monkeypatch):
+    def fake_call(content, hints, stats=None):
+        # later chunks finish first
+        time.sleep(0.05 * (3 - int(content)))
+        return {"project_year": None, "projects": [{"title": content}], "global_notes": []}
+
+    monkeypatch.setattr(appmod, "call_llm_json", fake_call)
+    partials = appmod.extract_chunks(["0", "1", "2"], {}, max_in_flight=3)
+    assert [p["projects"][0]["title"] for p in partials] == ["0", "1", "2"]
+
+def test_extract_chunks_deadline_returns_notes_for_stragglers(monkeypatch):
+    def fake_call(content, hints, stats=None):
+        if content == "slow":
+            time.sleep(1.0)
+        return {"project_year": 2024, "projects": [{"title": content}], "global_notes": []}
+
+    monkeypatch.setattr(appmod, "call_llm_json", fake_call)
+    start = time.monotonic()
+    partials = appmod.extract_chunks(["fast", "slow"], {}, max_in_flight=2, deadline_s=0.2)
+    assert time.monotonic() - start < 0.9
+    assert partials[0]["projects"][0]["title"] == "fast"
+    assert partials[1]["projects"] == []
+    assert "deadline" in partials[1]["global_notes"][0]
+
+    merged = appmod._merge_partials(partials)
+    assert merged["project_year"] == 2024
+    assert len(merged["projects"]) == 1
+
+def test_batch_shares_one_in_flight_limit_across_documents(monkeypatch):
+    import threading
+    lock = threading.Lock()
+    state = {"now": 0, "peak": 0}
+
+    def fake_call(content, hints, stats=None):
+        with lock:
+            state["now"] += 1
+            state["peak"] = max(state["peak"], state["now"])
+        time.sleep(0.02)
+        with lock:
+            state["now"] -= 1
+        return {"project_year": 2025, "projects": [{"title": "T", "trial_id": hints.get("trial_id", "")}],
+                "global_notes": []}
+
+    monkeypatch.setattr(appmod, "call_llm_json", fake_call)
+    monkeypatch.setattr(appmod, "LLM_MAX_IN_FLIGHT", 2)
+    monkeypatch.setattr(appmod, "SemanticChunker", lambda: __import__("chunking").SemanticChunker(token_budget=20))
+    text = "\n\n".join(f"PNOC0{i} - Study {i}. Grant amount: ${i},000 awarded." for i in range(10, 16))
+    items = [{"label": f"r{n}", "sdate": "", "text": text} for n in range(4)]
+
+    lines = list(appmod.iter_batch_results(items))
+    assert sorted(line["index"] for line in lines[:-1]) == [0, 1, 2, 3]
+    assert all(line["status"] == "succeeded" for line in lines[:-1])
+    assert lines[-1] == {"done": True, "total": 4, "succeeded": 4, "failed": 0}
+    assert state["peak"] <= 2
+
+def test_closing_a_batch_stops_and_waits_for_its_documents(monkeypatch):
+    import threading
+    calls, release, finished = [], threading.Event(), []
+
+    def fake_call(content, hints, stats=None):
+        calls.append(content)
+        if "second" in content:
+            release.wait(5)
+            finished.append(content)
+        return {"project_year": None, "projects": [], "global_notes": []}
+
+    monkeypatch.setattr(appmod, "call_llm_json", fake_call)
+    monkeypatch.setattr(appmod, "BATCH_MAX_DOCUMENTS", 1)
+    items = [{"label": n, "sdate": "", "text": f"{n} document"} for n in ("first", "second", "third")]
+
+    batch = appmod.iter_batch_results(items)
+    assert next(batch)["status"] == "succeeded"
+    while not any("second" in c for c in calls):
+        time.sleep(0.01)
+    threading.Timer(0.1, release.set).start()
+    batch.close()  # client went away while "second" was waiting on the model
+    assert finished  # close() waited for the running document before returning
+    assert not any("third" in c for c in calls)  # the queued one never started
+
+# ---------- Gemini rate limiting ----------
+def test_rate_limiter_paces_requests_after_burst():
+    from rate_limit import RateLimiter
+    limiter = RateLimiter(rpm=600)  # 10/s, bucket holds a 10s burst
+    for _ in range(100):
+        limiter.acquire()
+        limiter.release()
+    start = time.monotonic()
+    for _ in range(3):
+        limiter.acquire(timeout=2)
+        limiter.release()
+    assert 0.2 <= time.monotonic() - start < 1.0
+
+def test_generate_content_backs_off_and_retries_throttled_calls(monkeypatch):
+    import gemini_client
+    from rate_limit import AdmissionTimeout, RateLimiter
+
+    class ResourceExhausted(Exception):
+        pass
+
+    class FlakyModel:
+        calls = 0
+        def generate_content(self, prompt):
+            FlakyModel.calls += 1
+            if FlakyModel.calls <= 2:
+                raise ResourceExhausted("429 quota exceeded")
+            return "ok"
+
+    limiter = RateLimiter(rpm=1000, max_concurrency=1, backoff_base=0.01)
+    monkeypatch.setattr(gemini_client, "limiter", limiter)
+    assert gemini_client.generate_content(FlakyModel(), "prompt") == "ok"
+    assert FlakyModel.calls == 3
+    stats = limiter.stats()
+    assert stats["throttled"] == 2 and stats["in_flight"] == 0 and stats["rate_scale"] < 1
+
+    limiter.acquire()  # hold the only slot: the next caller cannot be admitted
+    try:
+        gemini_client.generate_content(FlakyModel(), "prompt", timeout=0.05)
+        assert False, "expected AdmissionTimeout"
+    except AdmissionTimeout:
+        pass
+
+    class BrokenModel:
+        def generate_content(self, prompt):
+            raise TimeoutError("deadline exceeded")
+
+    limiter.release()
+    scale = limiter.stats()["rate_scale"]
+    try:
+        gemini_client.generate_content(BrokenModel(), "prompt")
+        assert False, "expected TimeoutError"
+    except TimeoutError:
+        pass
+    stats = limiter.stats()  # not retried, not a success: the backed-off rate stays put
+    assert stats["failed"] == 1 and stats["in_flight"] == 0 and stats["rate_scale"] == scale
+
+# ---------- Extraction cache ----------
+def test_call_llm_json_hits_cache_for_identical_chunk(monkeypatch, tmp_path):
+    from extraction_cache import ExtractionCache
+
+    calls = []
+
+    class CountingProvider(llm_providers.LLMProvider):
+        def generate(self, prompt, **kwargs):
+            calls.append(prompt)
+            return '{"project_year": 2025, "projects": [], "global_notes": []}'
+
+    cache = ExtractionCache(str(tmp_path / "cache.sqlite3"))
+    monkeypatch.setattr(appmod, "extraction_cache", cache)
+    monkeypatch.setattr(llm_providers, "_provider", CountingProvider())
+
+    hints = {"trial_id": "PNOC044"}
+    first = appmod.call_llm_json("Some   chunk\ntext", hints)
+    second = appmod.call_llm_json("Some chunk text", hints)  # same after whitespace normalization
+    assert first == second
+    assert len(calls) == 1
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+    appmod.call_llm_json("Some chunk text", {"trial_id": "NCT01"})
+    assert len(calls) == 2
+
+def test_call_llm_json_survives_a_failing_cache(monkeypatch):
+    import sqlite3
+
+    class LockedCache:
+        def get(self, key):
+            raise sqlite3.OperationalError("database is locked")
+        def put(self, key, value):
+            raise sqlite3.OperationalError("attempt to write a readonly database")
+
+    class OkProvider(llm_providers.LLMProvider):
+        def generate(self, prompt, **kwargs):
+            return '{"project_year": 2025, "projects": [], "global_notes": ["ok"]}'
+
+    monkeypatch.setattr(appmod, "extraction_cache", LockedCache())
+    monkeypatch.setattr(llm_providers, "_provider", OkProvider())
+    assert appmod.call_llm_json("Some chunk text", {})["global_notes"] == ["ok"]
+
+def test_extraction_cache_lru_and_ttl(tmp_path):
+    from extraction_cache import ExtractionCache
+
+    cache = ExtractionCache(str(tmp_path / "cache.sqlite3"), max_entries=2)
+    cache.put("a", {"v": 1})
+    cache.put("b", {"v": 2})
+    assert cache.get("a") == {"v": 1}  # touch a so b is least recent
+    cache.put("c", {"v": 3})
+    assert cache.get("b") is None
+    assert cache.get("a") == {"v": 1}
+
+    expiring = ExtractionCache(str(tmp_path / "ttl.sqlite3"), ttl_seconds=0.01)
+    expiring.put("k", {"v": 1})
+    time.sleep(0.05)
+    assert expiring.get("k") is None
+
+# ---------- Async job store ----------
+def test_queued_jobs_survive_restart(tmp_path):
+    from jobs import JobQueue, JobStore
+
+    db = str(tmp_path / "jobs.sqlite3")
+    job_id = JobStore(db).create({"text": "hello"})  # queued, but this "process" dies
+
+    def handler(job_input, progress):
+        progress.start(2)
+        progress.chunk(0, "done")
+        progress.chunk(1, "done")
+        return {"echo": job_input["text"]}
+
+    restarted = JobQueue(JobStore(db), handler, workers=1)
+    assert restarted.resume(stale_after=60) == 1
+    for _ in range(100):
+        job = restarted.store.get(job_id)
+        if job["status"] == "succeeded":
+            break
+        time.sleep(0.02)
+    assert job["result"] == {"echo": "hello"}
+    assert job["progress"] == {"total_chunks": 2, "completed_chunks": 2, "chunks": ["done", "done"]}
+
+def test_running_job_of_dead_worker_is_requeued(tmp_path):
+    import socket
+    import subprocess
+    import sys
+    from jobs import JobQueue, JobStore
+
+    db = str(tmp_path / "jobs.sqlite3")
+    store = JobStore(db)
+    dead = subprocess.Popen([sys.executable, "-c", "pass"])
+    dead.wait()
+    orphan = store.create({"text": "orphan"})
+    assert store.claim(orphan, f"{socket.gethostname()}:{dead.pid}:0000") == 1  # worker died mid-run
+    exhausted = store.create({"text": "crashes its worker", "pdf_path": "x.pdf"})
+    for _ in range(2):
+        store.claim(exhausted, f"{socket.gethostname()}:{dead.pid}:0000")
+        store.requeue_owner(f"{socket.gethostname()}:{dead.pid}:0000")
+    store.claim(exhausted, f"{socket.gethostname()}:{dead.pid}:0000")
+
+    cleaned = []
+    def handler(job_input, progress):
+        if job_input["text"] == "boom":
+            raise ValueError("boom")
+        return {"echo": job_input["text"]}
+
+    queue = JobQueue(JobStore(db), handler, workers=1, max_attempts=2, cleanup=cleaned.append)
+    assert queue.resume(stale_after=3600) == 2  # long before the job would count as stale
+    failing = queue.submit({"text": "boom", "pdf_path": "y.pdf"})
+    for _ in range(100):
+        jobs = [queue.store.get(j) for j in (orphan, exhausted, failing)]
+        if all(j["status"] in ("succeeded", "failed") for j in jobs):
+            break
+        time.sleep(0.02)
+    assert jobs[0]["status"] == "succeeded" and jobs[0]["attempts"] == 2
+    assert jobs[1]["status"] == "failed" and "not retrying" in jobs[1]["error"]["error"]
+    assert jobs[2]["status"] == "failed"
+    # spooled uploads are removed for failed jobs too
+    assert sorted(c.get("pdf_path", "") for c in cleaned) == ["", "x.pdf", "y.pdf"]
+
+def test_running_job_without_heartbeat_is_requeued_even_if_its_pid_lives(tmp_path):
+    import os
+    import socket
+    from jobs import JobQueue, JobStore
+
+    db = str(tmp_path / "jobs.sqlite3")
+    store = JobStore(db)
+    # the dead worker's pid now belongs to another live process (here: our parent)
+    stale = store.create({"text": "stale"})
+    store.claim(stale, f"{socket.gethostname()}:{os.getppid()}:0000")
+    store._execute("UPDATE ingest_jobs SET updated_at = 0 WHERE id = ?", (stale,))
+
+    queue = JobQueue(JobStore(db), lambda job_input, progress: {"echo": job_input["text"]}, workers=1)
+    mine = queue.store.create({"text": "mine"})
+    queue.store.claim(mine, queue.owner)  # running here, last heartbeat long ago
+    queue.store._execute("UPDATE ingest_jobs SET updated_at = 0 WHERE id = ?", (mine,))
+
+    assert queue.resume(stale_after=60) == 1
+    for _ in range(100):
+        job = queue.store.get(stale)
+        if job["status"] == "succeeded":
+            break
+        time.sleep(0.02)
+    assert job["result"] == {"echo": "stale"}
+    assert queue.store.get(mine)["status"] == "running"  # heartbeat kept it
+    # a requeued run cannot overwrite the outcome of the run that now owns the job
+    queue.store.finish(stale, {"echo": "late"}, owner="elsewhere:1:0000")
+    assert queue.store.get(stale)["result"] == {"echo": "stale"}
+
+# ---------- Streaming extraction ----------
+def test_chunk_stream_matches_chunk_text():
+    import random
+
+    rng = random.Random(7)
+    for _ in range(200):
+        pieces = ["".join(rng.choice("ab \n") for _ in range(rng.randint(0, 40))) for _ in range(rng.randint(1, 8))]
+        max_chars, overlap = rng.randint(5, 30), 0
+        overlap = rng.randint(0, max_chars - 1)
+        stream = appmod.ChunkStream(max_chars, overlap)
+        for p in pieces:
+            stream.feed(p)
+        assert stream.finish() == appmod.chunk_text("".join(pieces), max_chars, overlap)
+
+def test_iter_pdf_pages_parallel_matches_sequential(monkeypatch, tmp_path):
+    import fitz
+    import pdf_stream
+
+    path = str(tmp_path / "report.pdf")
+    with fitz.open() as doc:
+        for i in range(6):
+            page = doc.new_page()
+            page.insert_text((72, 72), f"Page {i + 1} PNOC04{i} grant amount $1{i}0 000")
+        doc.save(path)
+
+    sequential = list(pdf_stream.iter_pdf_pages(path, workers=1))
+    monkeypatch.setattr(pdf_stream, "PDF_PARALLEL_MIN_PAGES", 1)
+    parallel = list(pdf_stream.iter_pdf_pages(path, workers=2, pages_per_task=2))
+    assert parallel == sequential
+    assert [p.split("]")[0] for p in parallel] == [f"[PDF p{i}" for i in range(1, 7)]
+    assert "$100,000" in sequential[0]  # normalized per page
+
+def test_iter_pdf_pages_replaces_a_broken_pool(monkeypatch, tmp_path):
+    from concurrent.futures import Future, ThreadPoolExecutor
+    from concurrent.futures.process import BrokenProcessPool
+    import fitz
+    import pytest
+    import pdf_stream
+
+    path = str(tmp_path / "report.pdf")
+    with fitz.open() as doc:
+        for i in range(6):
+            doc.new_page().insert_text((72, 72), f"Page {i + 1}")
+        doc.save(path)
+
+    class BrokenPool:
+        """A pool whose worker died after the first range."""
+        def __init__(self):
+            self.calls = 0
+        def submit(self, fn, *args):
+            self.calls += 1
+            fut = Future()
+            if self.calls == 1:
+                fut.set_result(fn(*args))
+            else:
+                fut.set_exception(BrokenProcessPool("worker died"))
+            return fut
+        def shutdown(self, wait=True, cancel_futures=False):
+            pass
+
+    monkeypatch.setattr(pdf_stream, "PDF_PARALLEL_MIN_PAGES", 1)
+    sequential = list(pdf_stream.iter_pdf_pages(path, workers=1))
+    broken, fresh = BrokenPool(), ThreadPoolExecutor(2)
+    pools = [broken, fresh]
+    def next_pool(workers):
+        pdf_stream._pool = pools.pop(0)
+        return pdf_stream._pool
+    monkeypatch.setattr(pdf_stream, "_get_pool", next_pool)
+    assert list(pdf_stream.iter_pdf_pages(path, workers=2, pages_per_task=2)) == sequential
+    assert pdf_stream._pool is fresh  # the broken pool was dropped, the fresh one kept
+
+    pools[:] = [BrokenPool(), BrokenPool()]
+    with pytest.raises(pdf_stream.PdfExtractionError, match="page 5"):
+        list(pdf_stream.iter_pdf_pages(path, workers=2, pages_per_task=2))
+    assert pdf_stream._pool is None  # the next document starts a fresh pool
+    fresh.shutdown()
+
+def test_pdf_worker_reimport_of_app_leaves_jobs_alone(tmp_path):
+    import os
+    import subprocess
+    import sys
+    from jobs import JobStore
+
+    db = str(tmp_path / "jobs.sqlite3")
+    job_id = JobStore(db).create({"text": "hello"})
+    # what a spawned PDF worker does under `python app.py`
+    probe = "import runpy; runpy.run_path('app.py', run_name='__mp_main__')"
+    env = {**os.environ, "JOBS_DB_PATH": db, "JOBS_RESUME_ON_START": "1"}
+    subprocess.run([sys.executable, "-c", probe], cwd=os.path.dirname(appmod.__file__), env=env, check=True,
+                   capture_output=True, timeout=60)
+    assert JobStore(db).get(job_id)["status"] == "queued"
+
+# ---------- Semantic chunker ----------
+def test_semantic_chunker_keeps_trial_sections_whole():
+    from chunking import SemanticChunker, estimate_tokens
+
+    section = lambda tid: "\n\n".join([f"{tid} - Study title"] + [f"Details about {tid}. " * 8] * 3)
+    chunker = SemanticChunker(token_budget=200)
+    chunker.feed("[PDF p1] Intro paragraph.")
+    for tid in ("PNOC001", "NCT002", "PBTC003"):
+        chunker.feed("\n\n" + section(tid))
+    chunks = chunker.finish()
+
+    assert all(estimate_tokens(c) <= 200 for c in chunks)
+    for tid in ("PNOC001", "NCT002", "PBTC003"):
+        assert sum(tid in c for c in chunks) == 1
+    # chunks starting mid-page keep the page reference
+    assert all(c.startswith("[PDF p1]") for c in chunks)
+
+def test_semantic_chunker_splits_oversized_paragraph_on_sentences():
+    from chunking import semantic_chunks
+
+    text = " ".join(f"Sentence number {i} is here." for i in range(100))
+    chunks = semantic_chunks(text, token_budget=50)
+    assert len(chunks) > 1
+    assert all(c.endswith(".") for c in chunks)
+    assert " ".join(chunks) == text
+
+def test_pipeline_sends_each_chunk_its_own_hints(monkeypatch):
+    seen = {}
+
+    def fake_call(content, hints, stats=None):
+        seen[content[:40]] = hints
+        return {"project_year": None, "projects": [], "global_notes": []}
+
+    monkeypatch.setattr(appmod, "call_llm_json", fake_call)
+    import chunking
+    monkeypatch.setattr(appmod, "CHUNKER", "semantic")
+    monkeypatch.setattr(appmod, "SemanticChunker", lambda: chunking.SemanticChunker(token_budget=30))
+
+    pages = [
+        "[PDF p1] PNOC044 - Study one. Grant amount: $340,000 awarded.",
+        "[PDF p2] NCT0999 - Study two. Grant amount: $90,000 awarded.",
+    ]
+    chunks, hints = appmod._chunks_and_hints(pages, "label", "")
+    assert len(chunks) == 2
+    assert [h["trial_id"] for h in hints] == ["PNOC044", "NCT0999"]
+    assert [h["grant_amount"]["amount_numeric"] for h in hints] == [340000.0, 90000.0]
+
+def test_call_llm_json_salvages_truncated_output_without_retry(monkeypatch):
+    calls = []
+
+    class TruncatingProvider(llm_providers.LLMProvider):
+        def generate(self, prompt, **kwargs):
+            calls.append(prompt)
+            return '{"project_year": 2025, "projects": [{"title": "A", "layman_summary": "ok"}, {"tit'
+
+    monkeypatch.setattr(llm_providers, "_provider", TruncatingProvider())
+    stats = appmod.LLMCallStats()
+    out = appmod.call_llm_json("content", {}, stats)
+    assert len(calls) == 1
+    assert out["projects"] == [{"title": "A", "layman_summary": "ok"}]  # empty half-project dropped
+    assert stats.to_dict()["repaired"] == 1 and stats.to_dict()["retries"] == 0
+
+def test_response_schema_matches_output_payload():
+    import gemini_client
+    schema = gemini_client.response_schema(appmod.OutputPayload)
+    project = schema["properties"]["projects"]["items"]
+    assert schema["properties"]["project_year"] == {"type": "integer", "nullable": True}
+    assert project["properties"]["fund_usage"]["properties"]["amount_numeric"] == {"type": "number", "nullable": True}
+    assert set(project["required"]) == {"title", "layman_summary", "fund_usage", "timeline_snippet"}
+    assert "title" not in schema and "$defs" not in schema
+
+# ---------- Prompt layout ----------
+def test_user_prompt_is_compact_and_instructions_live_in_system_instruction():
+    hints = {"trial_id": "PNOC044", "grant_amount": {"amount_display": "$340,000", "amount_numeric": 340000.0},
+             "source": {"label": "", "date": ""}}
+    prompt = appmod.build_user_prompt("Some content.", hints)
+    assert prompt == 'HINTS:{"trial_id":"PNOC044","grant_amount":{"amount_display":"$340,000","amount_numeric":340000.0}}' \
+                     "\n\nCONTENT:\nSome content."
+    assert "SCHEMA:" in appmod.SYSTEM_INSTRUCTION and "CRITICAL RULES" in appmod.SYSTEM_INSTRUCTION
+
+    report = appmod.prompt_token_report(["x" * 4000] * 20, hints)
+    assert report["calls"] == 20 and report["content_tokens"] == 20000
+    assert report["prompt_tokens"] < report["legacy_prompt_tokens"]
+
+# ---------- Reduce stage ----------
+def _project(title, trial_id="", summary="", amount=None, goals=()):
+    return {"title": title, "trial_id": trial_id, "layman_summary": summary, "timeline_snippet": "",
+            "future_goals": list(goals),
+            "fund_usage": {"amount_numeric": amount, "amount_display": f"${amount:,.0f}" if amount else "",
+                           "currency": "USD", "period": "", "recipient_org": "", "purpose": ""}}
+
+def test_merge_projects_joins_near_duplicate_titles_but_not_distinct_trials():
+    from project_merge import merge_projects
+    projects = [
+        _project("Phase II glioma imaging study", summary="short", goals=["Expand sites"]),
+        _project("PNOC013 medulloblastoma sequencing", "PNOC013", amount=250000.0),
+        _project("Glioma Imaging Study (phase 2)", "PNOC044", summary="a longer summary", goals=["add MRI", "expand sites"]),
+        _project("Medulloblastoma sequencing", "PNOC13", goals=["Publish"]),
+        _project("Medulloblastoma sequencing", "NCT0999"),
+        _project("Pediatric glioma radiation therapy"),
+    ]
+    merged = merge_projects(projects)
+    assert [p["trial_id"] for p in merged] == ["PNOC044", "PNOC013", "NCT0999", ""]
+    glioma, pnoc13 = merged[0], merged[1]
+    assert glioma["title"] == "Phase II glioma imaging study"
+    assert glioma["layman_summary"] == "a longer summary"
+    assert glioma["future_goals"] == ["add MRI", "Expand sites"]
+    assert pnoc13["fund_usage"]["amount_numeric"] == 250000.0 and pnoc13["future_goals"] == ["Publish"]
+    assert merge_projects(projects) == merged  # inputs are not modified
+
+def test_merge_projects_keeps_zero_padded_nct_ids_apart():
+    from project_merge import merge_projects
+    projects = [_project("Medulloblastoma sequencing", "NCT00123456"),
+                _project("Medulloblastoma sequencing", "NCT123456"),
+                _project("Medulloblastoma sequencing", "PBTC013"),
+                _project("Medulloblastoma sequencing", "PBTC13")]
+    assert [p["trial_id"] for p in merge_projects(projects)] == ["NCT00123456", "NCT123456", "PBTC013"]
@@ -0,0 +1,82 @@
+import random
+
+import text_processing as tp
+from tests import reference_text as ref
+
+SAMPLE = """[PDF p1]
+PNOC044 - Translating Thyroid Hormone
+Our foundation committed a grant amount of $340, 000 over two years to
+support medullo-
+blastoma research at UCSF.
+
+Total project budget: $1 200 000 including indirects.
+Subtotal 45000 USD
+
+[PDF p2]
+NCT-0123456 follow-up. Grant: 781000 dollars\tprovided by partners.
+"""
+
+# pieces that exercise every branch of the old regexes
+_FRAGMENTS = [
+    "0", "1", "12", "340", "000", "5", ".00", ",", ", ", " ", "  ", "\t", "\n", "\n\n", "-", "- \n ",
+    "$", "$ ", "USD", " dollars", " over 2 years", "grant", "Grant amount: ", "grant:", "total:",
+    "Total project budget ", "awarded", "indirects", "PNOC", "NCT", "-044", " 12", "\r\n", " ",
+    "word", ".", "x", "\u00a0", "\u0663\u0663\u0663\u0663", "\x0c",
+]
+
+def _random_texts(n, seed=11):
+    rng = random.Random(seed)
+    for _ in range(n):
+        yield "".join(rng.choice(_FRAGMENTS) for _ in range(rng.randint(0, 40)))
+
+# ---------- Golden output vs. the original implementations ----------
+def test_normalize_text_matches_reference():
+    assert tp.normalize_text(SAMPLE) == ref.normalize_text(SAMPLE)
+    for text in _random_texts(3000):
+        assert tp.normalize_text(text) == ref.normalize_text(text), repr(text)
+
+def test_hint_extractors_match_reference():
+    for text in [SAMPLE, ref.normalize_text(SAMPLE), *_random_texts(3000, seed=12)]:
+        assert tp.choose_grant_amount(text) == ref.choose_grant_amount(text), repr(text)
+        assert tp.extract_trial_id(text) == ref.extract_trial_id(text), repr(text)
+
+def test_grant_amount_downranks_budget_lines():
+    display, numeric = tp.choose_grant_amount(tp.normalize_text(SAMPLE))
+    assert numeric == 781000.0  # grant line beats the larger total-budget line
+    assert display == "781000dollars"
+
+# ---------- Hint index ----------
+REPORT = (
+    "PNOC044 - Thyroid hormone study. Grant amount: $340,000 over 2 years.\n\n"
+    + "Narrative filler. " * 120 + "\n\n"
+    + "NCT01234567 - Liquid biopsy. Awarded $125,000 by our foundation.\n\n"
+    + "Total project budget: $2,000,000 including indirects."
+)
+
+def test_hint_index_attributes_amounts_to_nearby_trials():
+    index = tp.HintIndex()
+    half = len(REPORT) // 2
+    index.add_text(REPORT[:half])  # pieces may split anywhere between tokens
+    index.add_text(REPORT[half:])
+
+    assert index.trial_ids() == ["PNOC044", "NCT01234567"]
+    amounts = index.amounts_by_trial()
+    assert amounts["PNOC044"][1] == 340000.0
+    assert amounts["NCT01234567"][1] == 125000.0  # beats the downranked budget line
+    # trial id digits are never read as money
+    assert all(c[1] != 1234567.0 for c in index.candidates)
+
+def test_hint_index_scopes_hints_per_chunk():
+    index = tp.HintIndex()
+    index.add_text(REPORT)
+
+    second = index.hints_for_chunk("NCT01234567 follow-up visits continue.", label="r", sdate="2025-01-01")
+    assert second["trial_id"] == "NCT01234567"
+    assert second["grant_amount"]["amount_numeric"] == 125000.0
+    assert second["source"] == {"label": "r", "date": "2025-01-01"}
+    assert "trials" not in second
+
+    both = index.hints_for_chunk("PNOC044 and NCT01234567 share sites.")
+    assert [t["amount_numeric"] for t in both["trials"]] == [340000.0, 125000.0]
+
+    assert index.hints_for_chunk("Intro with no trials.")["trial_id"] == ""
@@ -0,0 +1,342 @@
+"""
+Text cleanup and hint extraction shared by the API process and the PDF extraction workers.
+
+Kept free of Flask/Gemini/Supabase imports so worker processes stay cheap to spawn.
+All patterns are compiled once at import. Output is byte-for-byte the same as the
+original per-call `re.sub` / per-line versions (see tests/test_text_processing.py).
+"""
+import re
+from typing import Optional, Tuple
+
+# trial identifiers such as PNOC044, NCT01234567, PBTC-045, COG 1234
+TRIAL_ID_RE = re.compile(r"\b(PNOC|NCT|PBTC|COG)\s*[-]?\s*\d+\b", re.I)
+MONEY_TOKEN_RE = re.compile(
+    r"(?i)(\$?\s?\d{1,3}(?:[,\s]\d{3})+(?:\.\d{2})?|\$\s?\d+|\d{4,})(?:\s*(?:USD|dollars|over\s+\d+\s+years?)?)"
+)
+TOTAL_BUDGET_CUES = re.compile(r"(?i)\b(total (project )?budget|subtotal|indirects|overhead|total:)\b")
+GRANT_CUES = re.compile(r"(?i)\b(grant amount|grant:|awarded|provided by|funded by|our (?:foundation|nonprofit)|we (?:will|plan to) fund|committed)\b")
+GRANT_WORD_RE = re.compile(r"(?i)\bgrant\b")
+
+# --- normalization ---
+_HYPHEN_BREAK_RE = re.compile(r"-\s*\n\s*")
+# same as r"([^\n])\n(?!\n)" -> r"\1 " but with a plain-string replacement
+_SOFT_NEWLINE_RE = re.compile(r"(?<=[^\n])\n(?!\n)")
+# "90, 000" -> "90,000" and "100 000" -> "100,000" in one scan
+_SPACED_THOUSANDS_RE = re.compile(r"(?<=\d)(?:,\s+(?=\d{3})|\s(?=\d{3}\b))")
+_MULTI_SPACE_RE = re.compile(r"[ \t]{2,}")
+
+# --- money tokens ---
+_SEPARATORS_RE = re.compile(r"[\s-]+")
+_NAKED_AMOUNT_RE = re.compile(r"\d{4,}(?:\.\d{2})?")
+_DOLLAR_AMOUNT_RE = re.compile(r"\$\d{4,}(?:\.\d{2})?")
+_NON_NUMERIC_RE = re.compile(r"[^\d.]")
+# MONEY_TOKEN_RE with whitespace that cannot cross a "\n", for scanning a whole text at once
+_MONEY_TOKEN_INLINE_RE = re.compile(
+    r"(\$?[^\S\n]?\d{1,3}(?:(?:,|[^\S\n])\d{3})+(?:\.\d{2})?|\$[^\S\n]?\d+|\d{4,})"
+    r"(?:[^\S\n]*(?i:USD|dollars|over[^\S\n]+\d+[^\S\n]+years?)?)"
+)
+# every money token starts at a "$" or digit run, or at the one space before a digit
+_MONEY_ANCHOR_RE = re.compile(r"[$\d]\d*")
+# line boundaries str.splitlines() honours besides "\n"
+_OTHER_LINE_BREAKS_RE = re.compile("[\r\x0b\x0c\x1c\x1d\x1e\x85\u2028\u2029]")
+
+
+def normalize_text(s: str) -> str:
+    if "\n" in s:
+        # unwrap hyphenation across newlines: "medullo-\nblastoma" -> "medulloblastoma"
+        if "-" in s:
+            s = _HYPHEN_BREAK_RE.sub("", s)
+        # join single line breaks inside paragraphs (keep blank lines)
+        s = _SOFT_NEWLINE_RE.sub(" ", s)
+    # fix spaced thousands: "90, 000" -> "90,000"; "100 000" -> "100,000"
+    s = _SPACED_THOUSANDS_RE.sub(",", s)
+    # collapse multi-spaces
+    s = _MULTI_SPACE_RE.sub(" ", s)
+    return s.strip()
+
+
+def extract_trial_id(text: str) -> str:
+    m = TRIAL_ID_RE.search(text)
+    if not m:
+        return ""
+    return _SEPARATORS_RE.sub("", m.group(0).upper())  # PNOC044, NCT0123456
+
+
+def _normalize_money_token(tok: str) -> str:
+    tok = tok.strip()
+    if not tok.startswith("$"):
+        # add $ to naked numbers >= 4 digits (e.g., 781000)
+        if _NAKED_AMOUNT_RE.fullmatch(tok):
+            tok = "$" + tok
+    tok = tok.replace(" ", "")
+    if "," not in tok and _DOLLAR_AMOUNT_RE.fullmatch(tok):
+        num = tok[1:]
+        try:
+            if "." in num:
+                left, right = num.split(".")
+                left = f"{int(left):,}"
+                tok = f"${left}.{right}"
+            else:
+                tok = f"${int(num):,}"
+        except Exception:
+            pass
+    return tok
+
+
+def _money_to_numeric(tok: str) -> Optional[float]:
+    digits = _NON_NUMERIC_RE.sub("", tok or "")
+    if not digits:
+        return None
+    try:
+        return float(digits)
+    except Exception:
+        return None
+
+
+def _line_score(line: str) -> int:
+    score = 0
+    if GRANT_CUES.search(line):
+        score += 3
+    if TOTAL_BUDGET_CUES.search(line):
+        score -= 2
+    if GRANT_WORD_RE.search(line):
+        score += 1
+    return score
+
+
+def _consider_candidate(best, cand):
+    """Keep the higher-scoring (display, numeric, score); ties go to the larger amount."""
+    if best is None or cand[2] > best[2] or (cand[2] == best[2] and (cand[1] or 0) > (best[1] or 0)):
+        return cand
+    return best
+
+
+def _consider(best, tok: str, score: int):
+    disp = _normalize_money_token(tok)
+    val = _money_to_numeric(disp)
+    if val and val < 1_000:
+        return best
+    return _consider_candidate(best, (disp, val, score))
+
+
+def _best_grant_candidate_by_line(text: str, best=None):
+    for raw_line in text.splitlines():
+        line = raw_line.strip()
+        if not line:
+            continue
+        toks = [t.group(0) for t in MONEY_TOKEN_RE.finditer(line)]
+        if not toks:
+            continue
+        score = _line_score(line)
+        for tok in toks:
+            best = _consider(best, tok, score)
+    return best
+
+
+def _iter_money_tokens(text: str):
+    """
+    Same matches as _MONEY_TOKEN_INLINE_RE.finditer(text), but only tries the token
+    pattern next to "$"/digits instead of at every position of a multi-MB string.
+    """
+    pos = 0
+    search, match = _MONEY_ANCHOR_RE.search, _MONEY_TOKEN_INLINE_RE.match
+    while True:
+        anchor = search(text, pos)
+        if anchor is None:
+            return
+        start = anchor.start()
+        m = None
+        if start > pos:
+            prev = text[start - 1]
+            if prev != "\n" and prev.isspace():
+                m = match(text, start - 1)
+        if m is None:
+            m = match(text, start)
+        if m is None:
+            # nothing can start inside this digit run either
+            pos = anchor.end()
+            continue
+        yield m
+        pos = m.end()
+
+
+def _best_grant_candidate(text: str, best=None):
+    """
+    Scan behind choose_grant_amount; pass the previous best to continue across pieces.
+    best: (display, numeric, score). Finds money tokens in one pass over the whole text
+    and only scores the lines that have any, instead of running every regex per line.
+    """
+    if _OTHER_LINE_BREAKS_RE.search(text):
+        return _best_grant_candidate_by_line(text, best)
+    line_end = -1
+    score = 0
+    for m in _iter_money_tokens(text):
+        start = m.start()
+        if start > line_end:
+            # first token on this line: score the line once
+            line_start = text.rfind("\n", 0, start) + 1
+            line_end = text.find("\n", start)
+            if line_end < 0:
+                line_end = len(text)
+            score = _line_score(text[line_start:line_end])
+        best = _consider(best, m.group(0), score)
+    return best
+
+
+def choose_grant_amount(text: str) -> Tuple[str, Optional[float]]:
+    """
+    Heuristic: scan lines. Prefer amounts on lines with 'grant/awarded/provided/funded/committed'.
+    Downrank lines that look like total project budget/indirects.
+    Return (amount_display, amount_numeric) or ("", None) if nothing plausible.
+    """
+    best = _best_grant_candidate(text)
+    if best:
+        return best[0], best[1]
+    return "", None
+
+
+def make_hints_for_any_text(text: str, label: str = "", sdate: str = "") -> dict:
+    trial_id = extract_trial_id(text)
+    amount_display, amount_numeric = choose_grant_amount(text)
+    return {
+        "trial_id": trial_id,                    # e.g., "PNOC044" or ""
+        "grant_amount": {
+            "amount_display": amount_display,    # "$340,000 over two years" or ""
+            "amount_numeric": amount_numeric     # 340000.0 or null
+        },
+        "source": {"label": label or "", "date": sdate or ""}
+    }
+
+
+# --- per-document hint index (all trials, all amounts, one scan) ---
+# a trial id or the start of a possible money token, whichever comes first
+_HINT_SCAN_RE = re.compile(r"(?P<trial>\b(?i:PNOC|NCT|PBTC|COG)\s*[-]?\s*\d+\b)|[$\d]\d*")
+# money within this many chars of a trial mention is attributed to that trial
+HINT_WINDOW_CHARS = 1500
+
+
+class HintIndex:
+    """
+    Every trial id (with positions) and every plausible money amount in a document,
+    collected in a single scan per piece of text as it streams past.
+
+    Amounts are attributed to a trial mentioned on the same line, else the closest trial
+    mention before them (or after, within HINT_WINDOW_CHARS), so a
+    chunk that mentions PNOC044 can be hinted with PNOC044's grant line even when that
+    line sits in another chunk. Digits inside trial ids are not treated as money.
+    """
+
+    def __init__(self, window: int = HINT_WINDOW_CHARS):
+        self.window = window
+        self.mentions = []    # (pos, trial_id) in document order
+        self.candidates = []  # (pos, display, numeric, score, line_start, line_end)
+        self._length = 0
+        self._by_trial = None
+
+    def add_text(self, text: str) -> None:
+        """Scan the next piece of the document (pieces are concatenated as given)."""
+        offset = self._length
+        self._length += len(text)
+        self._by_trial = None
+        if _OTHER_LINE_BREAKS_RE.search(text):
+            # exotic line breaks: normalize them to "\n" so line scoring matches splitlines()
+            text = _OTHER_LINE_BREAKS_RE.sub("\n", text)
+        pos = 0
+        line_end = -1
+        score = 0
+        search, match = _HINT_SCAN_RE.search, _MONEY_TOKEN_INLINE_RE.match
+        while True:
+            hit = search(text, pos)
+            if hit is None:
+                return
+            start = hit.start()
+            if hit.group("trial"):
+                self.mentions.append((offset + start, _SEPARATORS_RE.sub("", hit.group(0).upper())))
+                pos = hit.end()
+                continue
+            m = None
+            if start > pos:
+                prev = text[start - 1]
+                if prev != "\n" and prev.isspace():
+                    m = match(text, start - 1)
+            if m is None:
+                m = match(text, start)
+            if m is None:
+                pos = hit.end()
+                continue
+            if m.start() > line_end:
+                line_start = text.rfind("\n", 0, m.start()) + 1
+                line_end = text.find("\n", m.start())
+                if line_end < 0:
+                    line_end = len(text)
+                score = _line_score(text[line_start:line_end])
+            disp = _normalize_money_token(m.group(0))
+            # numeric from the amount itself, so "over 2 years" doesn't leak a digit into it
+            val = _money_to_numeric(_normalize_money_token(m.group(1)))
+            if not (val and val < 1_000):
+                self.candidates.append((offset + m.start(), disp, val, score, offset + line_start, offset + line_end))
+            pos = m.end()
+
+    def _trial_for(self, pos: int, line_start: int, line_end: int) -> str:
+        """
+        Trial an amount belongs to: the nearest mention on its own line, else the
+        closest mention before it, else the closest after it (within the window).
+        """
+        # mentions are sorted by position; binary search for the first one at/after pos
+        lo, hi = 0, len(self.mentions)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.mentions[mid][0] < pos:
+                lo = mid + 1
+            else:
+                hi = mid
+        before = self.mentions[lo - 1] if lo > 0 else None
+        after = self.mentions[lo] if lo < len(self.mentions) else None
+        same_line = [m for m in (before, after) if m and line_start <= m[0] < line_end]
+        if same_line:
+            return min(same_line, key=lambda m: abs(m[0] - pos))[1]
+        if before and pos - before[0] <= self.window:
+            return before[1]
+        if after and after[0] - pos <= self.window:
+            return after[1]
+        return ""
+
+    def amounts_by_trial(self) -> dict:
+        """trial_id -> best (display, numeric, score); "" holds amounts near no trial."""
+        if self._by_trial is None:
+            by_trial = {}
+            for pos, disp, val, score, line_start, line_end in self.candidates:
+                tid = self._trial_for(pos, line_start, line_end)
+                by_trial[tid] = _consider_candidate(by_trial.get(tid), (disp, val, score))
+            self._by_trial = by_trial
+        return self._by_trial
+
+    def trial_ids(self) -> list:
+        """Distinct trial ids in order of first mention."""
+        return list(dict.fromkeys(tid for _, tid in self.mentions))
+
+    def hints_for_chunk(self, chunk: str, label: str = "", sdate: str = "") -> dict:
+        """Hints scoped to the trials this chunk mentions (and amounts in the chunk itself)."""
+        trials = list(dict.fromkeys(
+            _SEPARATORS_RE.sub("", m.group(0).upper()) for m in TRIAL_ID_RE.finditer(chunk)
+        ))
+        amounts = self.amounts_by_trial()
+        best = amounts.get(trials[0]) if trials else None
+        if best is None:
+            # no trial-attributed amount: fall back to the best amount inside this chunk
+            best = _best_grant_candidate(chunk)
+        hints = {
+            "trial_id": trials[0] if trials else "",
+            "grant_amount": {
+                "amount_display": best[0] if best else "",
+                "amount_numeric": best[1] if best else None,
+            },
+            "source": {"label": label or "", "date": sdate or ""},
+        }
+        if len(trials) > 1:
+            hints["trials"] = [
+                {"trial_id": tid, "amount_display": amounts[tid][0] if tid in amounts else "",
+                 "amount_numeric": amounts[tid][1] if tid in amounts else None}
+                for tid in trials
+            ]
+        return hints
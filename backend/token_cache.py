@@ -0,0 +1,128 @@
+"""
+Verified JWT claims, cached per token, plus a revocation list.
+
+require_auth would otherwise run a full jwt.decode (signature + claims check) on
+every authenticated request. A token that verified once is remembered by its SHA-256
+until its own `exp`, so later requests with it are a dict lookup. Logout revokes the
+token: it is dropped from the cache and refused until it would have expired anyway.
+
+Claims are cached in this process's memory. Revocations are also written to a
+RevocationStore, a SQLite file shared by every worker on the host, and that store is
+checked on every request (cache hit or miss), so a logout handled by one gunicorn
+worker is honored by all of them and survives restarts. Several hosts would each
+need to point at shared storage instead.
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+
+def token_key(token: str) -> str:
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+class RevocationStore:
+    """Revoked token keys with their expiry, in a SQLite file shared between processes."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            folder = os.path.dirname(self.path)
+            if folder:
+                os.makedirs(folder, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS revoked_tokens (key TEXT PRIMARY KEY, exp REAL NOT NULL)")
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def add(self, key: str, exp: float) -> None:
+        with self._lock:
+            conn = self._connect()
+            conn.execute("INSERT OR REPLACE INTO revoked_tokens (key, exp) VALUES (?, ?)", (key, exp))
+            conn.execute("DELETE FROM revoked_tokens WHERE exp <= ?", (time.time(),))
+            conn.commit()
+
+    def contains(self, key: str) -> bool:
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT 1 FROM revoked_tokens WHERE key = ? AND exp > ?", (key, time.time())
+            ).fetchone()
+        return row is not None
+
+
+class TokenCache:
+    """
+    Thread-safe LRU of token key -> claims (expiring at the claims' `exp`) and revoked
+    keys. With a `revocations` store, revocations are shared with other processes:
+    check is_revoked() before trusting get().
+    """
+
+    def __init__(self, max_entries: int = 10000, revocations: Optional[RevocationStore] = None):
+        self.max_entries = max_entries
+        self.revocations = revocations
+        self._entries: "OrderedDict[str, dict]" = OrderedDict()
+        self._revoked = {}  # key -> exp (dropped once the token would have expired)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[dict]:
+        """Cached claims, or None (not cached, expired or revoked)."""
+        with self._lock:
+            claims = self._entries.get(key)
+            if claims is None or claims.get("exp", 0) <= time.time():
+                if claims is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return dict(claims)
+
+    def put(self, key: str, claims: dict) -> None:
+        if self.max_entries <= 0 or "exp" not in claims:
+            return
+        with self._lock:
+            if key in self._revoked:  # revoked while it was being verified
+                return
+            self._entries[key] = dict(claims)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def is_revoked(self, key: str) -> bool:
+        """Revoked here or, through the shared store, by any other process."""
+        with self._lock:
+            if key in self._revoked:
+                return True
+        if self.revocations is None or not self.revocations.contains(key):
+            return False
+        with self._lock:
+            self._entries.pop(key, None)
+        return True
+
+    def revoke(self, key: str, exp: float) -> None:
+        if self.revocations is not None:
+            self.revocations.add(key, exp)
+        now = time.time()
+        with self._lock:
+            self._entries.pop(key, None)
+            self._revoked[key] = exp
+            for k in [k for k, e in self._revoked.items() if e <= now]:
+                del self._revoked[k]
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses,
+                    "hit_rate": (self.hits / total) if total else 0.0, "revoked": len(self._revoked)}
@@ -0,0 +1,11 @@
+"""
+WSGI entry point for production servers:
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+"""
+from app import app, start_background_jobs
+
+# each gunicorn worker imports this module once (the app is not preloaded)
+start_background_jobs()
+
+__all__ = ["app"]